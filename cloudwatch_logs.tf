@@ -0,0 +1,20 @@
+# Optional input from trails that deliver to CloudWatch Logs: a subscription filter on each log group
+# sends batches of CloudTrail records to the lambda, without an export to S3.
+resource "aws_lambda_permission" "cloudwatch_logs" {
+  for_each      = toset(var.cloudwatch_logs_log_group_names)
+  statement_id  = "AllowExecutionFromCloudWatchLogs-${replace(each.value, "/[^a-zA-Z0-9-_]/", "-")}"
+  action        = "lambda:InvokeFunction"
+  function_name = module.lambda.lambda_function_name
+  principal     = "logs.amazonaws.com"
+  source_arn    = "arn:${data.aws_partition.current.partition}:logs:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:log-group:${each.value}:*"
+}
+
+resource "aws_cloudwatch_log_subscription_filter" "cloudtrail" {
+  for_each        = toset(var.cloudwatch_logs_log_group_names)
+  name            = var.function_name
+  log_group_name  = each.value
+  filter_pattern  = var.cloudwatch_logs_filter_pattern
+  destination_arn = module.lambda.lambda_function_arn
+
+  depends_on = [aws_lambda_permission.cloudwatch_logs]
+}
@@ -18,3 +18,43 @@ module "cloudtrail_to_slack_dynamodb_table" {
 
 }
 
+
+module "cloudtrail_to_slack_ledger_table" {
+  count   = var.enable_processing_ledger ? 1 : 0
+  source  = "terraform-aws-modules/dynamodb-table/aws"
+  version = "3.3.0"
+  name    = var.processing_ledger_table_name
+
+  hash_key           = "object_id"
+  ttl_attribute_name = "ttl"
+  ttl_enabled        = true
+
+  attributes = [
+    {
+      name = "object_id"
+      type = "S"
+    },
+  ]
+  tags = var.tags
+
+}
+
+module "cloudtrail_to_slack_dedup_table" {
+  count   = var.enable_event_deduplication && var.enable_event_deduplication_table ? 1 : 0
+  source  = "terraform-aws-modules/dynamodb-table/aws"
+  version = "3.3.0"
+  name    = var.event_deduplication_table_name
+
+  hash_key           = "event_fingerprint"
+  ttl_attribute_name = "ttl"
+  ttl_enabled        = true
+
+  attributes = [
+    {
+      name = "event_fingerprint"
+      type = "S"
+    },
+  ]
+  tags = var.tags
+
+}
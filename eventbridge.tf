@@ -0,0 +1,76 @@
+# Optional low latency ingestion: CloudTrail events published to EventBridge are buffered in SQS
+# and processed by the main lambda in batches, within seconds instead of waiting for log files.
+resource "aws_cloudwatch_event_rule" "cloudtrail" {
+  count       = var.enable_eventbridge_ingestion ? 1 : 0
+  name        = "${var.function_name}-cloudtrail"
+  description = "Send CloudTrail events to ${var.function_name}"
+  event_pattern = coalesce(var.eventbridge_ingestion_event_pattern, jsonencode({
+    "detail-type" = [
+      "AWS API Call via CloudTrail",
+      "AWS Console Sign In via CloudTrail",
+      "AWS Service Event via CloudTrail",
+    ]
+  }))
+  tags = var.tags
+}
+
+resource "aws_sqs_queue" "eventbridge_ingestion_dead_letter" {
+  count                   = var.enable_eventbridge_ingestion ? 1 : 0
+  name                    = "${var.function_name}-eventbridge-dlq"
+  sqs_managed_sse_enabled = true
+  tags                    = var.tags
+}
+
+resource "aws_sqs_queue" "eventbridge_ingestion" {
+  count                      = var.enable_eventbridge_ingestion ? 1 : 0
+  name                       = "${var.function_name}-eventbridge"
+  visibility_timeout_seconds = var.lambda_timeout_seconds * 6
+  sqs_managed_sse_enabled    = true
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.eventbridge_ingestion_dead_letter[0].arn
+    maxReceiveCount     = var.eventbridge_ingestion_max_receive_count
+  })
+
+  tags = var.tags
+}
+
+data "aws_iam_policy_document" "eventbridge_ingestion" {
+  count = var.enable_eventbridge_ingestion ? 1 : 0
+
+  statement {
+    sid     = "AllowEventBridgeToSendMessages"
+    actions = ["sqs:SendMessage"]
+    principals {
+      type        = "Service"
+      identifiers = ["events.amazonaws.com"]
+    }
+    resources = [aws_sqs_queue.eventbridge_ingestion[0].arn]
+    condition {
+      test     = "ArnEquals"
+      variable = "aws:SourceArn"
+      values   = [aws_cloudwatch_event_rule.cloudtrail[0].arn]
+    }
+  }
+}
+
+resource "aws_sqs_queue_policy" "eventbridge_ingestion" {
+  count     = var.enable_eventbridge_ingestion ? 1 : 0
+  queue_url = aws_sqs_queue.eventbridge_ingestion[0].id
+  policy    = data.aws_iam_policy_document.eventbridge_ingestion[0].json
+}
+
+resource "aws_cloudwatch_event_target" "cloudtrail" {
+  count = var.enable_eventbridge_ingestion ? 1 : 0
+  rule  = aws_cloudwatch_event_rule.cloudtrail[0].name
+  arn   = aws_sqs_queue.eventbridge_ingestion[0].arn
+}
+
+resource "aws_lambda_event_source_mapping" "eventbridge_ingestion" {
+  count                              = var.enable_eventbridge_ingestion ? 1 : 0
+  event_source_arn                   = aws_sqs_queue.eventbridge_ingestion[0].arn
+  function_name                      = module.lambda.lambda_function_arn
+  batch_size                         = var.eventbridge_ingestion_batch_size
+  maximum_batching_window_in_seconds = var.eventbridge_ingestion_batching_window_seconds
+  function_response_types            = ["ReportBatchItemFailures"]
+}
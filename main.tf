@@ -1,3 +1,75 @@
+locals {
+  # Shared by the main lambda and the delivery lambda
+  lambda_environment_variables = {
+    FUNCTION_NAME = var.function_name
+
+    HOOK_URL      = var.default_slack_hook_url
+    CONFIGURATION = try(jsonencode(var.configuration), "")
+
+    SLACK_BOT_TOKEN          = try(var.slack_bot_token, "")
+    SLACK_APP_CONFIGURATION  = try(jsonencode(var.slack_app_configuration), "")
+    DEFAULT_SLACK_CHANNEL_ID = try(var.default_slack_channel_id, "")
+
+    DEFAULT_SNS_TOPIC_ARN = try(aws_sns_topic.events_to_sns[0].arn, var.default_sns_topic_arn, "")
+    SNS_CONFIGURATION     = try(jsonencode(var.sns_configuration), "")
+
+    RULES_SEPARATOR                 = var.rules_separator
+    RULES                           = var.rules
+    IGNORE_RULES                    = var.ignore_rules
+    RULES_SOURCE                    = var.rules_source
+    RULES_SOURCE_REFRESH_SECONDS    = var.rules_source_refresh_seconds
+    EVENTS_TO_TRACK                 = var.events_to_track
+    LOG_LEVEL                       = var.log_level
+    RULE_EVALUATION_ERRORS_TO_SLACK = var.rule_evaluation_errors_to_slack
+
+    DYNAMODB_TIME_TO_LIVE = var.dynamodb_time_to_live
+    DYNAMODB_TABLE_NAME   = try(module.cloudtrail_to_slack_dynamodb_table[0].dynamodb_table_id, "")
+
+    THREAD_GROUPING_FIELDS     = join(",", var.thread_grouping_fields)
+    THREAD_GROUPING_CACHE_SIZE = var.thread_grouping_cache_size
+    THREAD_LEASE_SECONDS       = var.thread_lease_seconds
+    THREAD_LEASE_WAIT_MS       = var.thread_lease_wait_ms
+    WARM_START_SNAPSHOT        = var.warm_start_snapshot
+
+    IP_NETWORKS      = jsonencode(var.ip_networks)
+    IP_NETWORK_FILES = jsonencode(var.ip_network_files)
+
+    RATE_POLICIES                = jsonencode(var.rate_policies)
+    RATE_POLICY_SUMMARY_INTERVAL = var.rate_policy_summary_interval
+
+    LEDGER_TABLE_NAME   = try(module.cloudtrail_to_slack_ledger_table[0].dynamodb_table_id, "")
+    LEDGER_TIME_TO_LIVE = var.processing_ledger_time_to_live
+
+    USE_DEFAULT_RULES                     = var.use_default_rules
+    PUSH_ACCESS_DENIED_CLOUDWATCH_METRICS = var.push_access_denied_cloudwatch_metrics
+
+    OBJECT_KEY_ACCOUNTS  = join(",", var.object_key_accounts)
+    OBJECT_KEY_REGIONS   = join(",", var.object_key_regions)
+    OBJECT_KEY_LOG_TYPES = join(",", var.object_key_log_types)
+
+    S3_RANGED_GET_THRESHOLD   = var.s3_ranged_get_threshold
+    S3_RANGED_GET_PART_SIZE   = var.s3_ranged_get_part_size
+    S3_RANGED_GET_CONCURRENCY = var.s3_ranged_get_concurrency
+
+    TIME_BUDGET_SAFETY_MARGIN_MS = var.time_budget_safety_margin_ms
+    PACK_WEBHOOK_MESSAGES        = var.pack_webhook_messages
+
+    RULE_EVALUATION_PROCESSES = var.rule_evaluation_processes
+    RULE_VERDICT_CACHE_SIZE   = var.rule_verdict_cache_size
+
+    MEMORY_PROFILING     = var.memory_profiling
+    MEMORY_PROFILING_TOP = var.memory_profiling_top
+
+    ENABLE_EVENT_DEDUPLICATION = var.enable_event_deduplication
+    DEDUP_CAPACITY             = var.event_deduplication_capacity
+    DEDUP_FALSE_POSITIVE_RATE  = var.event_deduplication_false_positive_rate
+    DEDUP_TIME_TO_LIVE         = var.event_deduplication_time_to_live
+    DEDUP_TABLE_NAME           = try(module.cloudtrail_to_slack_dedup_table[0].dynamodb_table_id, "")
+  }
+
+  ip_network_files_in_s3 = [for location in values(var.ip_network_files) : location if startswith(location, "s3://")]
+}
+
 module "lambda" {
   source  = "terraform-aws-modules/lambda/aws"
   version = "8.8.0"
@@ -31,31 +103,9 @@ module "lambda" {
   build_in_docker          = var.lambda_build_in_docker
 
   environment_variables = merge(
+    local.lambda_environment_variables,
     {
-      FUNCTION_NAME = var.function_name
-
-      HOOK_URL      = var.default_slack_hook_url
-      CONFIGURATION = try(jsonencode(var.configuration), "")
-
-      SLACK_BOT_TOKEN          = try(var.slack_bot_token, "")
-      SLACK_APP_CONFIGURATION  = try(jsonencode(var.slack_app_configuration), "")
-      DEFAULT_SLACK_CHANNEL_ID = try(var.default_slack_channel_id, "")
-
-      DEFAULT_SNS_TOPIC_ARN = try(aws_sns_topic.events_to_sns[0].arn, var.default_sns_topic_arn, "")
-      SNS_CONFIGURATION     = try(jsonencode(var.sns_configuration), "")
-
-      RULES_SEPARATOR                 = var.rules_separator
-      RULES                           = var.rules
-      IGNORE_RULES                    = var.ignore_rules
-      EVENTS_TO_TRACK                 = var.events_to_track
-      LOG_LEVEL                       = var.log_level
-      RULE_EVALUATION_ERRORS_TO_SLACK = var.rule_evaluation_errors_to_slack
-
-      DYNAMODB_TIME_TO_LIVE = var.dynamodb_time_to_live
-      DYNAMODB_TABLE_NAME   = try(module.cloudtrail_to_slack_dynamodb_table[0].dynamodb_table_id, "")
-
-      USE_DEFAULT_RULES                     = var.use_default_rules
-      PUSH_ACCESS_DENIED_CLOUDWATCH_METRICS = var.push_access_denied_cloudwatch_metrics
+      DELIVERY_QUEUE_URL = try(aws_sqs_queue.delivery[0].url, "")
     },
   )
 
@@ -86,17 +136,153 @@ data "aws_iam_policy_document" "s3" {
       "${data.aws_s3_bucket.cloudtrail.arn}/*",
     ]
   }
+  dynamic "statement" {
+    for_each = var.enable_backfill ? [1] : []
+    content {
+      sid = "AllowLambdaToListObjectsForBackfill"
+
+      actions = [
+        "s3:ListBucket",
+      ]
+      resources = [
+        data.aws_s3_bucket.cloudtrail.arn,
+      ]
+    }
+  }
   statement {
     sid = "AllowLambdaToInteractWithDynamoDB"
 
     actions = [
       "dynamodb:PutItem",
       "dynamodb:GetItem",
+      "dynamodb:DeleteItem",
     ]
     resources = [
       "arn:${data.aws_partition.current.partition}:dynamodb:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:table/${var.dynamodb_table_name}"
     ]
   }
+  dynamic "statement" {
+    for_each = var.enable_processing_ledger ? [1] : []
+    content {
+      sid = "AllowLambdaToUseProcessingLedger"
+
+      actions = [
+        "dynamodb:GetItem",
+        "dynamodb:UpdateItem",
+      ]
+      resources = [
+        module.cloudtrail_to_slack_ledger_table[0].dynamodb_table_arn,
+      ]
+    }
+  }
+  dynamic "statement" {
+    for_each = var.enable_event_deduplication && var.enable_event_deduplication_table ? [1] : []
+    content {
+      sid = "AllowLambdaToUseDeduplicationTable"
+
+      actions = [
+        "dynamodb:PutItem",
+        "dynamodb:DeleteItem",
+      ]
+      resources = [
+        module.cloudtrail_to_slack_dedup_table[0].dynamodb_table_arn,
+      ]
+    }
+  }
+  dynamic "statement" {
+    for_each = var.enable_sqs_delivery ? [1] : []
+    content {
+      sid = "AllowLambdaToSendToDeliveryQueue"
+
+      actions = [
+        "sqs:SendMessage",
+      ]
+      resources = [
+        aws_sqs_queue.delivery[0].arn,
+      ]
+    }
+  }
+  dynamic "statement" {
+    for_each = var.enable_eventbridge_ingestion ? [1] : []
+    content {
+      sid = "AllowLambdaToReceiveEventBridgeEvents"
+
+      actions = [
+        "sqs:ReceiveMessage",
+        "sqs:DeleteMessage",
+        "sqs:GetQueueAttributes",
+      ]
+      resources = [
+        aws_sqs_queue.eventbridge_ingestion[0].arn,
+      ]
+    }
+  }
+  dynamic "statement" {
+    for_each = startswith(var.warm_start_snapshot, "s3://") ? [1] : []
+    content {
+      sid = "AllowLambdaToReadAndExportWarmStartSnapshot"
+
+      actions = [
+        "s3:GetObject",
+        "s3:PutObject",
+      ]
+      resources = [
+        "arn:${data.aws_partition.current.partition}:s3:::${trimprefix(var.warm_start_snapshot, "s3://")}",
+      ]
+    }
+  }
+  dynamic "statement" {
+    for_each = startswith(var.rules_source, "s3://") ? [1] : []
+    content {
+      sid = "AllowLambdaToReadRulesFromS3"
+
+      actions = [
+        "s3:GetObject",
+      ]
+      resources = [
+        "arn:${data.aws_partition.current.partition}:s3:::${trimprefix(var.rules_source, "s3://")}",
+      ]
+    }
+  }
+  dynamic "statement" {
+    for_each = startswith(var.rules_source, "ssm:") ? [1] : []
+    content {
+      sid = "AllowLambdaToReadRulesFromSSM"
+
+      actions = [
+        "ssm:GetParameter",
+      ]
+      resources = [
+        "arn:${data.aws_partition.current.partition}:ssm:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:parameter/${trimprefix(trimprefix(var.rules_source, "ssm:"), "/")}",
+      ]
+    }
+  }
+  dynamic "statement" {
+    for_each = local.ip_network_files_in_s3 != [] ? [1] : []
+    content {
+      sid = "AllowLambdaToReadIpNetworkFiles"
+
+      actions = [
+        "s3:GetObject",
+      ]
+      resources = [
+        for location in local.ip_network_files_in_s3 :
+        "arn:${data.aws_partition.current.partition}:s3:::${trimprefix(location, "s3://")}"
+      ]
+    }
+  }
+  statement {
+    sid = "AllowLambdaToContinueInNewInvocation"
+
+    actions = [
+      "lambda:InvokeFunction",
+    ]
+    # Built from the name to avoid a dependency cycle between the function and its policy
+    resources = [
+      "arn:${data.aws_partition.current.partition}:lambda:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:function:${var.function_name}",
+      "arn:${data.aws_partition.current.partition}:lambda:${data.aws_region.current.name}:${data.aws_caller_identity.current.account_id}:function:${var.function_name}:*",
+    ]
+  }
   statement {
     sid = "AllowLambdaToPushCloudWatchMetrics"
 
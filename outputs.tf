@@ -13,4 +13,8 @@ output "s3_sns_fanout_topic_arn" {
 output "s3_sns_fanout_topic_name" {
   value       = var.enable_s3_sns_fanout && var.create_s3_sns_fanout_topic ? aws_sns_topic.s3_notifications[0].name : null
   description = "Name of the SNS topic for S3 fan-out (only available when module creates the topic)."
-}
\ No newline at end of file
+}
+output "delivery_queue_url" {
+  value       = var.enable_sqs_delivery ? aws_sqs_queue.delivery[0].url : null
+  description = "URL of the SQS queue with matched events waiting for delivery (only available when enable_sqs_delivery is true)."
+}
@@ -0,0 +1,67 @@
+# Optional delivery stage: the main lambda sends matched events to SQS
+# and the delivery lambda posts them to Slack and SNS.
+resource "aws_sqs_queue" "delivery_dead_letter" {
+  count                   = var.enable_sqs_delivery ? 1 : 0
+  name                    = "${var.function_name}-delivery-dlq"
+  sqs_managed_sse_enabled = true
+  tags                    = var.tags
+}
+
+resource "aws_sqs_queue" "delivery" {
+  count                      = var.enable_sqs_delivery ? 1 : 0
+  name                       = "${var.function_name}-delivery"
+  visibility_timeout_seconds = var.lambda_timeout_seconds * 6
+  sqs_managed_sse_enabled    = true
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.delivery_dead_letter[0].arn
+    maxReceiveCount     = var.delivery_queue_max_receive_count
+  })
+
+  tags = var.tags
+}
+
+module "delivery_lambda" {
+  count   = var.enable_sqs_delivery ? 1 : 0
+  source  = "terraform-aws-modules/lambda/aws"
+  version = "8.8.0"
+
+  function_name = "${var.function_name}-delivery"
+  description   = "Deliver CloudTrail Events from SQS to Slack"
+  handler       = "main.delivery_handler"
+  runtime       = "python3.14"
+  timeout       = var.lambda_timeout_seconds
+  publish       = true
+
+  # Reuse the package built for the main lambda
+  create_package         = false
+  local_existing_package = module.lambda.local_filename
+
+  environment_variables = local.lambda_environment_variables
+
+  memory_size = var.lambda_memory_size
+
+  cloudwatch_logs_retention_in_days = var.lambda_logs_retention_in_days
+
+  attach_policy_json = true
+  policy_json        = data.aws_iam_policy_document.s3.json
+
+  attach_policy_statements = true
+  policy_statements = {
+    delivery_queue = {
+      effect    = "Allow"
+      actions   = ["sqs:ReceiveMessage", "sqs:DeleteMessage", "sqs:GetQueueAttributes"]
+      resources = [aws_sqs_queue.delivery[0].arn]
+    }
+  }
+
+  event_source_mapping = {
+    sqs = {
+      event_source_arn        = aws_sqs_queue.delivery[0].arn
+      batch_size              = var.delivery_queue_batch_size
+      function_response_types = ["ReportBatchItemFailures"]
+    }
+  }
+
+  tags = var.tags
+}
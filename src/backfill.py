@@ -0,0 +1,361 @@
+import argparse
+import re
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterator, List, NamedTuple, Tuple
+
+import json_codec
+from config import Config, get_logger
+from object_key import parse_cloudtrail_object_key, should_object_be_processed
+from s3_fetch import get_s3_object_body
+
+if TYPE_CHECKING:
+    from time_budget import TimeBudget
+
+logger = get_logger()
+
+# Key of the backfill section in the event passed to lambda_handler
+BACKFILL_KEY = "cloudTrailToSlackBackfill"
+
+# CloudTrail log file names contain the time of delivery: <account>_CloudTrail_<region>_20260124T0000Z_<id>.json.gz
+LOG_FILE_TIME = re.compile(r"_(\d{8}T\d{4}Z)_")
+
+# Log files are partitioned by day of delivery: <prefix>/AWSLogs/<account>/CloudTrail/<region>/YYYY/MM/DD/<file>
+YEAR_PARTITION = re.compile(r"\d{4}/")
+
+
+class BackfillRequest(NamedTuple):
+    bucket: str
+    prefix: str = ""
+    start_time: datetime | None = None
+    end_time: datetime | None = None
+    dry_run: bool = False
+    concurrency: int = 8
+    # Checkpoint file (local path or s3://bucket/key) to save progress to and resume from
+    checkpoint: str | None = None
+    # Key of the last processed object, listing is resumed after it
+    start_after: str | None = None
+    # Log files to process instead of listing the prefix, e.g. failed_objects of a previous backfill
+    keys: List[str] | None = None
+
+    @classmethod
+    def from_event(cls, raw: Dict[str, Any]) -> "BackfillRequest":
+        return cls(
+            bucket=raw["bucket"],
+            prefix=raw.get("prefix", ""),
+            start_time=parse_time(raw.get("start_time")),
+            end_time=parse_time(raw.get("end_time")),
+            dry_run=bool(raw.get("dry_run", False)),
+            concurrency=int(raw.get("concurrency", 8)),
+            checkpoint=raw.get("checkpoint"),
+            start_after=raw.get("start_after"),
+            keys=raw.get("keys"),
+        )
+
+    def to_event(self) -> Dict[str, Any]:  # noqa: ANN101
+        raw = self._asdict()
+        raw["start_time"] = self.start_time.isoformat() if self.start_time else None
+        raw["end_time"] = self.end_time.isoformat() if self.end_time else None
+        return raw
+
+
+class BackfillProgress:
+    """Counters of a backfill run, saved with checkpoints so they add up across resumed runs."""
+
+    def __init__(self, raw: Dict[str, Any] | None = None) -> None:  # noqa: ANN101
+        raw = raw or {}
+        self.objects: int = raw.get("objects", 0)
+        self.events: int = raw.get("events", 0)
+        self.matched: int = raw.get("matched", 0)
+        self.delivered: int = raw.get("delivered", 0)
+        self.failed_objects: List[str] = raw.get("failed_objects", [])
+        self.matches_per_rule: Dict[str, int] = raw.get("matches_per_rule", {})
+        self.last_key: str | None = raw.get("last_key")
+        self.completed: bool = raw.get("completed", False)
+
+    def to_dict(self) -> Dict[str, Any]:  # noqa: ANN101
+        return dict(self.__dict__)
+
+
+def parse_time(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def get_log_file_time(key: str, last_modified: datetime | None) -> datetime | None:
+    """Time of the log file from its name, falls back to LastModified for keys in other layouts."""
+    if match := LOG_FILE_TIME.search(key.rsplit("/", 1)[-1]):
+        return datetime.strptime(match.group(1), "%Y%m%dT%H%MZ").replace(tzinfo=timezone.utc)
+    return last_modified
+
+
+def list_common_prefixes(
+    s3_client,  # noqa: ANN001
+    bucket: str,
+    prefix: str,
+) -> Iterator[str]:
+    kwargs: Dict[str, Any] = {"Bucket": bucket, "Prefix": prefix, "Delimiter": "/"}
+    while True:
+        response = s3_client.list_objects_v2(**kwargs)
+        for common_prefix in response.get("CommonPrefixes", []):
+            yield common_prefix["Prefix"]
+        if not response.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def list_partitioned_prefixes(
+    s3_client,  # noqa: ANN001
+    bucket: str,
+    prefix: str,
+    cfg: Config,
+) -> Iterator[str]:
+    """
+    Yield prefixes under the given one whose subdirectories are years, e.g. AWSLogs/<account>/CloudTrail/<region>/,
+    in key order. Digest files and accounts, regions and log types that are not tracked are skipped.
+    """
+    children = list(list_common_prefixes(s3_client, bucket, prefix))
+    if any(YEAR_PARTITION.fullmatch(child[len(prefix):]) for child in children):
+        yield prefix
+        return
+    for child in children:
+        if "Digest" in child or not should_object_be_processed(parse_cloudtrail_object_key(f"{child}file"), cfg):
+            continue
+        yield from list_partitioned_prefixes(s3_client, bucket, child, cfg)
+
+
+def list_log_objects(
+    s3_client,  # noqa: ANN001
+    request: BackfillRequest,
+    cfg: Config,
+) -> Iterator[Tuple[str, int | None]]:
+    """
+    Yield key and size of log files under the prefix within the time range, in key order.
+    With a time range only the days within it are listed in each partitioned prefix,
+    keys in other layouts are listed in full and filtered by time of the log file.
+    """
+    if request.keys is not None:
+        for key in sorted(request.keys):
+            if not request.start_after or key > request.start_after:
+                yield key, None
+        return
+
+    partitioned_prefixes = []
+    if request.start_time or request.end_time:
+        partitioned_prefixes = list(list_partitioned_prefixes(s3_client, request.bucket, request.prefix, cfg))
+    if not partitioned_prefixes:
+        yield from list_log_objects_under_prefix(s3_client, request, cfg, request.prefix, request.start_after or "", None)
+        return
+
+    for prefix in partitioned_prefixes:
+        if request.start_after and request.start_after > prefix and not request.start_after.startswith(prefix):
+            # Processed before the backfill was resumed
+            continue
+        start_after = max(request.start_after or "", f"{prefix}{request.start_time:%Y/%m/%d}/" if request.start_time else "")
+        stop_at = None
+        if request.end_time:
+            # end_time is exclusive, the partition of the day after its last included moment is not listed
+            stop_at = f"{prefix}{request.end_time - timedelta(microseconds=1) + timedelta(days=1):%Y/%m/%d}/"
+        yield from list_log_objects_under_prefix(s3_client, request, cfg, prefix, start_after, stop_at)
+
+
+def list_log_objects_under_prefix(  # noqa: PLR0913
+    s3_client,  # noqa: ANN001
+    request: BackfillRequest,
+    cfg: Config,
+    prefix: str,
+    start_after: str,
+    stop_at: str | None,
+) -> Iterator[Tuple[str, int | None]]:
+    """Yield key and size of log files after start_after and before stop_at, paginated."""
+    kwargs: Dict[str, Any] = {"Bucket": request.bucket, "Prefix": prefix}
+    if start_after:
+        kwargs["StartAfter"] = start_after
+    while True:
+        response = s3_client.list_objects_v2(**kwargs)
+        for obj in response.get("Contents", []):
+            key = obj["Key"]
+            if stop_at is not None and key >= stop_at:
+                return
+            if "Digest" in key or not should_object_be_processed(parse_cloudtrail_object_key(key), cfg):
+                continue
+            log_file_time = get_log_file_time(key, obj.get("LastModified"))
+            if log_file_time is not None and (
+                (request.start_time and log_file_time < request.start_time)
+                or (request.end_time and log_file_time >= request.end_time)
+            ):
+                continue
+            yield key, obj.get("Size")
+        if not response.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def fetch_log_events(
+    s3_client,  # noqa: ANN001
+    bucket: str,
+    key: str,
+    size: int | None,
+    cfg: Config,
+) -> List[Dict[str, Any]]:
+    body = get_s3_object_body(s3_client=s3_client, bucket=bucket, key=key, cfg=cfg, size=size)
+    with body:
+        return json_codec.load_gzip(body)["Records"]
+
+
+def read_checkpoint(
+    location: str,
+    s3_client,  # noqa: ANN001
+) -> Dict[str, Any] | None:
+    try:
+        if location.startswith("s3://"):
+            bucket, _, key = location[len("s3://"):].partition("/")
+            return json_codec.loads(s3_client.get_object(Bucket=bucket, Key=key)["Body"].read())
+        with open(location, "rb") as f:
+            return json_codec.loads(f.read())
+    except Exception as e:
+        logger.info({"No backfill checkpoint to resume from": {"location": location, "error": str(e)}})
+        return None
+
+
+def write_checkpoint(
+    location: str,
+    progress: BackfillProgress,
+    s3_client,  # noqa: ANN001
+) -> None:
+    data = json_codec.dumps_bytes(progress.to_dict())
+    if location.startswith("s3://"):
+        bucket, _, key = location[len("s3://"):].partition("/")
+        s3_client.put_object(Bucket=bucket, Key=key, Body=data)
+        return
+    with open(location, "wb") as f:
+        f.write(data)
+
+
+def run_backfill(  # noqa: PLR0913
+    request: BackfillRequest,
+    s3_client,  # noqa: ANN001
+    cfg: Config,
+    process_event: Callable[[Dict[str, Any], str, bool], Tuple[str | None, bool]],
+    flush: Callable[[], None],
+    time_budget: "TimeBudget | None" = None,
+    progress: BackfillProgress | None = None,
+    checkpoint_every: int = 100,
+) -> BackfillProgress:
+    """
+    Process log files listed by the request. Files are downloaded and decompressed by a pool of
+    `request.concurrency` workers, a few files ahead of the rule engine, and evaluated in key order,
+    so progress is a single key to resume listing after.
+
+    process_event(event, object_key, dry_run) returns the rule the event matched (or None)
+    and whether the event was delivered. flush delivers buffered events before progress is saved.
+    Processing stops between files when time budget runs out, progress.completed is False then.
+    Files that could not be fetched or processed are added to progress.failed_objects and skipped,
+    they can be processed again with a request with these keys.
+    """
+    progress = progress or BackfillProgress()
+    if request.checkpoint and (saved := read_checkpoint(request.checkpoint, s3_client)) is not None:
+        progress = BackfillProgress(saved)
+        if progress.completed:
+            logger.info({"Backfill is already completed": progress.to_dict()})
+            return progress
+        request = request._replace(start_after=progress.last_key or request.start_after)
+
+    def save_checkpoint() -> None:
+        flush()
+        if request.checkpoint:
+            write_checkpoint(request.checkpoint, progress, s3_client)
+
+    objects = list_log_objects(s3_client, request, cfg)
+    in_flight: Deque[Tuple[str, Future]] = deque()
+    with ThreadPoolExecutor(max_workers=max(1, request.concurrency)) as executor:
+
+        def schedule() -> None:
+            # Bounded read-ahead keeps memory use flat for any number of files
+            while len(in_flight) < 2 * max(1, request.concurrency):
+                try:
+                    key, size = next(objects)
+                except StopIteration:
+                    return
+                in_flight.append((key, executor.submit(fetch_log_events, s3_client, request.bucket, key, size, cfg)))
+
+        schedule()
+        while in_flight:
+            if progress.objects and time_budget is not None and time_budget.is_exhausted():
+                for _, future in in_flight:
+                    future.cancel()
+                save_checkpoint()
+                return progress
+            key, future = in_flight.popleft()
+            schedule()
+            try:
+                process_log_events(future.result(), key, request.dry_run, process_event, progress)
+            except Exception as e:
+                logger.exception({"Failed to process log file": {"key": key, "error": e}})
+                progress.failed_objects.append(key)
+            progress.objects += 1
+            progress.last_key = key
+            if progress.objects % checkpoint_every == 0:
+                save_checkpoint()
+
+    progress.completed = True
+    save_checkpoint()
+    logger.info({"Backfill completed": progress.to_dict()})
+    return progress
+
+
+def process_log_events(
+    events: List[Dict[str, Any]],
+    key: str,
+    dry_run: bool,
+    process_event: Callable[[Dict[str, Any], str, bool], Tuple[str | None, bool]],
+    progress: BackfillProgress,
+) -> None:
+    for event in events:
+        progress.events += 1
+        rule, delivered = process_event(event, key, dry_run)
+        if rule is None:
+            continue
+        progress.matched += 1
+        progress.matches_per_rule[rule] = progress.matches_per_rule.get(rule, 0) + 1
+        progress.delivered += delivered
+
+
+def run_from_command_line() -> None:
+    """Run backfill from the command line, e.g. against a local S3 stand-in with --endpoint-url."""
+    import boto3
+
+    import main as handler
+
+    parser = argparse.ArgumentParser(description="Process historical CloudTrail log files with the configured rules")
+    parser.add_argument("--bucket", required=True)
+    parser.add_argument("--prefix", default="")
+    parser.add_argument("--start-time", help="ISO 8601, e.g. 2026-01-01T00:00:00Z")
+    parser.add_argument("--end-time", help="ISO 8601, exclusive")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--checkpoint", help="File or s3://bucket/key to save progress to and resume from")
+    parser.add_argument("--key", action="append", dest="keys", help="Log file to process instead of listing the prefix, can be repeated")
+    parser.add_argument("--dry-run", action="store_true", help="Only report match counts per rule")
+    parser.add_argument("--endpoint-url", help="S3 endpoint, e.g. http://localhost:4566")
+    args = parser.parse_args()
+
+    request = BackfillRequest(
+        bucket=args.bucket,
+        prefix=args.prefix,
+        start_time=parse_time(args.start_time),
+        end_time=parse_time(args.end_time),
+        dry_run=args.dry_run,
+        concurrency=args.concurrency,
+        checkpoint=args.checkpoint,
+        keys=args.keys,
+    )
+    source_s3_client = boto3.client("s3", endpoint_url=args.endpoint_url) if args.endpoint_url else None
+    progress = handler.run_backfill_request(request, source_s3_client=source_s3_client)
+    print(json_codec.dumps_pretty(progress.to_dict()))  # noqa: T201
+
+
+if __name__ == "__main__":
+    run_from_command_line()
@@ -0,0 +1,67 @@
+import base64
+import io
+from typing import Any, Dict, List, NamedTuple
+
+import json_codec
+from config import get_logger
+
+logger = get_logger()
+
+DATA_MESSAGE = "DATA_MESSAGE"
+
+
+class CloudWatchLogsBatch(NamedTuple):
+    # Shown as source of the alert instead of the log file name
+    source: str
+    events: List[Dict[str, Any]]
+
+
+def is_cloudwatch_logs_event(incoming_event: Dict[str, Any]) -> bool:
+    return isinstance(incoming_event.get("awslogs"), dict) and "data" in incoming_event["awslogs"]
+
+
+def decode_cloudwatch_logs_event(incoming_event: Dict[str, Any]) -> CloudWatchLogsBatch:
+    """
+    Decode CloudWatch Logs subscription payload (base64 encoded gzip of JSON) into CloudTrail records,
+    in the same shape as records of CloudTrail log files. Control messages, sent when subscription
+    filter is created, produce no events.
+    """
+    payload = json_codec.load_gzip(io.BytesIO(base64.b64decode(incoming_event["awslogs"]["data"])))
+    source = f"{payload.get('logGroup')}:{payload.get('logStream')}"
+    if payload.get("messageType") != DATA_MESSAGE:
+        logger.info({"Skipping CloudWatch Logs message": {"messageType": payload.get("messageType"), "source": source}})
+        return CloudWatchLogsBatch(source, [])
+    return CloudWatchLogsBatch(source, parse_log_event_messages([log_event["message"] for log_event in payload["logEvents"]]))
+
+
+def parse_log_event_messages(messages: List[str]) -> List[Dict[str, Any]]:
+    """
+    Every message is a single CloudTrail record. Messages are joined into one JSON array and decoded with
+    a single call, a batch with a malformed message is decoded message by message to skip only that one.
+    """
+    try:
+        events = json_codec.loads(f"[{','.join(messages)}]")
+        # A message with a bare list of values would shift the records
+        if len(events) == len(messages):
+            return get_records(events)
+    except json_codec.JSONDecodeError:
+        pass
+    events = []
+    for message in messages:
+        try:
+            events.append(json_codec.loads(message))
+        except json_codec.JSONDecodeError as e:
+            logger.error({"Failed to parse CloudWatch Logs message": {"error": str(e), "message": message}})
+    return get_records(events)
+
+
+def get_records(values: List[Any]) -> List[Dict[str, Any]]:
+    """Messages that are valid JSON but not an object (a string, number, ...) can't be CloudTrail records."""
+    records = [value for value in values if isinstance(value, dict)]
+    if len(records) != len(values):
+        logger.warning({
+            "Skipping CloudWatch Logs messages that are not CloudTrail records": {
+                "values": [value for value in values if not isinstance(value, dict)],
+            }
+        })
+    return records
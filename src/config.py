@@ -1,6 +1,7 @@
 from typing import List, Dict, Union
 import os
 import json
+import json_codec
 from rules import default_rules
 import logging
 from datetime import datetime
@@ -56,18 +57,31 @@ class Config:
         self.default_sns_topic_arn: str | None = os.environ.get("DEFAULT_SNS_TOPIC_ARN")
         raw_sns_configuration: str = os.environ.get("SNS_CONFIGURATION", "")
         self.sns_configuration: List[Dict] = json.loads(raw_sns_configuration) if raw_sns_configuration else[]
+        # First matching configuration wins, same as scanning sns_configuration in order
+        self.sns_topic_arn_by_account: Dict[str, str] = {}
+        for item in self.sns_configuration:
+            for account_id in item.get("accounts", []):
+                self.sns_topic_arn_by_account.setdefault(account_id, item["sns_topic_arn"])
 
         self.rule_evaluation_errors_to_slack: bool = os.environ.get("RULE_EVALUATION_ERRORS_TO_SLACK") # type: ignore # noqa: PGH003, E501
         self.rules_separator: str = os.environ.get("RULES_SEPARATOR", ",")
         self.user_rules: List[str] = self.parse_rules_from_string(os.environ.get("RULES"), self.rules_separator) # noqa: E501
         self.ignore_rules: List[str] = self.parse_rules_from_string(os.environ.get("IGNORE_RULES"), self.rules_separator) # noqa: E501
         self.use_default_rules: bool = self.get_bool_from_env_var("USE_DEFAULT_RULES")
+        # Rules and ignore rules from an S3 object (s3://bucket/key) or SSM parameter (ssm:name), see rule_source.py
+        self.rules_source: str = os.environ.get("RULES_SOURCE", "")
+        self.rules_source_refresh_seconds: int = int(os.environ.get("RULES_SOURCE_REFRESH_SECONDS", "60"))
         self.events_to_track: str | None = os.environ.get("EVENTS_TO_TRACK")
 
         self.dynamodb_table_name: str | None = os.environ.get("DYNAMODB_TABLE_NAME")
         self.dynamodb_time_to_live: int = int(os.environ.get("DYNAMODB_TIME_TO_LIVE", "900"))
         self.push_access_denied_cloudwatch_metrics: bool = self.get_bool_from_env_var("PUSH_ACCESS_DENIED_CLOUDWATCH_METRICS")
 
+        self.read_thread_settings()
+        self.read_rule_evaluation_settings()
+        self.read_delivery_settings()
+        self.read_s3_settings()
+
         self.rules = []
         if self.use_default_rules:
             self.rules += default_rules
@@ -79,6 +93,75 @@ class Config:
         if not self.rules:
             raise Exception("Have no rules to apply! Check configuration - add some, or enable default.")
 
+    def read_thread_settings(self) -> None:  # noqa: ANN101
+        """Slack thread grouping and the warm start snapshot of thread caches."""
+        # Only one execution environment creates a thread, others wait for it up to thread_lease_wait_ms
+        self.thread_lease_seconds: int = int(os.environ.get("THREAD_LEASE_SECONDS", "10"))
+        self.thread_lease_wait_ms: int = int(os.environ.get("THREAD_LEASE_WAIT_MS", "2000"))
+        # Fields that, together with eventName, define which events are grouped into one thread
+        self.thread_grouping_fields: List[str] = self.get_list_from_env_var("THREAD_GROUPING_FIELDS", "type,principalId,arn,accountId") # noqa: E501
+        self.thread_grouping_cache_size: int = int(os.environ.get("THREAD_GROUPING_CACHE_SIZE", "4096"))
+
+        # Snapshot of thread caches to load at init, file path or s3://bucket/key
+        self.warm_start_snapshot: str | None = os.environ.get("WARM_START_SNAPSHOT")
+
+    def read_rule_evaluation_settings(self) -> None:  # noqa: ANN101
+        """Rate policies, rule helpers, evaluation of rules and memory profiling."""
+        # Rate policies for matched events, see rate_policy.py
+        raw_rate_policies: str = os.environ.get("RATE_POLICIES", "")
+        self.rate_policies: List[Dict] = json.loads(raw_rate_policies) if raw_rate_policies else []
+        self.rate_policy_summary_interval: int = int(os.environ.get("RATE_POLICY_SUMMARY_INTERVAL", "300"))
+
+        # Named lists of IP networks for the ip_in rule helper, inline and from files (path or s3://bucket/key)
+        raw_ip_networks: str = os.environ.get("IP_NETWORKS", "")
+        self.ip_networks: Dict[str, List[str]] = json.loads(raw_ip_networks) if raw_ip_networks else {}
+        raw_ip_network_files: str = os.environ.get("IP_NETWORK_FILES", "")
+        self.ip_network_files: Dict[str, str] = json.loads(raw_ip_network_files) if raw_ip_network_files else {}
+
+        # Report peak memory and top allocation sites per stage of every invocation, slows processing down
+        self.memory_profiling: bool = self.get_bool_from_env_var("MEMORY_PROFILING")
+        self.memory_profiling_top: int = int(os.environ.get("MEMORY_PROFILING_TOP", "10"))
+
+        # Results of rule evaluation cached by values of the fields rules reference, 0 disables the cache
+        self.rule_verdict_cache_size: int = int(os.environ.get("RULE_VERDICT_CACHE_SIZE", "4096"))
+
+        # Worker processes evaluating rules for large log files, needs more than one vCPU (1769 MB of memory or more)
+        self.rule_evaluation_processes: int = int(os.environ.get("RULE_EVALUATION_PROCESSES", "0"))
+
+    def read_delivery_settings(self) -> None:  # noqa: ANN101
+        """Ledger, deduplication, time budget and delivery of matched events."""
+        # Processing ledger to skip already processed objects on retries and duplicate notifications
+        self.ledger_table_name: str | None = os.environ.get("LEDGER_TABLE_NAME")
+        self.ledger_time_to_live: int = int(os.environ.get("LEDGER_TIME_TO_LIVE", "86400"))
+
+        # Drop duplicate events, e.g. delivered by both organization and account trails
+        self.enable_event_deduplication: bool = self.get_bool_from_env_var("ENABLE_EVENT_DEDUPLICATION")
+        self.dedup_capacity: int = int(os.environ.get("DEDUP_CAPACITY", "100000"))
+        self.dedup_false_positive_rate: float = float(os.environ.get("DEDUP_FALSE_POSITIVE_RATE", "0.000001"))
+        self.dedup_time_to_live: int = int(os.environ.get("DEDUP_TIME_TO_LIVE", "3600"))
+        self.dedup_table_name: str | None = os.environ.get("DEDUP_TABLE_NAME")
+
+        # Stop processing and continue in a new invocation when less than this time is left, 0 disables it
+        self.time_budget_safety_margin_ms: int = int(os.environ.get("TIME_BUDGET_SAFETY_MARGIN_MS", "5000"))
+
+        # Pack messages for the same Slack webhook into as few requests as possible
+        self.pack_webhook_messages: bool = self.get_bool_from_env_var("PACK_WEBHOOK_MESSAGES")
+
+        # Optional SQS queue to decouple delivery to Slack and SNS from processing of log files
+        self.delivery_queue_url: str | None = os.environ.get("DELIVERY_QUEUE_URL")
+
+    def read_s3_settings(self) -> None:  # noqa: ANN101
+        """Filtering and download of CloudTrail log files."""
+        # Pre-routing based on the CloudTrail object key, empty list means no filtering
+        self.object_key_accounts: List[str] = self.get_list_from_env_var("OBJECT_KEY_ACCOUNTS")
+        self.object_key_regions: List[str] = self.get_list_from_env_var("OBJECT_KEY_REGIONS")
+        self.object_key_log_types: List[str] = self.get_list_from_env_var("OBJECT_KEY_LOG_TYPES")
+
+        # Objects of this size (in bytes) or larger are downloaded with concurrent byte-range GETs
+        self.s3_ranged_get_threshold: int = int(os.environ.get("S3_RANGED_GET_THRESHOLD", str(64 * 1024 * 1024)))
+        self.s3_ranged_get_part_size: int = int(os.environ.get("S3_RANGED_GET_PART_SIZE", str(8 * 1024 * 1024)))
+        self.s3_ranged_get_concurrency: int = int(os.environ.get("S3_RANGED_GET_CONCURRENCY", "8"))
+
     @staticmethod
     def parse_rules_from_string(rules_as_string: str | None, rules_separator: str) -> List[str]:
         if not rules_as_string:
@@ -91,6 +174,11 @@ class Config:
     def get_bool_from_env_var(env_var_name: str) -> bool:
         return os.environ.get(env_var_name, "").lower() in ["true", "1"]
 
+    @staticmethod
+    def get_list_from_env_var(env_var_name: str, default: str = "") -> List[str]:
+        raw_value = os.environ.get(env_var_name, default)
+        return [x for x in raw_value.replace(" ", "").split(",") if x]
+
 
 
 class JsonFormatter(logging.Formatter):
@@ -107,7 +195,8 @@ class JsonFormatter(logging.Formatter):
         if isinstance(record.msg, set):
             log_entry["message"] = str(record.msg)
 
-        return json.dumps(log_entry)
+        # Log messages often contain exceptions and other objects that are not JSON serializable
+        return json_codec.dumps(log_entry, default=str)
 
 def get_logger(name: str ="main") -> logging.Logger:
     log_level = os.environ.get("LOG_LEVEL", "INFO")
@@ -0,0 +1,156 @@
+import hashlib
+import math
+import time
+
+import json_codec
+from config import Config, get_logger
+
+logger = get_logger()
+
+
+class BloomFilter:
+    """Set of strings with no false negatives and a bounded rate of false positives, in fixed memory."""
+
+    def __init__(self, capacity: int, false_positive_rate: float) -> None:  # noqa: ANN101
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> list[int]:  # noqa: ANN101
+        # Double hashing: k positions from two 64 bit halves of a single digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str) -> None:  # noqa: ANN101
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:  # noqa: ANN101
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class ExpiringBloomFilter:
+    """
+    Bloom filter with time based eviction. Keys are added to the current generation and looked up
+    in the current and the previous one. Generations rotate every `time_to_live` seconds,
+    so keys are remembered for at least `time_to_live` and at most twice as long.
+    """
+
+    def __init__(self, capacity: int, false_positive_rate: float, time_to_live: int) -> None:  # noqa: ANN101
+        self._capacity = capacity
+        # Key is looked up in two generations, so each gets half of the false positive budget
+        self._false_positive_rate = false_positive_rate / 2
+        self._time_to_live = time_to_live
+        self._current = BloomFilter(capacity, self._false_positive_rate)
+        self._previous: BloomFilter | None = None
+        self._rotated_at = time.monotonic()
+
+    def _rotate_if_expired(self) -> None:  # noqa: ANN101
+        now = time.monotonic()
+        if now - self._rotated_at < self._time_to_live:
+            return
+        # If nothing was added for two periods, the current generation is expired as well
+        self._previous = self._current if now - self._rotated_at < 2 * self._time_to_live else None
+        self._current = BloomFilter(self._capacity, self._false_positive_rate)
+        self._rotated_at = now
+
+    def add(self, key: str) -> None:  # noqa: ANN101
+        self._rotate_if_expired()
+        self._current.add(key)
+
+    def __contains__(self, key: str) -> bool:  # noqa: ANN101
+        self._rotate_if_expired()
+        return key in self._current or (self._previous is not None and key in self._previous)
+
+
+def get_event_fingerprint(event: dict) -> str:
+    """eventID is unique per event across trails, fall back to the hash of content for events without it."""
+    if event_id := event.get("eventID"):
+        return event_id
+    return hashlib.sha256(json_codec.dumps_canonical(event)).hexdigest()
+
+
+def claim_event_fingerprint_in_dynamodb(
+    fingerprint: str,
+    dynamodb_client,  # noqa: ANN001
+    cfg: Config,
+) -> bool:
+    """Store fingerprint in DynamoDB, returns False if it is already there and not expired."""
+    now = int(time.time())
+    try:
+        dynamodb_client.put_item(
+            TableName=cfg.dedup_table_name,
+            Item={
+                "event_fingerprint": {"S": fingerprint},
+                "ttl": {"N": str(now + cfg.dedup_time_to_live)},
+            },
+            ConditionExpression="attribute_not_exists(event_fingerprint) OR #ttl < :now",
+            ExpressionAttributeNames={"#ttl": "ttl"},
+            ExpressionAttributeValues={":now": {"N": str(now)}},
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+
+def release_event_fingerprint_in_dynamodb(
+    fingerprint: str,
+    dynamodb_client,  # noqa: ANN001
+    cfg: Config,
+) -> None:
+    """Remove fingerprint claimed for event that failed to deliver, so it can be delivered on retry."""
+    dynamodb_client.delete_item(TableName=cfg.dedup_table_name, Key={"event_fingerprint": {"S": fingerprint}})
+
+
+class EventClaims:
+    """
+    Fingerprints of events handled by this execution environment, used to drop duplicates.
+    Memory is checked first, so duplicates seen by this execution environment cost no network I/O.
+    Events not seen locally are claimed in DynamoDB, if configured, to catch duplicates across environments.
+
+    Claimed events are held until delivery buffers (SNS batches, packed webhook messages, SQS batches) are flushed.
+    They are remembered after a successful flush and released in DynamoDB after a failed one,
+    so a retry delivers them again instead of dropping them as duplicates.
+    """
+
+    def __init__(self, seen_events: ExpiringBloomFilter, dynamodb_client, cfg: Config) -> None:  # noqa: ANN001, ANN101
+        self.seen_events = seen_events
+        self._dynamodb_client = dynamodb_client
+        self._cfg = cfg
+        self._held: set[str] = set()
+
+    def claim(self, event: dict) -> str | None:  # noqa: ANN101
+        """Return fingerprint of the event, or None if the event is a duplicate."""
+        fingerprint = get_event_fingerprint(event)
+        if fingerprint in self._held or fingerprint in self.seen_events:
+            logger.info({"Event was already processed by this execution environment": {"fingerprint": fingerprint}})
+            return None
+
+        if self._cfg.dedup_table_name and not claim_event_fingerprint_in_dynamodb(fingerprint, self._dynamodb_client, self._cfg):
+            logger.info({"Event was already processed by another execution environment": {"fingerprint": fingerprint}})
+            self.seen_events.add(fingerprint)
+            return None
+        return fingerprint
+
+    def hold(self, fingerprint: str) -> None:  # noqa: ANN101
+        """Keep claim of a handled event until delivery buffers are flushed."""
+        self._held.add(fingerprint)
+
+    def release(self, fingerprint: str) -> None:  # noqa: ANN101
+        """Release claim of an event that failed to deliver, so it can be delivered on retry."""
+        if self._cfg.dedup_table_name:
+            release_event_fingerprint_in_dynamodb(fingerprint, self._dynamodb_client, self._cfg)
+
+    def flushed(self) -> None:  # noqa: ANN101
+        for fingerprint in self._held:
+            self.seen_events.add(fingerprint)
+        self._held.clear()
+
+    def flush_failed(self) -> None:  # noqa: ANN101
+        held, self._held = self._held, set()
+        for fingerprint in held:
+            try:
+                self.release(fingerprint)
+            except Exception as e:
+                logger.exception({"Failed to release event fingerprint": {"fingerprint": fingerprint, "error": e}})
@@ -1,55 +1,145 @@
 import hashlib
 import time
+from collections import OrderedDict
+from typing import List, NamedTuple, Tuple
 
 from config import Config, get_logger
 
 logger = get_logger()
 
 
-def hash_user_identity_and_event_name(event: dict,) -> str | None:
+# Fields that can be used to group events into threads, userIdentity fields are read from event["userIdentity"].
+# eventName is always part of the key.
+USER_IDENTITY_FIELDS = ("type", "principalId", "arn", "accountId")
+THREAD_GROUPING_FIELDS = (*USER_IDENTITY_FIELDS, "awsRegion", "eventSource")
+DEFAULT_THREAD_GROUPING_FIELDS = list(USER_IDENTITY_FIELDS)
 
-    user_identity = event.get("userIdentity")
-    if not user_identity:
-        logger.info({"No userIdentity in event": {"event": event}})
-        return None
 
-    type = user_identity.get("type", "N/A")
-    principalId = user_identity.get("principalId", "N/A")
-    arn = user_identity.get("arn", "N/A")
-    accountId = user_identity.get("accountId", "N/A")
+class ThreadGroupingKey:
+    """
+    Hashes the configured fields of an event and its eventName into the key used to group similar events
+    into one Slack thread. Hashes are memoized per tuple of field values in a bounded LRU cache,
+    since the same principals usually trigger the same events over and over.
+    """
 
-    na_count = sum(x == "N/A" for x in [type, principalId, arn, accountId])
+    def __init__(  # noqa: ANN101
+        self,
+        fields: List[str] | None = None,
+        cache_size: int = 4096,
+    ) -> None:
+        fields = fields or DEFAULT_THREAD_GROUPING_FIELDS
+        unknown_fields = [field for field in fields if field not in THREAD_GROUPING_FIELDS]
+        if unknown_fields:
+            raise ValueError(f"Unknown thread grouping fields: {unknown_fields}, supported: {list(THREAD_GROUPING_FIELDS)}") # noqa: E501
+        self.fields = fields
+        self._identity_field_count = sum(field in USER_IDENTITY_FIELDS for field in fields)
+        self._cache_size = cache_size
+        self._cache: OrderedDict[Tuple[str | None, ...], str | None] = OrderedDict()
 
-    # If more than 3 elements are "N/A", return None, cause we can't be sure that we will get a unique hash.
-    if na_count >= 3: # noqa: PLR2004
-        logger.info({"Not enough information to hash": {"event": event["userIdentity"]}})
-        return None
-    logger.info({"Hashing user identity and event name"})
-    combined = type + principalId + arn + accountId + event["eventName"]
-    # Concatenate the user_identity string and event_name
+    def hash(self, event: dict) -> str | None:  # noqa: ANN101
+        user_identity = event.get("userIdentity")
+        if not user_identity:
+            logger.info({"No userIdentity in event": {"event_id": event.get("eventID")}})
+            return None
+
+        values = tuple(
+            (user_identity if field in USER_IDENTITY_FIELDS else event).get(field) for field in self.fields
+        ) + (event["eventName"],)
+        try:
+            self._cache.move_to_end(values)
+            return self._cache[values]
+        except KeyError:
+            pass
 
+        hash_value = self._hash_values(values)
+        if hash_value is None:
+            logger.info({"Not enough information to hash": {"event_id": event.get("eventID")}})
+        self._cache[values] = hash_value
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return hash_value
 
-    # Hash the combined string using SHA256
-    result = hashlib.sha256(combined.encode())
+    def _hash_values(self, values: Tuple[str | None, ...]) -> str | None:  # noqa: ANN101
+        values = tuple(value if value is not None else "N/A" for value in values)
+        # Values of the fields are followed by eventName
+        known_identity_values = sum(
+            value != "N/A" for field, value in zip(self.fields, values[:-1], strict=True) if field in USER_IDENTITY_FIELDS
+        )
+        # If less than 2 user identity elements are known, we can't be sure that we will get a unique hash.
+        if known_identity_values < min(2, self._identity_field_count):
+            return None
+        return hashlib.sha256("".join(values).encode()).hexdigest()
 
-    # Return the hexadecimal representation of the hash
-    logger.debug({"Hash value": result.hexdigest()})
-    return result.hexdigest()
+    def export_cache(self) -> List[Tuple[Tuple[str | None, ...], str | None]]:  # noqa: ANN101
+        return list(self._cache.items())
 
+    def import_cache(self, items: List[Tuple[Tuple[str | None, ...], str | None]]) -> None:  # noqa: ANN101
+        for values, hash_value in items[-self._cache_size:]:
+            self._cache[tuple(values)] = hash_value
 
-def put_event_to_dynamodb(
+
+class RecentThreads:
+    """
+    Bounded in-memory cache of thread_ts by thread grouping hash, with expiration time of the DynamoDB item.
+    Saves DynamoDB lookups for events that keep coming from the same principal.
+    """
+
+    def __init__(self, size: int = 4096) -> None:  # noqa: ANN101
+        self._size = size
+        self._threads: OrderedDict[str, Tuple[str, int]] = OrderedDict()
+
+    def get(self, hash_value: str) -> str | None:  # noqa: ANN101
+        thread = self._threads.get(hash_value)
+        if thread is None:
+            return None
+        if thread[1] < int(time.time()):
+            del self._threads[hash_value]
+            return None
+        self._threads.move_to_end(hash_value)
+        return thread[0]
+
+    def put(self, hash_value: str, thread_ts: str, expire_at: int) -> None:  # noqa: ANN101
+        self._threads[hash_value] = (thread_ts, expire_at)
+        self._threads.move_to_end(hash_value)
+        if len(self._threads) > self._size:
+            self._threads.popitem(last=False)
+
+    def export_cache(self) -> List[Tuple[str, str, int]]:  # noqa: ANN101
+        now = int(time.time())
+        return [(hash_value, thread_ts, expire_at) for hash_value, (thread_ts, expire_at) in self._threads.items() if expire_at >= now] # noqa: E501
+
+    def import_cache(self, items: List[Tuple[str, str, int]]) -> None:  # noqa: ANN101
+        now = int(time.time())
+        for hash_value, thread_ts, expire_at in items:
+            if expire_at >= now:
+                self.put(hash_value, thread_ts, expire_at)
+
+
+default_thread_grouping_key = ThreadGroupingKey()
+
+
+def hash_user_identity_and_event_name(
     event: dict,
+    thread_grouping_key: ThreadGroupingKey | None = None,
+) -> str | None:
+    return (thread_grouping_key or default_thread_grouping_key).hash(event)
+
+
+def put_event_to_dynamodb(
+    hash_value: str | None,
     thread_ts: str,
     dynamodb_client, # noqa: ANN001,
-    cfg: Config
+    cfg: Config,
+    recent_threads: RecentThreads | None = None,
 ) -> dict | None:
-    hash_value = hash_user_identity_and_event_name(event)
     if not hash_value:
-        logger.info({"No hash value returned from hash_user_identity_and_event_name, not putting event to DynamoDB"}) # noqa: E501
+        logger.info({"No thread grouping hash for event, not putting event to DynamoDB"})
         return None
 
-    logger.debug({"Putting event to DynamoDB": {"event": event}})
+    logger.debug({"Putting event to DynamoDB": {"hash_value": hash_value}})
     expire_at = int(time.time()) + cfg.dynamodb_time_to_live
+    if recent_threads is not None:
+        recent_threads.put(hash_value, thread_ts, expire_at)
 
     return dynamodb_client.put_item(
         TableName = cfg.dynamodb_table_name,
@@ -63,13 +153,15 @@ def put_event_to_dynamodb(
 def check_dynamodb_for_similar_events(
         hash_value: str,
         dynamodb_client, # noqa: ANN001
-        cfg: Config
+        cfg: Config,
+        consistent_read: bool = False,
 ) -> dict | None:
     response = dynamodb_client.get_item(
         TableName = cfg.dynamodb_table_name,
         Key={
             "principal_structure_and_action_hash": {"S": hash_value}
-        }
+        },
+        ConsistentRead = consistent_read,
     )
     item = response.get("Item", None)
     if not item:
@@ -85,18 +177,120 @@ def check_dynamodb_for_similar_events(
 
 def get_thread_ts_from_dynamodb(
         cfg: Config,
-        event: dict,
-        dynamodb_client # noqa: ANN001
+        hash_value: str | None,
+        dynamodb_client, # noqa: ANN001
+        recent_threads: RecentThreads | None = None,
 ) -> str | None:
-    hash_vaule = hash_user_identity_and_event_name(event)
-    if not hash_vaule:
+    if not hash_value:
         return None
+    if recent_threads is not None and (thread_ts := recent_threads.get(hash_value)) is not None:
+        logger.debug({"Found similar event in memory": {"hash_value": hash_value}})
+        return thread_ts
     item = check_dynamodb_for_similar_events(
-        hash_value = hash_vaule,
+        hash_value = hash_value,
         dynamodb_client = dynamodb_client,
         cfg = cfg
         )
-    if item:
+    # Item without thread_ts is a lease of the environment that is creating the thread
+    if item and "thread_ts" in item:
+        if recent_threads is not None:
+            recent_threads.put(hash_value, item["thread_ts"]["S"], int(item["ttl"]["N"]))
         return item["thread_ts"]["S"]
     else:
         return None
+
+
+def try_acquire_thread_lease(
+        hash_value: str,
+        dynamodb_client, # noqa: ANN001
+        cfg: Config,
+) -> bool:
+    """
+    Conditionally put item without thread_ts, so only one execution environment creates the thread for the hash.
+    Lease can be taken over if it is not completed within thread_lease_seconds, e.g. if its owner crashed.
+    """
+    now = int(time.time())
+    try:
+        dynamodb_client.put_item(
+            TableName = cfg.dynamodb_table_name,
+            Item={
+                "principal_structure_and_action_hash": {"S": hash_value},
+                "lease_expires_at": {"N": str(now + cfg.thread_lease_seconds)},
+                "ttl": {"N": str(now + cfg.dynamodb_time_to_live)},
+            },
+            ConditionExpression=(
+                "attribute_not_exists(principal_structure_and_action_hash) OR #ttl < :now"
+                " OR (attribute_not_exists(thread_ts) AND lease_expires_at < :now)"
+            ),
+            ExpressionAttributeNames={"#ttl": "ttl"},
+            ExpressionAttributeValues={":now": {"N": str(now)}},
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+
+def release_thread_lease(
+        hash_value: str,
+        dynamodb_client, # noqa: ANN001
+        cfg: Config,
+) -> None:
+    """Remove lease if the thread was not created, so other environments don't wait for it."""
+    try:
+        dynamodb_client.delete_item(
+            TableName = cfg.dynamodb_table_name,
+            Key={"principal_structure_and_action_hash": {"S": hash_value}},
+            ConditionExpression="attribute_not_exists(thread_ts)",
+        )
+    except dynamodb_client.exceptions.ConditionalCheckFailedException:
+        pass
+
+
+def wait_for_thread_ts(
+        hash_value: str,
+        dynamodb_client, # noqa: ANN001
+        cfg: Config,
+        recent_threads: RecentThreads | None = None,
+) -> str | None:
+    """Poll for thread_ts saved by the lease owner, None if it did not appear within thread_lease_wait_ms."""
+    deadline = time.monotonic() + cfg.thread_lease_wait_ms / 1000
+    delay = 0.05
+    while True:
+        time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+        item = check_dynamodb_for_similar_events(hash_value, dynamodb_client, cfg, consistent_read=True)
+        if item is not None and "thread_ts" in item:
+            if recent_threads is not None:
+                recent_threads.put(hash_value, item["thread_ts"]["S"], int(item["ttl"]["N"]))
+            return item["thread_ts"]["S"]
+        if item is None or time.monotonic() >= deadline:
+            # Lease was released or expired, or the owner is too slow
+            return None
+        delay = min(delay * 2, 0.5)
+
+
+class ThreadAcquisition(NamedTuple):
+    # thread_ts of existing thread to post to, None if message should be posted to the channel
+    thread_ts: str | None
+    # True if this environment holds the lease and should save thread_ts of the posted message
+    owns_lease: bool
+
+
+def acquire_thread(
+        cfg: Config,
+        hash_value: str | None,
+        dynamodb_client, # noqa: ANN001
+        recent_threads: RecentThreads | None = None,
+) -> ThreadAcquisition:
+    """
+    Find the thread for the hash or get the right to create it. When several environments miss at the same time,
+    only the one that gets the lease posts a new message, others wait briefly and reuse its thread_ts.
+    """
+    if not hash_value:
+        return ThreadAcquisition(None, owns_lease=False)
+    thread_ts = get_thread_ts_from_dynamodb(cfg, hash_value, dynamodb_client, recent_threads)
+    if thread_ts is not None:
+        return ThreadAcquisition(thread_ts, owns_lease=False)
+    if try_acquire_thread_lease(hash_value, dynamodb_client, cfg):
+        return ThreadAcquisition(None, owns_lease=True)
+    logger.info({"Thread is being created by another execution environment, waiting for it": {"hash_value": hash_value}})
+    return ThreadAcquisition(wait_for_thread_ts(hash_value, dynamodb_client, cfg, recent_threads), owns_lease=False)
@@ -0,0 +1,47 @@
+from typing import Any, Dict, List
+
+import json_codec
+from config import get_logger
+
+logger = get_logger()
+
+# CloudTrail events delivered by EventBridge, detail of these events is the CloudTrail record
+CLOUDTRAIL_DETAIL_TYPES = (
+    "AWS API Call via CloudTrail",
+    "AWS Console Sign In via CloudTrail",
+    "AWS Service Event via CloudTrail",
+)
+
+# Shown as source of the alert instead of the log file name
+EVENTBRIDGE_SOURCE = "EventBridge"
+
+
+def is_eventbridge_event(incoming_event: Dict[str, Any]) -> bool:
+    return "detail-type" in incoming_event and "detail" in incoming_event
+
+
+def is_sqs_event(incoming_event: Dict[str, Any]) -> bool:
+    records = incoming_event.get("Records") or [{}]
+    return records[0].get("eventSource") == "aws:sqs"
+
+
+def normalize_eventbridge_event(envelope: Dict[str, Any]) -> Dict[str, Any] | None:
+    """
+    Return CloudTrail event from EventBridge envelope, in the same shape as records of CloudTrail log files.
+    Returns None for events that are not CloudTrail events.
+    """
+    if envelope.get("detail-type") not in CLOUDTRAIL_DETAIL_TYPES or not isinstance(envelope.get("detail"), dict):
+        logger.warning({"Not a CloudTrail event from EventBridge, skipping": {"detail-type": envelope.get("detail-type"), "id": envelope.get("id")}})  # noqa: E501
+        return None
+    event = envelope["detail"]
+    # Fields that are always set in log files, but might be missing in detail
+    event.setdefault("awsRegion", envelope.get("region"))
+    event.setdefault("recipientAccountId", envelope.get("account"))
+    event.setdefault("eventTime", envelope.get("time"))
+    return event
+
+
+def get_eventbridge_envelopes_from_sqs(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """SQS message body is EventBridge event, or a list of them if it was batched by a producer."""
+    body = json_codec.loads(record["body"])
+    return body if isinstance(body, list) else [body]
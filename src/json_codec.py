@@ -0,0 +1,69 @@
+# JSON encoding and decoding for the hot path. Uses orjson when it is installed and falls back to stdlib json.
+# Output of both backends is valid JSON with the same content, but not byte to byte identical:
+# orjson output is compact and not ASCII-escaped.
+import gzip
+import json
+import re
+from typing import Any, BinaryIO, Callable
+
+try:
+    import orjson
+except ImportError:  # orjson is packaged with the lambda, tools and tests also run without it
+    orjson = None
+
+# orjson.JSONDecodeError is a subclass of json.JSONDecodeError
+JSONDecodeError = json.JSONDecodeError
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+_LEADING_SPACES = re.compile(r"^( +)", re.MULTILINE)
+
+
+def loads(data: bytes | bytearray | memoryview | str) -> Any:  # noqa: ANN401
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load_gzip(fileobj: BinaryIO) -> Any:  # noqa: ANN401
+    """Decode gzip-compressed JSON document, e.g. CloudTrail log file or CloudWatch Logs subscription payload."""
+    with gzip.GzipFile(fileobj=fileobj) as gzipfile:
+        return loads(gzipfile.read())
+
+
+def dumps_bytes(obj: Any, default: Callable[[Any], Any] | None = None) -> bytes:  # noqa: ANN401
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=default)
+        except orjson.JSONEncodeError:
+            # Integers over 64 bits, non-string keys and other values orjson does not support
+            pass
+    return json.dumps(obj, default=default).encode("utf-8")
+
+
+def dumps_canonical(obj: Any) -> bytes:  # noqa: ANN401
+    """Compact UTF-8 encoding with sorted keys, the same with both backends for values without floats, e.g. for hashing."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def dumps(obj: Any, default: Callable[[Any], Any] | None = None) -> str:  # noqa: ANN401
+    return dumps_bytes(obj, default).decode("utf-8")
+
+
+def dumps_pretty(obj: Any) -> str:  # noqa: ANN401
+    """Same layout as json.dumps(obj, indent=4), orjson only supports indentation with two spaces."""
+    if orjson is not None:
+        try:
+            # Strings can't contain raw newlines in JSON, so every leading space is indentation
+            return _LEADING_SPACES.sub(
+                lambda match: match.group(1) * 2,
+                orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8"),
+            )
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(obj, indent=4, ensure_ascii=False)
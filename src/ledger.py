@@ -0,0 +1,122 @@
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Tuple
+
+from config import Config, get_logger
+
+logger = get_logger()
+
+
+class LedgerEntry(NamedTuple):
+    object_id: str
+    completed: bool = False
+    last_delivered_event_id: str | None = None
+
+
+def get_ledger_object_id(record: dict, key: str) -> str:
+    """Identify S3 object version by bucket, key and ETag, so overwritten objects are processed again."""
+    bucket = record["s3"]["bucket"]["name"]
+    etag = record["s3"]["object"].get("eTag", "")
+    return f"{bucket}/{key}/{etag}"
+
+
+def get_ledger_entry(
+    object_id: str,
+    dynamodb_client,  # noqa: ANN001
+    cfg: Config,
+) -> LedgerEntry:
+    response = dynamodb_client.get_item(
+        TableName=cfg.ledger_table_name,
+        Key={"object_id": {"S": object_id}},
+        ConsistentRead=True,
+    )
+    item = response.get("Item")
+    if not item or int(item["ttl"]["N"]) < int(time.time()):
+        return LedgerEntry(object_id=object_id)
+
+    entry = LedgerEntry(
+        object_id=object_id,
+        completed=item.get("completed", {}).get("BOOL", False),
+        last_delivered_event_id=item.get("last_delivered_event_id", {}).get("S"),
+    )
+    logger.info({"Found object in processing ledger": {"entry": entry._asdict()}})
+    return entry
+
+
+def put_delivered_event_to_ledger(
+    object_id: str,
+    event_id: str,
+    dynamodb_client,  # noqa: ANN001
+    cfg: Config,
+) -> None:
+    dynamodb_client.update_item(
+        TableName=cfg.ledger_table_name,
+        Key={"object_id": {"S": object_id}},
+        UpdateExpression="SET last_delivered_event_id = :event_id, #ttl = :ttl",
+        ExpressionAttributeNames={"#ttl": "ttl"},
+        ExpressionAttributeValues={
+            ":event_id": {"S": event_id},
+            ":ttl": {"N": str(int(time.time()) + cfg.ledger_time_to_live)},
+        },
+    )
+
+
+def put_completed_object_to_ledger(
+    object_id: str,
+    dynamodb_client,  # noqa: ANN001
+    cfg: Config,
+) -> None:
+    dynamodb_client.update_item(
+        TableName=cfg.ledger_table_name,
+        Key={"object_id": {"S": object_id}},
+        UpdateExpression="SET completed = :completed, #ttl = :ttl",
+        ExpressionAttributeNames={"#ttl": "ttl"},
+        ExpressionAttributeValues={
+            ":completed": {"BOOL": True},
+            ":ttl": {"N": str(int(time.time()) + cfg.ledger_time_to_live)},
+        },
+    )
+
+
+def get_resume_offset(events: List[Dict[str, Any]], last_delivered_event_id: str | None) -> int:
+    """
+    Return index of the event that follows the last delivered one. CloudTrail log files are immutable,
+    so events keep their order between invocations. If the event is not found, nothing is skipped.
+    """
+    if last_delivered_event_id is None:
+        return 0
+    for index, event in enumerate(events):
+        if event.get("eventID") == last_delivered_event_id:
+            logger.info({"Resuming object processing": {"skipped_events": index + 1}})
+            return index + 1
+    logger.warning({"Last delivered event not found in object, processing all events": {"event_id": last_delivered_event_id}})
+    return 0
+
+
+class DeliveryCheckpoint:
+    """
+    Delivered events of a log file that may still be held by delivery buffers (SNS batches, packed webhook
+    messages, SQS batches). Events are numbered in the order they are handled and buffers remember the number
+    of the oldest event they hold, so the ledger is advanced only to the last delivered event handled before it.
+    """
+
+    def __init__(self) -> None:  # noqa: ANN101
+        # Number of the event being handled, read by buffers when an event is added
+        self.sequence = 0
+        self._delivered: Deque[Tuple[int, str]] = deque()
+
+    def next_event(self) -> None:  # noqa: ANN101
+        self.sequence += 1
+
+    def delivered(self, event_id: str) -> None:  # noqa: ANN101
+        self._delivered.append((self.sequence, event_id))
+
+    def pop_sent(self, oldest_buffered: int | None) -> str | None:  # noqa: ANN101
+        """ID of the last delivered event handled before oldest_buffered (any, if None), None if there is no new one."""
+        event_id = None
+        while self._delivered and (oldest_buffered is None or self._delivered[0][0] < oldest_buffered):
+            event_id = self._delivered.popleft()[1]
+        return event_id
+
+    def reset(self) -> None:  # noqa: ANN101
+        self._delivered.clear()
@@ -14,23 +14,72 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
+import functools
 import gzip
 import json
-import urllib
-from typing import Any, Dict, List, NamedTuple
+import logging
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Tuple
 
 import boto3
 from slack_sdk.web.slack_response import SlackResponse
 
+import json_codec
+from backfill import BACKFILL_KEY, BackfillProgress, BackfillRequest, run_backfill
+from cloudwatch_logs import decode_cloudwatch_logs_event, is_cloudwatch_logs_event
 from config import Config, SlackAppConfig, SlackWebhookConfig, get_logger, get_slack_config
-from dynamodb import get_thread_ts_from_dynamodb, put_event_to_dynamodb
+from dedup import EventClaims, ExpiringBloomFilter
+from dynamodb import RecentThreads, ThreadGroupingKey, acquire_thread, put_event_to_dynamodb, release_thread_lease
+from eventbridge import (
+    EVENTBRIDGE_SOURCE,
+    get_eventbridge_envelopes_from_sqs,
+    is_eventbridge_event,
+    is_sqs_event,
+    normalize_eventbridge_event,
+)
+from ledger import (
+    DeliveryCheckpoint,
+    get_ledger_entry,
+    get_ledger_object_id,
+    get_resume_offset,
+    put_completed_object_to_ledger,
+    put_delivered_event_to_ledger,
+)
+from memory_profile import MemoryProfiler
+from object_key import get_routing_account_id, parse_cloudtrail_object_key, should_object_be_processed, unquote_object_key
+from rate_policy import RateLimiter
+from rule_helpers import RULE_GLOBALS, load_ip_networks
+from rule_pool import MIN_POOL_LOG_FILE_BYTES, RuleEvaluationPool, get_rule_evaluation_processes
+from rule_source import SSM_PREFIX, RuleSource
+from s3_fetch import get_s3_object_body
 from slack_helpers import (
+    SlackWebhookPacker,
     event_to_slack_message,
+    get_hook_url,
     message_for_rule_evaluation_error_notification,
     message_for_slack_error_notification,
+    message_for_suppressed_events_summary,
     post_message,
 )
-from sns import send_message_to_sns
+from sns import SnsBatchPublisher, render_sns_message
+from sqs import SqsBatchSender
+from time_budget import TimeBudget, get_continuation_event_offset, invoke_continuation
+from verdict_cache import RuleVerdictCache
+from warm_start import (
+    WarmStartExporter,
+    compile_rules,
+    get_compiled_rule,
+    read_snapshot,
+    restore_warm_start_state,
+    retain_compiled_rules,
+)
+
+if TYPE_CHECKING:
+    from ledger import LedgerEntry
+
+try:
+    from snapshot_restore_py import register_after_restore, register_before_snapshot
+except ImportError:  # Only available in Lambda runtimes with SnapStart
+    register_after_restore = register_before_snapshot = None
 
 cfg = Config()
 logger = get_logger()
@@ -40,9 +89,129 @@ s3_client = boto3.client("s3")
 dynamodb_client = boto3.client("dynamodb")
 sns_client = boto3.client("sns")
 cloudwatch_client = boto3.client("cloudwatch")
+sqs_client = boto3.client("sqs")
+lambda_client = boto3.client("lambda")
+
+# Fingerprints of events matched by this execution environment, used to drop duplicates
+event_claims = (
+    EventClaims(ExpiringBloomFilter(cfg.dedup_capacity, cfg.dedup_false_positive_rate, cfg.dedup_time_to_live), dynamodb_client, cfg)
+    if cfg.enable_event_deduplication
+    else None
+)
+# Messages to SNS are buffered and published in batches, see flush_pending_deliveries
+delivery_checkpoint = DeliveryCheckpoint()
+
+sns_publisher = SnsBatchPublisher(sns_client, delivery_checkpoint)
+# Webhook messages for the same URL are packed together when enabled, see flush_pending_deliveries
+webhook_packer = (
+    SlackWebhookPacker(delivery_checkpoint)
+    if cfg.pack_webhook_messages and isinstance(slack_config, SlackWebhookConfig)
+    else None
+)
+# When delivery queue is configured, matched events are sent to SQS and delivered by delivery_handler
+delivery_queue = SqsBatchSender(cfg.delivery_queue_url, sqs_client, delivery_checkpoint) if cfg.delivery_queue_url else None
+# Key for grouping similar events into threads in Slack App mode, hashes are cached per identity
+thread_grouping_key = ThreadGroupingKey(cfg.thread_grouping_fields, cfg.thread_grouping_cache_size)
+# Rate policies for matched events, suppressed events are reported in a periodic summary
+rate_limiter = RateLimiter(cfg.rate_policies, cfg.rate_policy_summary_interval)
+# thread_ts of recent threads, saves DynamoDB lookups in Slack App mode
+recent_threads = RecentThreads(cfg.thread_grouping_cache_size)
+
+memory_profiler = MemoryProfiler(cfg.memory_profiling, cfg.memory_profiling_top)
+
+rule_evaluation_processes = get_rule_evaluation_processes(cfg.rule_evaluation_processes)
+
+verdict_cache = RuleVerdictCache(cfg.rule_verdict_cache_size) if cfg.rule_verdict_cache_size > 0 else None
+
+
+# Network lists are needed to compile the rules that use them by name
+load_ip_networks(cfg.ip_networks, cfg.ip_network_files, s3_client)
+
+
+# Rules from an S3 object or SSM parameter, added to the rules from environment variables and reloaded on change
+rule_source = (
+    RuleSource(
+        cfg.rules_source,
+        cfg.rules_source_refresh_seconds,
+        s3_client,
+        boto3.client("ssm") if cfg.rules_source.startswith(SSM_PREFIX) else None,
+    )
+    if cfg.rules_source
+    else None
+)
+configured_rules = cfg.rules
+configured_ignore_rules = cfg.ignore_rules
+
+
+def refresh_rules(force: bool = False) -> None:
+    """
+    Swap in rules from the rule source if they changed. New rules are compiled before the swap, so an invocation
+    never sees a partly compiled rule set, and rules that were removed are dropped from the compiled rules.
+    """
+    if rule_source is None:
+        return
+    rule_set = rule_source.refresh(force)
+    if rule_set is None:
+        return
+    rules = configured_rules + rule_set.rules
+    ignore_rules = configured_ignore_rules + rule_set.ignore_rules
+    compile_rules(rules + ignore_rules)
+    cfg.rules, cfg.ignore_rules = rules, ignore_rules
+    retain_compiled_rules(rules + ignore_rules)
+
+
+def load_warm_start_state() -> None:
+    """Compile rules and load thread caches from snapshot, if configured."""
+    compile_rules(cfg.rules + cfg.ignore_rules)
+    if cfg.warm_start_snapshot and (data := read_snapshot(cfg.warm_start_snapshot, s3_client)) is not None:
+        restore_warm_start_state(data, cfg, thread_grouping_key, recent_threads)
+
+
+# Thread caches only exist for Slack apps, snapshots in the deployment package are read-only
+warm_start_exporter = (
+    WarmStartExporter(cfg.warm_start_snapshot, s3_client)
+    if cfg.warm_start_snapshot and cfg.warm_start_snapshot.startswith("s3://") and isinstance(slack_config, SlackAppConfig)
+    else None
+)
+
+
+def export_warm_start_state() -> None:
+    if warm_start_exporter is not None:
+        warm_start_exporter.export(cfg, thread_grouping_key, recent_threads)
+
+
+def init_execution_environment() -> None:
+    """Load rules from the rule source and warm start state, at init and after SnapStart restore."""
+    refresh_rules(force=True)
+    load_warm_start_state()
+
 
+init_execution_environment()
+if register_after_restore is not None:
+    # With SnapStart state is restored from the Lambda snapshot, rules and thread caches might be stale
+    register_before_snapshot(lambda: compile_rules(cfg.rules + cfg.ignore_rules))
+    register_after_restore(init_execution_environment)
 
-def lambda_handler(incoming_event: Dict[str, Any], _) -> int:  # noqa: ANN001, PLR0912 (branches from SNS/S3 handling)
+
+def posts_suppressed_events_summary(handler: Callable) -> Callable:
+    """
+    Decorator that posts the summary of events suppressed by rate policies after every invocation of the handler,
+    whichever handler the event is routed to and whether it succeeds or raises.
+    """
+
+    @functools.wraps(handler)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+        try:
+            return handler(*args, **kwargs)
+        finally:
+            post_suppressed_events_summary()
+
+    return wrapper
+
+
+@memory_profiler.profile_invocation
+@posts_suppressed_events_summary
+def lambda_handler(incoming_event: Dict[str, Any], context) -> int | Dict[str, Any]:  # noqa: ANN001, PLR0912, PLR0915 (branches from SNS/S3 handling)
     """
     Lambda handler supporting S3 notifications from:
     1. Direct S3 notifications (S3 -> Lambda)
@@ -50,8 +219,27 @@ def lambda_handler(incoming_event: Dict[str, Any], _) -> int:  # noqa: ANN001, P
 
     Note: SNS does NOT support raw_message_delivery for Lambda endpoints.
     Lambda always receives SNS envelope which must be unwrapped.
+
+    When the invocation is about to time out, processing stops and the remaining records
+    are passed to a new asynchronous invocation of the function, see time_budget.py.
+
+    Events with a backfill section are handled by backfill_handler. CloudTrail events delivered by EventBridge,
+    directly or through SQS, are handled by eventbridge_handler, and CloudWatch Logs subscription payloads
+    by cloudwatch_logs_handler.
+
+    Rules from the rule source are checked for changes before the event is handled, see refresh_rules.
     """
+    refresh_rules()
+    if BACKFILL_KEY in incoming_event:
+        return backfill_handler(incoming_event, context)
+    if is_cloudwatch_logs_event(incoming_event):
+        return cloudwatch_logs_handler(incoming_event, context)
+    if is_eventbridge_event(incoming_event) or is_sqs_event(incoming_event):
+        return eventbridge_handler(incoming_event, context)
+
     records = incoming_event.get("Records", [])
+    time_budget = TimeBudget(context, cfg.time_budget_safety_margin_ms)
+    event_offset = get_continuation_event_offset(incoming_event)
 
     if not records:
         logger.warning({"Received event with no Records": incoming_event})
@@ -68,14 +256,14 @@ def lambda_handler(incoming_event: Dict[str, Any], _) -> int:  # noqa: ANN001, P
             for sns_record in records:
                 message = sns_record.get("Sns", {}).get("Message", "")
                 try:
-                    s3_notification = json.loads(message)
+                    s3_notification = json_codec.loads(message)
                     # The message contains S3 notification with Records array
                     inner_records = s3_notification.get("Records")
                     if inner_records is None:
                         logger.warning({"SNS message does not contain Records": {"message_keys": list(s3_notification.keys())}})
                     else:
                         s3_records.extend(inner_records)
-                except json.JSONDecodeError as e:
+                except json_codec.JSONDecodeError as e:
                     logger.error({"Failed to parse SNS message": {"error": str(e), "message": message}})
                     continue
             # Create proper S3 notification format for downstream processing
@@ -83,10 +271,16 @@ def lambda_handler(incoming_event: Dict[str, Any], _) -> int:  # noqa: ANN001, P
                 logger.warning({"SNS messages yielded no S3 records"})
             s3_notification_event = {"Records": s3_records}
 
-        for record in s3_notification_event["Records"]:
+        s3_records = s3_notification_event["Records"]
+        for index, record in enumerate(s3_records):
+            if index > 0 and time_budget.is_exhausted():
+                flush_pending_deliveries()
+                invoke_continuation(lambda_client, context.invoked_function_arn, s3_records[index:], event_offset=0)
+                break
+
             event_name: str = record["eventName"]
             if "Digest" in record["s3"]["object"]["key"]:
-                return 200
+                continue
 
             if event_name.startswith("ObjectRemoved"):
                 handle_removed_object_record(
@@ -95,13 +289,31 @@ def lambda_handler(incoming_event: Dict[str, Any], _) -> int:  # noqa: ANN001, P
                 continue
 
             elif event_name.startswith("ObjectCreated"):
-                handle_created_object_record(
+                # Parse the key once and skip objects that can't produce alerts before downloading them
+                object_key = parse_cloudtrail_object_key(unquote_object_key(record))
+                if not should_object_be_processed(object_key, cfg):
+                    continue
+                stopped_at = handle_created_object_record(
                     record=record,
                     cfg=cfg,
+                    event_offset=event_offset if index == 0 else 0,
+                    time_budget=time_budget,
                 )
+                if stopped_at is not None:
+                    flush_pending_deliveries()
+                    invoke_continuation(lambda_client, context.invoked_function_arn, s3_records[index:], event_offset=stopped_at)
+                    break
                 continue
 
+        flush_pending_deliveries()
+        export_warm_start_state()
+
     except Exception as e:
+        try:
+            # Do not lose events that already matched rules
+            flush_pending_deliveries()
+        except Exception:
+            logger.exception("Failed to flush pending deliveries")
         post_message(
             message=message_for_slack_error_notification(e, s3_notification_event),
             account_id=None,
@@ -127,53 +339,171 @@ def handle_removed_object_record(
 def handle_created_object_record(
     record: dict,
     cfg: Config,
-) -> None:
+    event_offset: int = 0,
+    time_budget: TimeBudget | None = None,
+) -> int | None:
+    """
+    Process events of the log file starting from event_offset.
+    Returns offset of the first unprocessed event if time budget ran out, otherwise None.
+    """
     logger.debug({"s3_notification_event": record})
-    cloudtrail_log_record = get_cloudtrail_log_records(record)
+
+    ledger_entry = None
+    if cfg.ledger_table_name:
+        ledger_entry = get_ledger_entry(
+            object_id=get_ledger_object_id(record, unquote_object_key(record)),
+            dynamodb_client=dynamodb_client,
+            cfg=cfg,
+        )
+        if ledger_entry.completed:
+            logger.info({"Object was already processed, skipping": {"object_id": ledger_entry.object_id}})
+            return None
+
+    if rule_evaluation_pool is not None:
+        cloudtrail_log_record = get_cloudtrail_log_records_evaluated_in_pool(record, event_offset)
+    else:
+        cloudtrail_log_record = get_cloudtrail_log_records(record)
     if cloudtrail_log_record:
-        for cloudtrail_log_event in cloudtrail_log_record["events"]:
-            handle_event(
-                event=cloudtrail_log_event,
-                source_file_object_key=cloudtrail_log_record["key"],
-                rules=cfg.rules,
-                ignore_rules=cfg.ignore_rules,
-            )
+        with memory_profiler.stage("events"):
+            stopped_at = handle_log_events(cloudtrail_log_record, cfg, event_offset, time_budget, ledger_entry)
+        if stopped_at is not None:
+            return stopped_at
 
+    with memory_profiler.stage("flush"):
+        flush_pending_deliveries()
+    if ledger_entry is not None:
+        put_completed_object_to_ledger(ledger_entry.object_id, dynamodb_client, cfg)
+    return None
 
-def get_cloudtrail_log_records(record: Dict) -> Dict | None:
-    # Get all the files from S3 so we can process them
 
+def handle_log_events(
+    cloudtrail_log_record: Dict[str, Any],
+    cfg: Config,
+    event_offset: int,
+    time_budget: TimeBudget | None,
+    ledger_entry: "LedgerEntry | None",
+) -> int | None:
+    """
+    Handle events of the log file starting from event_offset, or after the last delivered event of the ledger entry.
+    Returns offset of the first unprocessed event if time budget ran out, otherwise None.
+    """
+    events = cloudtrail_log_record["events"]
+    # Results by event offset, only events that need handling have one
+    results = cloudtrail_log_record.get("results")
+    if ledger_entry is not None:
+        event_offset = max(event_offset, get_resume_offset(events, ledger_entry.last_delivered_event_id))
+        delivery_checkpoint.reset()
+    for offset in range(event_offset, len(events)):
+        # Always process at least one event, so every invocation makes progress
+        if offset > event_offset and time_budget is not None and time_budget.is_exhausted():
+            return offset
+        if results is not None and offset not in results:
+            continue
+        cloudtrail_log_event = events[offset]
+        delivery_checkpoint.next_event()
+        delivered = handle_event(
+            event=cloudtrail_log_event,
+            source_file_object_key=cloudtrail_log_record["key"],
+            rules=cfg.rules,
+            ignore_rules=cfg.ignore_rules,
+            result=results[offset] if results is not None else None,
+        )
+        if ledger_entry is not None:
+            checkpoint_delivered_event(ledger_entry, cloudtrail_log_event, delivered, cfg)
+    return None
+
+
+def checkpoint_delivered_event(ledger_entry: "LedgerEntry", event: Dict[str, Any], delivered: bool, cfg: Config) -> None:
+    if delivered and "eventID" in event:
+        delivery_checkpoint.delivered(event["eventID"])
+    # Buffered events are not delivered yet, so checkpoint only events sent before the oldest buffered one
+    if (event_id := delivery_checkpoint.pop_sent(get_oldest_buffered_event())) is not None:
+        put_delivered_event_to_ledger(ledger_entry.object_id, event_id, dynamodb_client, cfg)
+
+
+def get_cloudtrail_log_content(record: Dict) -> Tuple[str, bytes]:
+    """Return key and decompressed content of the log file."""
     # In case if we get something unexpected
     if "s3" not in record:
         raise AssertionError(f"received record does not contain s3 section: {record}")
     bucket = record["s3"]["bucket"]["name"]
-    key = urllib.parse.unquote_plus(record["s3"]["object"]["key"], encoding="utf-8")  # type: ignore # noqa: PGH003, E501
-    # Do not process digest files
+    key = unquote_object_key(record)
     try:
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        with gzip.GzipFile(fileobj=response["Body"]) as gzipfile:
-            content = gzipfile.read()
-        content_as_json = json.loads(content.decode("utf8"))
-        cloudtrail_log_record = {
-            "key": key,
-            "events": content_as_json["Records"],
-        }
+        body = get_s3_object_body(
+            s3_client=s3_client,
+            bucket=bucket,
+            key=key,
+            cfg=cfg,
+            size=record["s3"]["object"].get("size"),
+        )
+        with memory_profiler.stage("download"), body, gzip.GzipFile(fileobj=body) as gzipfile:
+            return key, gzipfile.read()
     except Exception as e:
         logger.exception({"Error getting object": {"key": key, "bucket": bucket, "error": e}})
         raise e
-    return cloudtrail_log_record
+
+
+def get_cloudtrail_log_records(record: Dict) -> Dict | None:
+    # Get all the files from S3 so we can process them
+    key, content = get_cloudtrail_log_content(record)
+    with memory_profiler.stage("decode"):
+        events = json_codec.loads(content)["Records"]
+    return {
+        "key": key,
+        "events": events,
+    }
+
+
+def get_cloudtrail_log_records_evaluated_in_pool(record: Dict, event_offset: int) -> Dict | None:
+    """
+    Same as get_cloudtrail_log_records, with rules evaluated by rule_evaluation_pool. The log file is decoded once
+    and every worker gets only its shard of events. Small files and files the pool failed on are evaluated
+    in process, without results.
+    """
+    # Workers are forked before the download, ranged GETs leave threads behind for a moment after they complete
+    rule_evaluation_pool.start()  # type: ignore[union-attr]
+    key, content = get_cloudtrail_log_content(record)
+    with memory_profiler.stage("decode"):
+        events = json_codec.loads(content)["Records"]
+    if len(content) < MIN_POOL_LOG_FILE_BYTES:
+        return {"key": key, "events": events}
+    del content
+    try:
+        rule_evaluation_pool.submit(events, event_offset, cfg.rules, cfg.ignore_rules)  # type: ignore[union-attr]
+        results = rule_evaluation_pool.collect()  # type: ignore[union-attr]
+    except Exception:
+        logger.exception({"Rule evaluation workers failed, evaluating in process": {"key": key}})
+        results = None
+    return {"key": key, "events": events, "results": results}
 
 
 class ProcessingResult(NamedTuple):
     should_be_processed: bool
     errors: List[Dict[str, Any]]
     is_ignored: bool = False
+    rule: str | None = None
 
 
 def should_message_be_processed(
     event: Dict[str, Any],
     rules: List[str],
     ignore_rules: List[str],
+) -> ProcessingResult:
+    """Evaluate rules, events with the same values of the fields rules reference share the result, see verdict_cache.py."""
+    key = verdict_cache.get_key(event, rules, ignore_rules) if verdict_cache is not None else None
+    if key is not None and (result := verdict_cache.get(key)) is not None:  # type: ignore[union-attr]
+        logger.debug({"Cached processing result": {"event": event.get("eventName"), "result": result}})
+        return result
+    result = evaluate_rules(event, rules, ignore_rules)
+    if key is not None:
+        verdict_cache.put(key, result)  # type: ignore[union-attr]
+    return result
+
+
+def evaluate_rules(
+    event: Dict[str, Any],
+    rules: List[str],
+    ignore_rules: List[str],
 ) -> ProcessingResult:
     flat_event = flatten_json(event)
     event_name = event["eventName"]
@@ -183,7 +513,7 @@ def should_message_be_processed(
     errors = []
     for ignore_rule in ignore_rules:
         try:
-            if eval(ignore_rule, {}, {"event": flat_event}) is True:  # noqa: PGH001
+            if eval(get_compiled_rule(ignore_rule), RULE_GLOBALS, {"event": flat_event}) is True:  # noqa: PGH001
                 logger.info(
                     {"Event matched ignore rule and will not be processed": {"ignore_rule": ignore_rule, "flat_event": flat_event}}
                 )  # noqa: E501
@@ -194,9 +524,9 @@ def should_message_be_processed(
 
     for rule in rules:
         try:
-            if eval(rule, {}, {"event": flat_event}) is True:  # noqa: PGH001
+            if eval(get_compiled_rule(rule), RULE_GLOBALS, {"event": flat_event}) is True:  # noqa: PGH001
                 logger.info({"Event matched rule and will be processed": {"rule": rule, "flat_event": flat_event}})  # noqa: E501
-                return ProcessingResult(True, errors)
+                return ProcessingResult(True, errors, rule=rule)
         except Exception as e:
             logger.exception({"Event parsing failed": {"error": e, "rule": rule, "flat_event": flat_event}})
             errors.append({"error": e, "rule": rule})
@@ -205,6 +535,25 @@ def should_message_be_processed(
     return ProcessingResult(False, errors)
 
 
+def evaluate_event_in_worker(
+    event: Dict[str, Any],
+    rules: List[str],
+    ignore_rules: List[str],
+) -> ProcessingResult | None:
+    """Runs in rule evaluation workers, returns result only for events handle_event acts on."""
+    result = should_message_be_processed(event, rules, ignore_rules)
+    if not result.should_be_processed and not result.errors and not str(event.get("errorCode") or "").startswith("AccessDenied"):
+        return None
+    # Exceptions might not be picklable, notifications only show their text
+    return result._replace(errors=[{"error": str(error["error"]), "rule": error["rule"]} for error in result.errors])
+
+
+# Workers are forked on first use, not at import, see RuleEvaluationPool
+rule_evaluation_pool = (
+    RuleEvaluationPool(rule_evaluation_processes, evaluate_event_in_worker) if rule_evaluation_processes else None
+)
+
+
 def push_total_access_denied_events_cloudwatch_metric() -> None:
     """Pushes CloudWatch metrics for all AccessDenied events."""
     logger.info("Pushing TotalAccessDeniedEvents CloudWatch metric")
@@ -246,11 +595,34 @@ def handle_event(
     source_file_object_key: str,
     rules: List[str],
     ignore_rules: List[str],
-) -> SlackResponse | None:
-    logger.debug({"Raw event": json.dumps(event)})
-    logger.debug({"Cfg": json.dumps(cfg.__dict__)})
-    result = should_message_be_processed(event, rules, ignore_rules)
-    account_id = event.get("userIdentity", {}).get("accountId", "")
+    result: ProcessingResult | None = None,
+) -> bool:
+    """
+    Evaluate event against rules and deliver it if it matched. Returns True if event was delivered.
+    Rules are not evaluated again if result of the evaluation is passed.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug({"Raw event": json_codec.dumps(event)})
+        logger.debug({"Cfg": json_codec.dumps(cfg.__dict__, default=str)})
+    if result is None:
+        result = should_message_be_processed(event, rules, ignore_rules)
+    account_id = get_routing_account_id(event, source_file_object_key)
+    report_rule_evaluation(event, result, source_file_object_key, account_id)
+
+    logger.debug({"Processing result": {"result": result}})
+
+    if result.should_be_processed is False:
+        return False
+    return deliver_matched_event(event, result.rule, source_file_object_key, account_id)
+
+
+def report_rule_evaluation(
+    event: Dict[str, Any],
+    result: ProcessingResult,
+    source_file_object_key: str,
+    account_id: str,
+) -> None:
+    """Post rule evaluation errors to Slack and push AccessDenied metrics, if enabled."""
     if cfg.rule_evaluation_errors_to_slack:
         for error in result.errors:
             post_message(
@@ -263,9 +635,7 @@ def handle_event(
                 slack_config=slack_config,
             )
 
-    logger.debug({"Processing result": {"result": result}})
-
-    if flatten_json(event).get("errorCode", "").startswith(("AccessDenied")):
+    if str(event.get("errorCode") or "").startswith("AccessDenied"):
         logger.info("Event is AccessDenied")
         if cfg.push_access_denied_cloudwatch_metrics is True:
             logger.info("Pushing AccessDenied CloudWatch metrics")
@@ -273,20 +643,260 @@ def handle_event(
             if result.is_ignored:
                 push_total_ignored_access_denied_events_cloudwatch_metric()
 
-    if result.should_be_processed is False:
-        return
 
-    message = event_to_slack_message(event, source_file_object_key, account_id)
+def deliver_matched_event(
+    event: Dict[str, Any],
+    rule: str | None,
+    source_file_object_key: str,
+    account_id: str,
+) -> bool:
+    """
+    Deliver event that matched rule, unless it is a duplicate or suppressed by rate policies.
+    Returns True if event was delivered.
+    """
+    # Duplicates are dropped before they take tokens of rate policies
+    fingerprint = None
+    if event_claims is not None:
+        fingerprint = event_claims.claim(event)
+        if fingerprint is None:
+            return False
+
+    try:
+        # Suppressed events are dropped before any formatting or I/O
+        delivered = not rate_limiter or rate_limiter.allow(rule, event)
+        if delivered and delivery_queue is not None:
+            enqueue_event_for_delivery(event, source_file_object_key, account_id)
+        elif delivered:
+            deliver_event(event, source_file_object_key, account_id)
+    except Exception:
+        if fingerprint is not None:
+            event_claims.release(fingerprint)  # type: ignore[union-attr]
+        raise
+
+    if fingerprint is not None:
+        # Remembered once buffers holding the event are flushed, see flush_pending_deliveries
+        event_claims.hold(fingerprint)  # type: ignore[union-attr]
+    return delivered
+
+
+def eventbridge_handler(incoming_event: Dict[str, Any], _) -> int | Dict[str, List[Dict[str, str]]]:  # noqa: ANN001
+    """
+    Handle CloudTrail events delivered by EventBridge within seconds, instead of waiting for log files.
+    Events from SQS are processed in batches and failed messages are reported back to SQS (requires ReportBatchItemFailures).
+    Errors of direct invocations are raised, so Lambda retries them.
+    """
+    if is_eventbridge_event(incoming_event):
+        if (event := normalize_eventbridge_event(incoming_event)) is not None:
+            handle_event(event, EVENTBRIDGE_SOURCE, cfg.rules, cfg.ignore_rules)
+        flush_pending_deliveries()
+        export_warm_start_state()
+        return 200
+
+    records = incoming_event["Records"]
+    batch_item_failures = []
+    for record in records:
+        try:
+            for envelope in get_eventbridge_envelopes_from_sqs(record):
+                if (event := normalize_eventbridge_event(envelope)) is not None:
+                    handle_event(event, EVENTBRIDGE_SOURCE, cfg.rules, cfg.ignore_rules)
+        except Exception as e:
+            logger.exception({"Failed to process EventBridge event from SQS": {"message_id": record.get("messageId"), "error": e}})
+            batch_item_failures.append({"itemIdentifier": record["messageId"]})
+    try:
+        flush_pending_deliveries()
+    except Exception as e:
+        # We can't tell which messages were sent, so let SQS retry the whole batch
+        logger.exception({"Failed to send buffered messages": {"error": e}})
+        return {"batchItemFailures": [{"itemIdentifier": record["messageId"]} for record in records]}
+    export_warm_start_state()
+    return {"batchItemFailures": batch_item_failures}
+
+
+def cloudwatch_logs_handler(incoming_event: Dict[str, Any], _) -> int:  # noqa: ANN001
+    """
+    Handle CloudTrail records from a CloudWatch Logs subscription filter on the log group of the trail.
+    CloudWatch Logs invokes the function asynchronously, so errors are raised and Lambda retries the batch.
+    """
+    batch = decode_cloudwatch_logs_event(incoming_event)
+    try:
+        for event in batch.events:
+            handle_event(event, batch.source, cfg.rules, cfg.ignore_rules)
+    finally:
+        # Do not lose events that already matched rules
+        flush_pending_deliveries()
+    export_warm_start_state()
+    return 200
+
 
-    send_message_to_sns(
-        event=event,
-        source_file=source_file_object_key,
-        account_id=account_id,
+def backfill_handler(incoming_event: Dict[str, Any], context) -> Dict[str, Any]:  # noqa: ANN001
+    """
+    Process historical log files, invoked with {"cloudTrailToSlackBackfill": {"bucket": ..., "prefix": ...}},
+    see BackfillRequest for all parameters. When the invocation is about to time out, the backfill
+    is continued in a new asynchronous invocation, after the last processed log file.
+    """
+    request = BackfillRequest.from_event(incoming_event[BACKFILL_KEY])
+    progress = run_backfill_request(
+        request,
+        time_budget=TimeBudget(context, cfg.time_budget_safety_margin_ms),
+        progress=BackfillProgress(incoming_event.get(BACKFILL_KEY, {}).get("progress")),
+    )
+    if not progress.completed:
+        logger.warning({"Running out of time, continuing backfill in new invocation": {"last_key": progress.last_key}})
+        payload = {BACKFILL_KEY: {**request._replace(start_after=progress.last_key).to_event(), "progress": progress.to_dict()}}
+        lambda_client.invoke(
+            FunctionName=context.invoked_function_arn,
+            InvocationType="Event",
+            Payload=json_codec.dumps_bytes(payload),
+        )
+    return progress.to_dict()
+
+
+def run_backfill_request(
+    request: BackfillRequest,
+    source_s3_client=None,  # noqa: ANN001
+    time_budget: TimeBudget | None = None,
+    progress: BackfillProgress | None = None,
+) -> BackfillProgress:
+    """Run backfill with the configured rules. source_s3_client can point to another endpoint, e.g. local S3 stand-in."""
+
+    def process_event(event: Dict[str, Any], source_file_object_key: str, dry_run: bool) -> tuple[str | None, bool]:
+        result = should_message_be_processed(event, cfg.rules, cfg.ignore_rules)
+        if not result.should_be_processed:
+            return None, False
+        if dry_run:
+            return result.rule, False
+        # Historical events don't push AccessDenied metrics or post rule evaluation errors,
+        # so current dashboards and alarms are not skewed
+        account_id = get_routing_account_id(event, source_file_object_key)
+        return result.rule, deliver_matched_event(event, result.rule, source_file_object_key, account_id)
+
+    return run_backfill(
+        request=request,
+        s3_client=source_s3_client or s3_client,
         cfg=cfg,
-        sns_client=sns_client,
+        process_event=process_event,
+        flush=flush_pending_deliveries,
+        time_budget=time_budget,
+        progress=progress,
     )
 
+
+def enqueue_event_for_delivery(
+    event: Dict[str, Any],
+    source_file_object_key: str,
+    account_id: str,
+) -> None:
+    delivery = render_delivery(event, source_file_object_key, account_id)
+    if not delivery_queue.add(json_codec.dumps(delivery)):  # type: ignore[union-attr]
+        logger.warning({"Event is too large for SQS, delivering directly": {"event_id": event.get("eventID")}})
+        deliver_rendered_event(delivery)
+
+
+def post_suppressed_events_summary() -> None:
+    if not rate_limiter:
+        return
+    suppressed = rate_limiter.pop_summary()
+    if not suppressed:
+        return
+    try:
+        post_message(message=message_for_suppressed_events_summary(suppressed), account_id=None, slack_config=slack_config)
+    except Exception:
+        # Counts are posted with the next summary instead
+        logger.exception("Failed to post summary of suppressed events")
+        rate_limiter.restore_summary(suppressed)
+
+
+def get_oldest_buffered_event() -> int | None:
+    """Checkpoint sequence of the oldest event held by delivery buffers, None if they are empty."""
+    sequences = [
+        buffer.oldest_sequence
+        for buffer in (sns_publisher, webhook_packer, delivery_queue)
+        if buffer is not None and buffer.oldest_sequence is not None
+    ]
+    return min(sequences, default=None)
+
+
+def flush_pending_deliveries() -> None:
+    try:
+        sns_publisher.flush()
+        if webhook_packer is not None:
+            webhook_packer.flush()
+        if delivery_queue is not None:
+            delivery_queue.flush()
+    except Exception:
+        # Events of the failed flush are delivered again on retry instead of being dropped as duplicates
+        if event_claims is not None:
+            event_claims.flush_failed()
+        raise
+    if event_claims is not None:
+        event_claims.flushed()
+
+
+def delivery_handler(incoming_event: Dict[str, Any], _) -> Dict[str, List[Dict[str, str]]]:  # noqa: ANN001
+    """
+    Lambda handler for SQS delivery queue. Delivers messages rendered by lambda_handler to Slack, SNS and DynamoDB
+    and reports failed messages back to SQS, so only they are retried (requires ReportBatchItemFailures).
+    """
+    batch_item_failures = []
+    for record in incoming_event.get("Records", []):
+        try:
+            deliver_rendered_event(json_codec.loads(record["body"]))
+        except Exception as e:
+            logger.exception({"Failed to deliver event from SQS": {"message_id": record.get("messageId"), "error": e}})
+            batch_item_failures.append({"itemIdentifier": record["messageId"]})
+    try:
+        sns_publisher.flush()
+        if webhook_packer is not None:
+            webhook_packer.flush()
+    except Exception as e:
+        # We can't tell which messages were sent, so let SQS retry the whole batch
+        logger.exception({"Failed to send buffered messages": {"error": e}})
+        return {"batchItemFailures": [{"itemIdentifier": record["messageId"]} for record in incoming_event.get("Records", [])]}
+    export_warm_start_state()
+    return {"batchItemFailures": batch_item_failures}
+
+
+def render_delivery(
+    event: Dict[str, Any],
+    source_file_object_key: str,
+    account_id: str,
+) -> Dict[str, Any]:
+    """
+    Everything needed to deliver a matched event without the event itself: Slack message, SNS topic and message
+    and hash of the Slack thread. Rendered deliveries are what is sent to the SQS delivery queue.
+    """
+    delivery: Dict[str, Any] = {
+        "account_id": account_id,
+        "slack_message": event_to_slack_message(event, source_file_object_key, account_id),
+    }
+    if (sns_message := render_sns_message(event, source_file_object_key, account_id, cfg)) is not None:
+        delivery["sns_topic_arn"], delivery["sns_message"] = sns_message
+    if isinstance(slack_config, SlackAppConfig):
+        # Hash is computed once and used both to look up and to save the thread
+        delivery["thread_hash"] = thread_grouping_key.hash(event)
+    return delivery
+
+
+def deliver_event(
+    event: Dict[str, Any],
+    source_file_object_key: str,
+    account_id: str,
+) -> SlackResponse | None:
+    return deliver_rendered_event(render_delivery(event, source_file_object_key, account_id))
+
+
+def deliver_rendered_event(delivery: Dict[str, Any]) -> SlackResponse | None:
+    message = delivery["slack_message"]
+    account_id = delivery["account_id"]
+
+    if "sns_message" in delivery:
+        logger.info("Sending message to SNS.")
+        sns_publisher.publish(TopicArn=delivery["sns_topic_arn"], Message=delivery["sns_message"])
+
     if isinstance(slack_config, SlackWebhookConfig):
+        if webhook_packer is not None:
+            webhook_packer.add(message, get_hook_url(slack_config, account_id))
+            return None
         return post_message(
             message=message,
             account_id=account_id,
@@ -294,10 +904,12 @@ def handle_event(
         )
 
     if isinstance(slack_config, SlackAppConfig):
-        thread_ts = get_thread_ts_from_dynamodb(
+        thread_hash = delivery["thread_hash"]
+        thread_ts, owns_lease = acquire_thread(
             cfg=cfg,
-            event=event,
+            hash_value=thread_hash,
             dynamodb_client=dynamodb_client,
+            recent_threads=recent_threads,
         )
         if thread_ts is not None:
             # If we have a thread_ts, we can post the message to the thread
@@ -311,16 +923,23 @@ def handle_event(
         else:
             # If we don't have a thread_ts, we need to post the message to the channel
             logger.info("Posting message to channel")
-            slack_response = post_message(message=message, account_id=account_id, slack_config=slack_config)
-            if slack_response is not None:
+            slack_response = None
+            try:
+                slack_response = post_message(message=message, account_id=account_id, slack_config=slack_config)
+            finally:
+                if owns_lease and (slack_response is None or slack_response.get("ts") is None):
+                    release_thread_lease(thread_hash, dynamodb_client, cfg)  # type: ignore[arg-type]
+            # Thread is saved only by the lease owner, so it is not overwritten by environments that gave up waiting
+            if slack_response is not None and owns_lease:
                 logger.info("Saving thread_ts to DynamoDB")
                 thread_ts = slack_response.get("ts")
                 if thread_ts is not None:
                     put_event_to_dynamodb(
                         cfg=cfg,
-                        event=event,
+                        hash_value=thread_hash,
                         thread_ts=thread_ts,
                         dynamodb_client=dynamodb_client,
+                        recent_threads=recent_threads,
                     )
 
 
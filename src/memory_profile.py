@@ -0,0 +1,129 @@
+import functools
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Tuple
+
+from config import get_logger
+
+logger = get_logger()
+
+_IGNORED_TRACES = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, __file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+]
+
+
+class MemoryProfiler:
+    """
+    Opt-in memory profile of an invocation with tracemalloc. Reports peak of traced memory for the invocation
+    and for every stage (download, decode, rules, ...), memory retained by a stage and its top allocation sites.
+    Stages that run several times in an invocation (e.g. once per log file) are reported with the highest peak.
+    Tracing slows processing down, so it is only meant for sizing lambda_memory_size and finding regressions.
+    """
+
+    def __init__(self, enabled: bool, top: int = 10) -> None:  # noqa: ANN101
+        self.enabled = enabled
+        self.top = top
+        self.last_report: Dict[str, Any] | None = None
+        self._peak = 0
+        self._overhead = 0
+        self._active: List[Dict[str, Any]] = []
+        self._stages: Dict[str, Dict[str, Any]] = {}
+
+    def profile_invocation(self, handler: Callable) -> Callable:  # noqa: ANN101
+        """Decorator that profiles every invocation of the handler while profiling is enabled."""
+
+        @functools.wraps(handler)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+            if not self.enabled:
+                return handler(*args, **kwargs)
+            self.start()
+            try:
+                return handler(*args, **kwargs)
+            finally:
+                self.report()
+
+        return wrapper
+
+    def start(self) -> None:  # noqa: ANN101
+        self._peak = 0
+        self._overhead = 0
+        self._active = []
+        self._stages = {}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+    def stage(self, name: str) -> ContextManager[None]:  # noqa: ANN101
+        if not self.enabled or not tracemalloc.is_tracing():
+            return nullcontext()
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name: str) -> Iterator[None]:  # noqa: ANN101
+        self._update_peaks()
+        snapshot, overhead = self._take_snapshot()
+        # Snapshots held for the comparison are excluded from the peaks
+        self._overhead += overhead
+        started = {"name": name, "peak": 0, "current": self._get_current()}
+        self._active.append(started)
+        try:
+            yield
+        finally:
+            self._update_peaks()
+            self._active.remove(started)
+            retained = self._get_current() - started["current"]
+            end_snapshot, _ = self._take_snapshot()
+            stats = sorted(end_snapshot.compare_to(snapshot, "lineno"), key=lambda stat: stat.size_diff, reverse=True)
+            top_allocations = [
+                {
+                    "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_bytes": stat.size_diff,
+                    "count": stat.count_diff,
+                }
+                for stat in stats[: self.top]
+                if stat.size_diff > 0
+            ]
+            del snapshot, end_snapshot, stats
+            self._overhead -= overhead
+            tracemalloc.reset_peak()
+            stage = self._stages.setdefault(name, {"stage": name, "runs": 0, "peak_bytes": 0})
+            stage["runs"] += 1
+            if started["peak"] - started["current"] >= stage["peak_bytes"]:
+                stage["peak_bytes"] = started["peak"] - started["current"]
+                stage["retained_bytes"] = retained
+                stage["top_allocations"] = top_allocations
+
+    def _take_snapshot(self) -> Tuple[tracemalloc.Snapshot, int]:  # noqa: ANN101
+        """Snapshot and the traced memory it holds."""
+        before = tracemalloc.get_traced_memory()[0]
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+        overhead = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.reset_peak()
+        return snapshot, overhead
+
+    def _get_current(self) -> int:  # noqa: ANN101
+        return tracemalloc.get_traced_memory()[0] - self._overhead
+
+    def _update_peaks(self) -> None:  # noqa: ANN101
+        """Peak since the last update is attributed to the invocation and all active stages."""
+        peak = tracemalloc.get_traced_memory()[1] - self._overhead
+        self._peak = max(self._peak, peak)
+        for stage in self._active:
+            stage["peak"] = max(stage["peak"], peak)
+        tracemalloc.reset_peak()
+
+    def report(self) -> Dict[str, Any]:  # noqa: ANN101
+        """Log the profile of the invocation and stop tracing."""
+        self._update_peaks()
+        self.last_report = {
+            "peak_bytes": self._peak,
+            # Peak of a stage is counted from memory traced when it started, memory allocated before the
+            # invocation (modules, caches) is not traced
+            "stages": sorted(self._stages.values(), key=lambda stage: stage["peak_bytes"], reverse=True),
+        }
+        tracemalloc.stop()
+        logger.info({"Memory profile": self.last_report})
+        return self.last_report
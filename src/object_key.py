@@ -0,0 +1,85 @@
+import urllib.parse
+from typing import NamedTuple
+
+from config import Config, get_logger
+
+logger = get_logger()
+
+# CloudTrail delivers log files using the following key layout:
+#   [prefix/]AWSLogs/[o-organization-id/]<account-id>/<log-type>/<region>/YYYY/MM/DD/<file>
+# where <log-type> is one of CloudTrail, CloudTrail-Insight or CloudTrail-Digest.
+AWS_LOGS_KEY_SEGMENT = "AWSLogs"
+ORGANIZATION_ID_PREFIX = "o-"
+
+
+class CloudTrailObjectKey(NamedTuple):
+    key: str
+    account_id: str
+    log_type: str
+    region: str
+    organization_id: str | None = None
+
+
+def parse_cloudtrail_object_key(key: str) -> CloudTrailObjectKey | None:
+    """Parse S3 object key in the standard CloudTrail layout, return None if the key does not follow it."""
+    parts = key.split("/")
+    try:
+        index = parts.index(AWS_LOGS_KEY_SEGMENT)
+    except ValueError:
+        return None
+
+    organization_id = None
+    if parts[index + 1 :] and parts[index + 1].startswith(ORGANIZATION_ID_PREFIX):
+        organization_id = parts[index + 1]
+        index += 1
+
+    # account id, log type, region and at least the file name should follow
+    if len(parts) < index + 5:  # noqa: PLR2004
+        return None
+
+    return CloudTrailObjectKey(
+        key=key,
+        account_id=parts[index + 1],
+        log_type=parts[index + 2],
+        region=parts[index + 3],
+        organization_id=organization_id,
+    )
+
+
+def get_routing_account_id(event: dict, source_file_object_key: str) -> str:
+    """
+    Account whose Slack channel or webhook gets the event: userIdentity.accountId, or the account of the log file
+    for events without it (e.g. events of AWS services). A log file can hold events of principals from other accounts.
+    """
+    if account_id := event.get("userIdentity", {}).get("accountId"):
+        return account_id
+    object_key = parse_cloudtrail_object_key(source_file_object_key)
+    return object_key.account_id if object_key else ""
+
+
+def unquote_object_key(record: dict) -> str:
+    return urllib.parse.unquote_plus(record["s3"]["object"]["key"], encoding="utf-8")
+
+
+def should_object_be_processed(object_key: CloudTrailObjectKey | None, cfg: Config) -> bool:
+    """
+    Decide based on object key only whether object can produce alerts,
+    so we do not spend S3 GET and decompression on objects we never alert on.
+    Keys that do not follow the CloudTrail layout are always processed.
+    """
+    if object_key is None:
+        return True
+
+    if cfg.object_key_log_types and object_key.log_type not in cfg.object_key_log_types:
+        logger.info({"Skipping object, log type is not tracked": {"key": object_key.key, "log_type": object_key.log_type}})
+        return False
+
+    if cfg.object_key_accounts and object_key.account_id not in cfg.object_key_accounts:
+        logger.info({"Skipping object, account is not tracked": {"key": object_key.key, "account_id": object_key.account_id}})
+        return False
+
+    if cfg.object_key_regions and object_key.region not in cfg.object_key_regions:
+        logger.info({"Skipping object, region is not tracked": {"key": object_key.key, "region": object_key.region}})
+        return False
+
+    return True
@@ -0,0 +1,137 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from config import get_logger
+
+logger = get_logger()
+
+TOKEN_BUCKET = "token_bucket"
+SAMPLE = "sample"
+
+# State is kept per rule and principal, least recently seen principals are dropped beyond this limit
+MAX_TRACKED_PRINCIPALS = 10000
+
+
+class TokenBucket:
+    """Allows `burst` events at once, refilled with `rate_per_minute` events per minute."""
+
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, burst: float, now: float) -> None:  # noqa: ANN101
+        self.tokens = burst
+        self.updated_at = now
+
+    def allow(self, rate_per_second: float, burst: float, now: float) -> bool:  # noqa: ANN101
+        self.tokens = min(burst, self.tokens + (now - self.updated_at) * rate_per_second)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class SampleCounter:
+    """Allows the first `first` events, then every `every`th event."""
+
+    __slots__ = ("count",)
+
+    def __init__(self) -> None:  # noqa: ANN101
+        self.count = 0
+
+    def allow(self, first: int, every: int) -> bool:  # noqa: ANN101
+        self.count += 1
+        if self.count <= first:
+            return True
+        return every > 0 and (self.count - first) % every == 0
+
+
+class RatePolicy:
+    """
+    Rate policy for events that matched a rule, applied per rule and principal.
+    Policy without "rule" applies to all rules that have no policy of their own.
+    """
+
+    def __init__(self, policy: Dict[str, Any]) -> None:  # noqa: ANN101
+        # Terraform passes unset optional attributes as null
+        policy = {key: value for key, value in policy.items() if value is not None}
+        self.rule: str | None = policy.get("rule")
+        self.type: str = policy.get("type", TOKEN_BUCKET)
+        if self.type == TOKEN_BUCKET:
+            self.burst = float(policy.get("burst", 10))
+            self.rate_per_second = float(policy.get("rate_per_minute", 1)) / 60
+        elif self.type == SAMPLE:
+            self.first = int(policy.get("first", 10))
+            self.every = int(policy.get("every", 100))
+        else:
+            raise ValueError(f"Unknown rate policy type: {self.type}, supported: {TOKEN_BUCKET}, {SAMPLE}")
+        self._state: OrderedDict[Tuple[str, str], TokenBucket | SampleCounter] = OrderedDict()
+
+    def allow(self, rule: str, principal: str, now: float) -> bool:  # noqa: ANN101
+        key = (rule, principal)
+        state = self._state.get(key)
+        if state is None:
+            state = TokenBucket(self.burst, now) if self.type == TOKEN_BUCKET else SampleCounter()
+            self._state[key] = state
+            if len(self._state) > MAX_TRACKED_PRINCIPALS:
+                self._state.popitem(last=False)
+        else:
+            self._state.move_to_end(key)
+        if isinstance(state, TokenBucket):
+            return state.allow(self.rate_per_second, self.burst, now)
+        return state.allow(self.first, self.every)
+
+
+def get_principal(event: Dict[str, Any]) -> str:
+    user_identity = event.get("userIdentity")
+    if not isinstance(user_identity, dict):
+        return "N/A"
+    return user_identity.get("arn") or user_identity.get("principalId") or user_identity.get("type") or "N/A"
+
+
+class RateLimiter:
+    """
+    Applies rate policies to matched events and counts suppressed events per rule and principal.
+    Counts are kept in memory of the execution environment and reported by pop_summary once per summary_interval.
+    Counts that were not reported yet are lost when Lambda shuts the execution environment down.
+    """
+
+    def __init__(self, policies: List[Dict[str, Any]], summary_interval: int) -> None:  # noqa: ANN101
+        self._policies: Dict[str | None, RatePolicy] = {}
+        for raw_policy in policies:
+            policy = RatePolicy(raw_policy)
+            self._policies.setdefault(policy.rule, policy)
+        self._summary_interval = summary_interval
+        self._suppressed: Dict[Tuple[str, str], int] = {}
+        self._summary_at = time.monotonic()
+
+    def __bool__(self) -> bool:  # noqa: ANN101
+        return bool(self._policies)
+
+    def allow(self, rule: str | None, event: Dict[str, Any]) -> bool:  # noqa: ANN101
+        policy = self._policies.get(rule) or self._policies.get(None)
+        if policy is None or rule is None:
+            return True
+        principal = get_principal(event)
+        if policy.allow(rule, principal, time.monotonic()):
+            return True
+        key = (rule, principal)
+        self._suppressed[key] = self._suppressed.get(key, 0) + 1
+        logger.info({"Event was suppressed by rate policy": {"rule": rule, "principal": principal, "event_id": event.get("eventID")}})  # noqa: E501
+        return False
+
+    def pop_summary(self, force: bool = False) -> Dict[Tuple[str, str], int] | None:  # noqa: ANN101
+        """Return suppressed counts and reset them, if summary_interval passed since the last summary."""
+        now = time.monotonic()
+        if not force and now - self._summary_at < self._summary_interval:
+            return None
+        self._summary_at = now
+        if not self._suppressed:
+            return None
+        suppressed, self._suppressed = self._suppressed, {}
+        return suppressed
+
+    def restore_summary(self, suppressed: Dict[Tuple[str, str], int]) -> None:  # noqa: ANN101
+        """Add counts of a summary that could not be posted back, they are reported with the next one."""
+        for key, count in suppressed.items():
+            self._suppressed[key] = self._suppressed.get(key, 0) + count
@@ -0,0 +1,285 @@
+# Matching helpers available by name inside rule expressions, e.g.
+#   glob(event.get("userIdentity.arn", ""), "arn:aws:iam::*:role/ci-*")
+#   starts_with_any(event["eventName"], ("Get", "List", "Describe", "Head"))
+# Patterns are compiled once per execution environment: patterns written as literals in rules are compiled
+# when rules are loaded (see precompile_rule_helpers), others on first use.
+import ast
+import fnmatch
+import functools
+import ipaddress
+import re
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from config import get_logger
+
+logger = get_logger()
+
+# Compiled matchers by patterns, and by id of the patterns object for tuple literals, which the compiler
+# turns into constants of the rule, so large allowlists are not hashed on every event.
+# Patterns taken from event values would grow the caches without bound, so they are reset at the limit
+MAX_MATCHERS = 1024
+_matchers: Dict[Tuple[str, Any], Any] = {}
+_matchers_by_id: Dict[Tuple[str, int], Tuple[Any, Any]] = {}
+
+
+def _get_matcher(kind: str, patterns: str | Iterable[str], build: Callable[[Tuple[str, ...]], Any]) -> Any:  # noqa: ANN401
+    by_id = _matchers_by_id.get((kind, id(patterns)))
+    if by_id is not None and by_id[0] is patterns:
+        return by_id[1]
+    key = (patterns,) if isinstance(patterns, str) else tuple(patterns)
+    matcher = _matchers.get((kind, key))
+    if matcher is None:
+        if len(_matchers) >= MAX_MATCHERS:
+            _matchers.clear()
+            _matchers_by_id.clear()
+        matcher = _matchers[(kind, key)] = build(key)
+    if isinstance(patterns, (str, tuple)):
+        # Holding the patterns keeps the id from being reused by another object
+        _matchers_by_id[(kind, id(patterns))] = (patterns, matcher)
+    return matcher
+
+
+def _compile_regex(patterns: Tuple[str, ...]) -> re.Pattern:
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+
+
+def _compile_glob(patterns: Tuple[str, ...]) -> re.Pattern:
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
+
+class PrefixTrie:
+    """Character trie of prefixes, a lookup walks at most the length of the longest prefix."""
+
+    _END = ""
+
+    def __init__(self, prefixes: Iterable[str]) -> None:  # noqa: ANN101
+        self._root: Dict[str, Any] = {}
+        for prefix in prefixes:
+            node = self._root
+            for char in prefix:
+                node = node.setdefault(char, {})
+            node[self._END] = True
+
+    def match(self, value: str) -> bool:  # noqa: ANN101
+        node = self._root
+        if self._END in node:
+            return True
+        for char in value:
+            node = node.get(char)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+
+class AhoCorasick:
+    """Aho-Corasick automaton of substrings, a lookup takes one pass over the value."""
+
+    def __init__(self, substrings: Iterable[str]) -> None:  # noqa: ANN101
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[bool] = [False]
+        for substring in substrings:
+            state = 0
+            for char in substring:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(False)
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._output[state] = True
+        # Breadth-first, so failure links of shorter states are set first, states of depth 1 fail to the root
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] or self._output[self._fail[next_state]]
+                queue.append(next_state)
+
+    def search(self, value: str) -> bool:  # noqa: ANN101
+        if self._output[0]:
+            return True
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for char in value:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                return True
+        return False
+
+
+class NetworkTrie:
+    """
+    Binary prefix trie of IPv4 and IPv6 networks, a lookup walks at most the prefix length of the longest
+    network, independent of the number of networks.
+    """
+
+    def __init__(self, networks: Iterable[str]) -> None:  # noqa: ANN101
+        # Node is [child for bit 0, child for bit 1, True if a network ends here]
+        self._roots: Dict[int, List[Any]] = {4: [None, None, False], 6: [None, None, False]}
+        self.size = 0
+        for network in networks:
+            self.add(network)
+
+    def add(self, network: str) -> None:  # noqa: ANN101
+        """Add network in CIDR notation or a single address, raises ValueError if it is invalid."""
+        parsed = ipaddress.ip_network(network.strip(), strict=False)
+        address = int(parsed.network_address)
+        node = self._roots[parsed.version]
+        for position in range(parsed.max_prefixlen - 1, parsed.max_prefixlen - 1 - parsed.prefixlen, -1):
+            bit = (address >> position) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, False]
+            node = node[bit]
+        node[2] = True
+        self.size += 1
+
+    def match(self, value: str) -> bool:  # noqa: ANN101
+        parsed = _parse_address(value)
+        if parsed is None:
+            return False
+        version, address, bits = parsed
+        node = self._roots[version]
+        for position in range(bits - 1, -1, -1):
+            if node[2]:
+                return True
+            node = node[(address >> position) & 1]
+            if node is None:
+                return False
+        return node[2]
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_address(value: str) -> Tuple[int, int, int] | None:
+    """Version, integer value and bit length of the address, None for anything else (e.g. "AWS Internal")."""
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped is not None:  # noqa: PLR2004
+        address = address.ipv4_mapped
+    return address.version, int(address), address.max_prefixlen
+
+
+# Named network lists from configuration, see load_ip_networks
+_ip_networks: Dict[str, NetworkTrie] = {}
+
+
+def regex(value: Any, patterns: str | Iterable[str]) -> bool:  # noqa: ANN401
+    """True if any of the regular expressions matches anywhere in the value (re.search)."""
+    return isinstance(value, str) and _get_matcher("regex", patterns, _compile_regex).search(value) is not None
+
+
+def glob(value: Any, patterns: str | Iterable[str]) -> bool:  # noqa: ANN401
+    """True if the whole value matches any of the shell-style patterns, case-sensitive, "*" also matches "/"."""
+    return isinstance(value, str) and _get_matcher("glob", patterns, _compile_glob).match(value) is not None
+
+
+def starts_with_any(value: Any, prefixes: str | Iterable[str]) -> bool:  # noqa: ANN401
+    return isinstance(value, str) and _get_matcher("prefix", prefixes, PrefixTrie).match(value)
+
+
+def contains_any(value: Any, substrings: str | Iterable[str]) -> bool:  # noqa: ANN401
+    return isinstance(value, str) and _get_matcher("substring", substrings, AhoCorasick).search(value)
+
+
+def ip_in(value: Any, networks: str | Iterable[str]) -> bool:  # noqa: ANN401
+    """
+    True if the value is an IP address in any of the networks. Networks are the name of a configured
+    network list, a network in CIDR notation or a tuple of them.
+    """
+    if isinstance(networks, str) and networks in _ip_networks:
+        trie = _ip_networks[networks]
+    else:
+        trie = _get_matcher("network", networks, NetworkTrie)
+    return isinstance(value, str) and trie.match(value)
+
+
+RULE_HELPERS: Dict[str, Callable[..., bool]] = {
+    "regex": regex,
+    "glob": glob,
+    "starts_with_any": starts_with_any,
+    "contains_any": contains_any,
+    "ip_in": ip_in,
+}
+
+
+# Globals of rule expressions, eval adds __builtins__ to it
+RULE_GLOBALS: Dict[str, Any] = dict(RULE_HELPERS)
+
+
+def precompile_rule_helpers(code: Any, rule: str) -> None:  # noqa: ANN401
+    """
+    Compile patterns passed as literals to helpers in the rule. Patterns are looked up by the constants
+    of the compiled rule, so they are matched to calls by value.
+    """
+    try:
+        tree = ast.parse(rule, mode="eval")
+    except SyntaxError:
+        return
+    constants = {constant: constant for constant in code.co_consts if isinstance(constant, (str, tuple))}
+    for node in ast.walk(tree):
+        if not (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in RULE_HELPERS
+            and len(node.args) == 2  # noqa: PLR2004
+        ):
+            continue
+        try:
+            patterns = ast.literal_eval(node.args[1])
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            # Patterns are not a literal, they are compiled on first use
+            continue
+        if isinstance(patterns, (list, set, frozenset)):
+            patterns = tuple(patterns)
+        try:
+            # Same object as the rule will pass, when the compiler made a constant of it
+            patterns = constants.get(patterns, patterns)
+            RULE_HELPERS[node.func.id]("", patterns)
+        except (TypeError, ValueError, re.error) as e:
+            logger.warning({"Failed to precompile rule helper": {"rule": rule, "helper": node.func.id, "error": str(e)}})
+
+
+def read_network_list(location: str, s3_client) -> List[str]:  # noqa: ANN001
+    """Networks from a file in the deployment package or s3://bucket/key, one per line, # starts a comment."""
+    if location.startswith("s3://"):
+        bucket, _, key = location[len("s3://"):].partition("/")
+        text = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read().decode()
+    else:
+        with open(location) as f:
+            text = f.read()
+    return [network for line in text.splitlines() if (network := line.partition("#")[0].strip())]
+
+
+def load_ip_networks(
+    ip_networks: Dict[str, List[str]],
+    ip_network_files: Dict[str, str],
+    s3_client,  # noqa: ANN001
+) -> None:
+    """
+    Build network lists available to ip_in by name. Lists that fail to load are left out, so rules
+    that use them report evaluation errors instead of silently not matching.
+    """
+    _ip_networks.clear()
+    for name, location in ip_network_files.items():
+        try:
+            _ip_networks[name] = NetworkTrie(ip_networks.get(name, []) + read_network_list(location, s3_client))
+        except Exception as e:
+            logger.error({"Failed to load IP network list": {"name": name, "location": location, "error": str(e)}})
+    for name, networks in ip_networks.items():
+        if name in ip_network_files:
+            continue
+        try:
+            _ip_networks[name] = NetworkTrie(networks)
+        except ValueError as e:
+            logger.error({"Failed to load IP network list": {"name": name, "error": str(e)}})
+    if _ip_networks:
+        logger.info({"Loaded IP network lists": {name: trie.size for name, trie in _ip_networks.items()}})
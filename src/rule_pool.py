@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple
+
+import json_codec
+from config import get_logger
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+    from multiprocessing.process import BaseProcess
+
+logger = get_logger()
+
+# Sending events to workers costs more than evaluating rules for a small file in process
+MIN_POOL_LOG_FILE_BYTES = 256 * 1024
+
+# Called in workers for every event with rules and ignore rules. Returns result to send back to the parent,
+# or None for events that need no handling, so only a small share of events crosses the process boundary.
+Evaluate = Callable[[Dict[str, Any], List[str], List[str]], Any]
+
+
+def get_available_cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        return os.cpu_count() or 1
+
+
+def get_rule_evaluation_processes(configured: int) -> int:
+    """Number of worker processes to use, 0 means rules are evaluated in the handler process."""
+    if configured < 2:  # noqa: PLR2004
+        return 0
+    available = get_available_cpu_count()
+    if available < 2:  # noqa: PLR2004
+        logger.info({"Single vCPU available, rules are evaluated in the handler process": {"configured_processes": configured}})
+        return 0
+    return min(configured, available)
+
+
+def _worker_loop(connection: "Connection", evaluate: Evaluate) -> None:
+    while True:
+        try:
+            shard_offset, rules, ignore_rules = connection.recv()
+            data = connection.recv_bytes()
+        except EOFError:
+            return
+        try:
+            events = json_codec.loads(data)
+            results = [
+                (shard_offset + index, result)
+                for index, event in enumerate(events)
+                if (result := evaluate(event, rules, ignore_rules)) is not None
+            ]
+            connection.send((None, results))
+        except Exception as e:
+            connection.send((repr(e), []))
+
+
+class RuleEvaluationPool:
+    """
+    Worker processes that evaluate rules for shards of a log file, for Lambdas with more than one vCPU.
+    The handler process decodes the log file once and sends every worker only its contiguous shard of events,
+    encoded again. Finding record boundaries in the raw file to send byte ranges instead would need a scan
+    in Python that takes several times longer than decoding the whole file, while encoding the shards
+    takes about a tenth of it.
+
+    Workers are forked on first use, not when the handler is imported, and kept for warm invocations of the
+    execution environment. They are forked only while no other threads run, as a forked child inherits locks
+    held by threads of the parent (e.g. ranged GETs), and until then rules are evaluated in process.
+
+    Workers communicate over pipes, Lambda has no /dev/shm for multiprocessing.Pool and queues.
+    """
+
+    def __init__(self, processes: int, evaluate: Evaluate) -> None:  # noqa: ANN101
+        self.processes = processes
+        self._evaluate = evaluate
+        self._workers: "List[Tuple[BaseProcess, Connection]]" = []
+
+    def submit(self, events: List[Dict[str, Any]], start_offset: int, rules: List[str], ignore_rules: List[str]) -> None:  # noqa: ANN101
+        """Start evaluation of events from start_offset, results are returned by collect."""
+        if not self.start():
+            raise RuntimeError("Rule evaluation workers are not running")
+        shard_size = -(-(len(events) - start_offset) // len(self._workers))
+        try:
+            for shard_index, (_, connection) in enumerate(self._workers):
+                shard_offset = start_offset + shard_index * shard_size
+                connection.send((shard_offset, rules, ignore_rules))
+                connection.send_bytes(json_codec.dumps_bytes(events[shard_offset : shard_offset + shard_size]))
+        except Exception:
+            self.close()
+            raise
+
+    def collect(self) -> Dict[int, Any]:  # noqa: ANN101
+        """Return results of the submitted log file by event offset. Workers are restarted on next use after a failure."""
+        results: Dict[int, Any] = {}
+        try:
+            for _, connection in self._workers:
+                error, shard_results = connection.recv()
+                if error is not None:
+                    raise RuntimeError(f"Rule evaluation worker failed: {error}")
+                results.update(shard_results)
+        except Exception:
+            self.close()
+            raise
+        return results
+
+    def close(self) -> None:  # noqa: ANN101
+        for process, connection in self._workers:
+            connection.close()
+            process.terminate()
+            process.join(timeout=1)
+        self._workers = []
+
+    def start(self) -> bool:  # noqa: ANN101
+        """Fork workers unless they are running. Returns False if they can't be forked because other threads run."""
+        if self._workers and all(process.is_alive() for process, _ in self._workers):
+            return True
+        self.close()
+        if threading.active_count() > 1:
+            logger.warning({"Not forking rule evaluation workers while other threads run": {"threads": threading.active_count()}})
+            return False
+        # Forked workers share compiled rules and configuration of the handler without importing it again
+        context = multiprocessing.get_context("fork")
+        for index in range(self.processes):
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(
+                target=_worker_loop,
+                args=(child_connection, self._evaluate),
+                name=f"rule-evaluation-{index}",
+                daemon=True,
+            )
+            process.start()
+            child_connection.close()
+            self._workers.append((process, parent_connection))
+        logger.info({"Started rule evaluation workers": {"processes": self.processes}})
+        return True
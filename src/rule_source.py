@@ -0,0 +1,100 @@
+import time
+from typing import Any, Dict, List, NamedTuple
+
+import json_codec
+from botocore.exceptions import ClientError
+from config import get_logger
+
+logger = get_logger()
+
+SSM_PREFIX = "ssm:"
+S3_PREFIX = "s3://"
+
+
+class RuleSet(NamedTuple):
+    rules: List[str]
+    ignore_rules: List[str]
+
+
+def parse_rule_set(content: bytes | str) -> RuleSet:
+    """Rule set from a JSON object with "rules" and "ignore_rules" lists, raises ValueError if it is malformed."""
+    raw = json_codec.loads(content)
+    if not isinstance(raw, dict):
+        raise ValueError("rule source must be a JSON object")
+    rule_set = RuleSet(raw.get("rules", []), raw.get("ignore_rules", []))
+    for name, rules in zip(RuleSet._fields, rule_set, strict=True):
+        if not isinstance(rules, list) or not all(isinstance(rule, str) for rule in rules):
+            raise ValueError(f"{name} must be a list of strings")
+    return RuleSet([rule for rule in rule_set.rules if rule.strip()], [rule for rule in rule_set.ignore_rules if rule.strip()])
+
+
+class RuleSource:
+    """
+    Rules and ignore rules from an S3 object (s3://bucket/key) or an SSM parameter (ssm:name), checked for
+    changes at most every refresh_seconds. S3 objects are revalidated with their ETag, so unchanged rules
+    are not downloaded again, SSM parameters are compared by version. When the source can't be read,
+    the last rules stay in use.
+    """
+
+    def __init__(  # noqa: ANN101
+        self,
+        location: str,
+        refresh_seconds: int,
+        s3_client,  # noqa: ANN001
+        ssm_client,  # noqa: ANN001
+    ) -> None:
+        if not location.startswith((S3_PREFIX, SSM_PREFIX)):
+            raise ValueError(f"Rule source must be s3://bucket/key or ssm:parameter-name, got {location}")
+        self.location = location
+        self.refresh_seconds = refresh_seconds
+        self.s3_client = s3_client
+        self.ssm_client = ssm_client
+        # ETag of the S3 object or version of the SSM parameter of the rules in use
+        self.version: str | None = None
+        self._checked_at: float | None = None
+
+    def refresh(self, force: bool = False) -> RuleSet | None:  # noqa: ANN101
+        """New rule set if the source changed since the last check, None if it didn't or wasn't checked."""
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.refresh_seconds:
+            return None
+        self._checked_at = now
+        try:
+            fetched = self._fetch_s3() if self.location.startswith(S3_PREFIX) else self._fetch_ssm()
+            if fetched is None:
+                return None
+            version, content = fetched
+            rule_set = parse_rule_set(content)
+        except Exception as e:
+            logger.error({"Failed to load rules from rule source": {"location": self.location, "error": str(e)}})
+            return None
+        logger.info({
+            "Loaded rules from rule source": {
+                "location": self.location,
+                "version": version,
+                "rules": len(rule_set.rules),
+                "ignore_rules": len(rule_set.ignore_rules),
+            }
+        })
+        self.version = version
+        return rule_set
+
+    def _fetch_s3(self) -> tuple[str, bytes] | None:  # noqa: ANN101
+        bucket, _, key = self.location[len(S3_PREFIX):].partition("/")
+        kwargs: Dict[str, Any] = {"Bucket": bucket, "Key": key}
+        if self.version is not None:
+            kwargs["IfNoneMatch"] = self.version
+        try:
+            response = self.s3_client.get_object(**kwargs)
+        except ClientError as e:
+            if e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 304:  # noqa: PLR2004
+                return None
+            raise
+        return response["ETag"], response["Body"].read()
+
+    def _fetch_ssm(self) -> tuple[str, str] | None:  # noqa: ANN101
+        parameter = self.ssm_client.get_parameter(Name=self.location[len(SSM_PREFIX):], WithDecryption=True)["Parameter"]
+        version = str(parameter["Version"])
+        if version == self.version:
+            return None
+        return version, parameter["Value"]
@@ -0,0 +1,109 @@
+import io
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Deque, List, Tuple
+
+from config import Config, get_logger
+
+logger = get_logger()
+
+
+def split_into_ranges(size: int, part_size: int) -> List[Tuple[int, int]]:
+    """Split object of given size into inclusive byte ranges, as used by the HTTP Range header."""
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+
+class RangedObjectReader(io.RawIOBase):
+    """
+    Read-only stream over S3 object that downloads it with concurrent byte-range GETs.
+    Parts are requested ahead of the reader (up to `concurrency` at a time) and handed out
+    strictly in order, so the stream can be consumed by gzip as if it was a single GetObject body.
+    """
+
+    def __init__(  # noqa: ANN204, PLR0913
+        self,  # noqa: ANN101
+        s3_client,  # noqa: ANN001
+        bucket: str,
+        key: str,
+        size: int,
+        part_size: int,
+        concurrency: int,
+    ):
+        super().__init__()
+        self._s3_client = s3_client
+        self._bucket = bucket
+        self._key = key
+        self._ranges: Deque[Tuple[int, int]] = deque(split_into_ranges(size, part_size))
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="s3-range")
+        self._pending: Deque[Future] = deque()
+        self._part = memoryview(b"")
+        self._position = 0
+        for _ in range(concurrency):
+            self._schedule_next_range()
+
+    def readable(self) -> bool:  # noqa: ANN101
+        return True
+
+    def readinto(self, buffer) -> int:  # noqa: ANN001, ANN101
+        while self._position >= len(self._part):
+            if not self._pending:
+                return 0
+            self._part = memoryview(self._pending.popleft().result())
+            self._position = 0
+            self._schedule_next_range()
+        size = min(len(buffer), len(self._part) - self._position)
+        buffer[:size] = self._part[self._position : self._position + size]
+        self._position += size
+        return size
+
+    def close(self) -> None:  # noqa: ANN101
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown(wait=False)
+        super().close()
+
+    def _schedule_next_range(self) -> None:  # noqa: ANN101
+        if self._ranges:
+            start, end = self._ranges.popleft()
+            self._pending.append(self._executor.submit(self._get_range, start, end))
+
+    def _get_range(self, start: int, end: int) -> bytes:  # noqa: ANN101
+        response = self._s3_client.get_object(Bucket=self._bucket, Key=self._key, Range=f"bytes={start}-{end}")
+        content = response["Body"].read()
+        if len(content) != end - start + 1:
+            raise OSError(f"Got {len(content)} bytes for range {start}-{end} of s3://{self._bucket}/{self._key}")
+        return content
+
+
+def get_s3_object_body(
+    s3_client,  # noqa: ANN001
+    bucket: str,
+    key: str,
+    cfg: Config,
+    size: int | None = None,
+) -> BinaryIO:
+    """
+    Return readable body of S3 object. Objects at or above `cfg.s3_ranged_get_threshold` bytes
+    are downloaded with concurrent byte-range GETs, smaller ones with a single GetObject.
+    Size is taken from the S3 notification when available, otherwise from HeadObject.
+    """
+    if cfg.s3_ranged_get_concurrency <= 1:
+        return s3_client.get_object(Bucket=bucket, Key=key)["Body"]
+
+    if size is None:
+        size = s3_client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+
+    if size < cfg.s3_ranged_get_threshold:
+        return s3_client.get_object(Bucket=bucket, Key=key)["Body"]
+
+    logger.info({"Downloading object with ranged GETs": {"key": key, "size": size, "concurrency": cfg.s3_ranged_get_concurrency}})
+    reader = RangedObjectReader(
+        s3_client=s3_client,
+        bucket=bucket,
+        key=key,
+        size=size,
+        part_size=cfg.s3_ranged_get_part_size,
+        concurrency=cfg.s3_ranged_get_concurrency,
+    )
+    return io.BufferedReader(reader, buffer_size=cfg.s3_ranged_get_part_size)  # type: ignore[return-value]
@@ -1,12 +1,16 @@
 import http.client
-import json
+from http import HTTPStatus
 
+import json_codec
 from config import  get_logger, SlackAppConfig, SlackWebhookConfig
 from dateutil.parser import parse as parse_date
 from slack_sdk import WebClient
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from slack_sdk.web.slack_response import SlackResponse
 
+if TYPE_CHECKING:
+    from ledger import DeliveryCheckpoint
+
 logger = get_logger()
 
 
@@ -34,19 +38,21 @@ def post_message( # noqa: ANN201
         )
 
     if isinstance(slack_config, SlackWebhookConfig):
-        if account_id and slack_config.configuration:
-            hook_url = next(
-                (cfg["slack_hook_url"] for cfg in slack_config.configuration if account_id in cfg["accounts"]), # noqa: E501
-                slack_config.default_hook_url
-            )
-        else:
-            hook_url = slack_config.default_hook_url
         webhook_post_message(
             message = message,
-            hook_url = hook_url,
+            hook_url = get_hook_url(slack_config, account_id),
         )
 
 
+def get_hook_url(slack_config: SlackWebhookConfig, account_id: str | None) -> str:
+    if account_id and slack_config.configuration:
+        return next(
+            (cfg["slack_hook_url"] for cfg in slack_config.configuration if account_id in cfg["accounts"]), # noqa: E501
+            slack_config.default_hook_url
+        )
+    return slack_config.default_hook_url
+
+
 def slack_app_post_message( # noqa: ANN201
         message: dict,
         channel_id: str,
@@ -71,15 +77,79 @@ def webhook_post_message(message: dict, hook_url: str) -> int:
     connection = http.client.HTTPSConnection("hooks.slack.com")
     connection.request("POST",
                        hook_url.replace("https://hooks.slack.com", ""),
-                       json.dumps(message),
+                       json_codec.dumps_bytes(message),
                        headers)
     response = connection.getresponse()
     logger.info({"Slack response": {"status": response.status, "message": response.read().decode()}})
     return response.status
 
 
+# Slack limits for a single message
+SLACK_MAX_BLOCKS = 50
+SLACK_MAX_MESSAGE_CHARACTERS = 40000
+
+
+class SlackWebhookPacker:
+    """
+    Buffer of messages per webhook URL. Blocks of messages for the same URL are packed into
+    as few messages as possible within Slack limits, so several events are sent with one request.
+    Each event keeps its own blocks followed by a divider, as produced by event_to_slack_message.
+    With a delivery checkpoint, the oldest event held per URL is tracked, see ledger.DeliveryCheckpoint.
+    Failed requests raise, so the checkpoint is not advanced past their events.
+    """
+
+    def __init__(self, checkpoint: "DeliveryCheckpoint | None" = None) -> None: # noqa: ANN101
+        self._checkpoint = checkpoint
+        self._blocks: dict[str, list[dict]] = {}
+        self._sizes: dict[str, int] = {}
+        self._counts: dict[str, int] = {}
+        self._oldest: dict[str, int] = {}
+
+    def __len__(self) -> int: # noqa: ANN101
+        return sum(self._counts.values())
+
+    @property
+    def oldest_sequence(self) -> int | None: # noqa: ANN101
+        """Checkpoint sequence of the oldest event held, None if nothing is held."""
+        return min(self._oldest.values(), default=None)
+
+    def add(self, message: dict, hook_url: str) -> None: # noqa: ANN101
+        blocks = message["blocks"]
+        size = len(json_codec.dumps(blocks))
+        if hook_url in self._blocks and (
+            len(self._blocks[hook_url]) + len(blocks) > SLACK_MAX_BLOCKS
+            or self._sizes[hook_url] + size > SLACK_MAX_MESSAGE_CHARACTERS
+        ):
+            self._flush_hook_url(hook_url)
+        self._blocks.setdefault(hook_url, []).extend(blocks)
+        self._sizes[hook_url] = self._sizes.get(hook_url, 0) + size
+        self._counts[hook_url] = self._counts.get(hook_url, 0) + 1
+        if self._checkpoint is not None:
+            self._oldest.setdefault(hook_url, self._checkpoint.sequence)
+
+    def flush(self) -> None: # noqa: ANN101
+        for hook_url in list(self._blocks):
+            self._flush_hook_url(hook_url)
+
+    def _flush_hook_url(self, hook_url: str) -> None: # noqa: ANN101
+        blocks = self._blocks.pop(hook_url)
+        self._sizes.pop(hook_url)
+        count = self._counts.pop(hook_url)
+        try:
+            status = webhook_post_message(message = {"blocks": blocks}, hook_url = hook_url)
+        finally:
+            # Events of the request are no longer held, whether it succeeded or raises below
+            self._oldest.pop(hook_url, None)
+        if status != HTTPStatus.OK:
+            raise RuntimeError(f"Slack webhook returned status {status} for {count} packed messages")
+
+
 # Format message
-def event_to_slack_message(event:  dict, source_file :str , account_id_from_event: str ) ->  dict[str, Any]:
+def event_to_slack_message(
+        event: dict,
+        source_file: str,
+        account_id_from_event: str
+) ->  dict[str, Any]:
     event_name = event["eventName"]
     error_code = event.get("errorCode")
     error_message = event.get("errorMessage")
@@ -130,19 +200,19 @@ def event_to_slack_message(event:  dict, source_file :str , account_id_from_even
     if request_parameters is not None:
         contexts.append({
             "type": "mrkdwn",
-            "text": f"*requestParameters:* ```{json.dumps(request_parameters, indent=4)}```"
+            "text": f"*requestParameters:* ```{json_codec.dumps_pretty(request_parameters)}```"
         })
 
     if response_elements is not None:
         contexts.append({
             "type": "mrkdwn",
-            "text": f"*responseElements:* ```{json.dumps(response_elements, indent=4)}```"
+            "text": f"*responseElements:* ```{json_codec.dumps_pretty(response_elements)}```"
         })
 
     if additional_details is not None:
         contexts.append({
             "type": "mrkdwn",
-            "text": f"*additionalEventData:* ```{json.dumps(additional_details, indent=4)}```"
+            "text": f"*additionalEventData:* ```{json_codec.dumps_pretty(additional_details)}```"
         })
 
     contexts.append({
@@ -177,6 +247,52 @@ def event_to_slack_message(event:  dict, source_file :str , account_id_from_even
     return message
 
 
+# Number of rule and principal pairs listed in the summary of suppressed events
+SUPPRESSED_EVENTS_SUMMARY_MAX_LINES = 20
+
+
+def message_for_suppressed_events_summary(
+        suppressed: dict[tuple[str, str], int],
+) -> dict[str, Any]:
+    title = f":mute: *{sum(suppressed.values())} events were suppressed by rate policies:*"
+    top = sorted(suppressed.items(), key=lambda item: item[1], reverse=True)
+    blocks: list[dict[str, Any]] = [
+        {
+            "type": "section",
+            "text": {
+                "type": "mrkdwn",
+                "text": title
+            }
+        },
+    ]
+    for (rule, principal), count in top[:SUPPRESSED_EVENTS_SUMMARY_MAX_LINES]:
+        blocks.append(
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "mrkdwn",
+                        "text": f"*{count}* from *{principal}* \n*Rule:* ```{rule}```"
+                    }
+                ]
+            }
+        )
+    if len(top) > SUPPRESSED_EVENTS_SUMMARY_MAX_LINES:
+        others = sum(count for _, count in top[SUPPRESSED_EVENTS_SUMMARY_MAX_LINES:])
+        blocks.append(
+            {
+                "type": "context",
+                "elements": [
+                    {
+                        "type": "mrkdwn",
+                        "text": f"*{others}* more for {len(top) - SUPPRESSED_EVENTS_SUMMARY_MAX_LINES} other rules and principals"
+                    }
+                ]
+            }
+        )
+    return {"blocks": blocks}
+
+
 def message_for_slack_error_notification(
         error: Exception,
         s3_notification_event:  dict
@@ -1,10 +1,13 @@
-import json
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import config
+import json_codec
 from config import get_logger
 from dateutil.parser import parse as parse_date
 
+if TYPE_CHECKING:
+    from ledger import DeliveryCheckpoint
+
 logger = get_logger()
 
 def event_to_sns_message(event: dict, source_file: str, account_id_from_event: str | None) -> dict[str, Any]:
@@ -41,27 +44,78 @@ def event_to_sns_message(event: dict, source_file: str, account_id_from_event: s
     return message
 
 
-def send_message_to_sns(
+def render_sns_message(
     event: dict,
     source_file: str,
     account_id: str | None,
     cfg: config.Config,
-    sns_client # noqa: ANN001
-)-> None:
+) -> tuple[str, str] | None:
+    """Topic ARN and message for the event, None if no SNS topic is configured."""
     if default_topic_arn := cfg.default_sns_topic_arn:
-        logger.info("Sending message to SNS.")
-        message = json.dumps(event_to_sns_message(event, source_file, account_id))
-
-        logger.debug(f"SNS Message: {message}")
+        message = json_codec.dumps(event_to_sns_message(event, source_file, account_id))
         if account_id:
-            topic_arn = next(
-                (item["sns_topic_arn"] for item in cfg.sns_configuration if account_id in item["accounts"]),
-                default_topic_arn
-            )
+            topic_arn = cfg.sns_topic_arn_by_account.get(account_id, default_topic_arn)
         else:
             topic_arn = default_topic_arn
-        logger.debug(f"Topic ARN: {topic_arn}")
-        return sns_client.publish(
+        return topic_arn, message
+    return None
+
+
+# SNS limits for a single PublishBatch call
+SNS_MAX_BATCH_ENTRIES = 10
+SNS_MAX_BATCH_SIZE_BYTES = 256 * 1024
+
+
+class SnsBatchPublisher:
+    """
+    Buffers messages rendered by render_sns_message per topic and sends them with PublishBatch,
+    up to 10 entries or 256 KB per call.
+    Entries that fail in a batch are retried one by one with Publish.
+    With a delivery checkpoint, the oldest event held per topic is tracked, see ledger.DeliveryCheckpoint.
+    """
+
+    def __init__(self, sns_client, checkpoint: "DeliveryCheckpoint | None" = None) -> None: # noqa: ANN001, ANN101
+        self._sns_client = sns_client
+        self._checkpoint = checkpoint
+        self._messages: dict[str, list[str]] = {}
+        self._sizes: dict[str, int] = {}
+        self._oldest: dict[str, int] = {}
+
+    def __len__(self) -> int: # noqa: ANN101
+        return sum(len(messages) for messages in self._messages.values())
+
+    @property
+    def oldest_sequence(self) -> int | None: # noqa: ANN101
+        """Checkpoint sequence of the oldest event held, None if nothing is held."""
+        return min(self._oldest.values(), default=None)
+
+    def publish(self, TopicArn: str, Message: str) -> None: # noqa: ANN101, N803
+        size = len(Message.encode("utf-8"))
+        if self._sizes.get(TopicArn, 0) + size > SNS_MAX_BATCH_SIZE_BYTES:
+            self._flush_topic(TopicArn)
+        self._messages.setdefault(TopicArn, []).append(Message)
+        self._sizes[TopicArn] = self._sizes.get(TopicArn, 0) + size
+        if self._checkpoint is not None:
+            self._oldest.setdefault(TopicArn, self._checkpoint.sequence)
+        if len(self._messages[TopicArn]) >= SNS_MAX_BATCH_ENTRIES:
+            self._flush_topic(TopicArn)
+
+    def flush(self) -> None: # noqa: ANN101
+        for topic_arn in list(self._messages):
+            self._flush_topic(topic_arn)
+
+    def _flush_topic(self, topic_arn: str) -> None: # noqa: ANN101
+        messages = self._messages.pop(topic_arn, [])
+        self._sizes.pop(topic_arn, None)
+        if not messages:
+            return
+
+        logger.info({"Publishing messages to SNS": {"topic_arn": topic_arn, "count": len(messages)}})
+        response = self._sns_client.publish_batch(
             TopicArn = topic_arn,
-            Message = message,
+            PublishBatchRequestEntries = [{"Id": str(index), "Message": message} for index, message in enumerate(messages)],
         )
+        for failed in response.get("Failed", []):
+            logger.warning({"Failed to publish message to SNS in batch, retrying": {"failed": failed}})
+            self._sns_client.publish(TopicArn = topic_arn, Message = messages[int(failed["Id"])])
+        self._oldest.pop(topic_arn, None)
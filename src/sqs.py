@@ -0,0 +1,62 @@
+from typing import TYPE_CHECKING, List
+
+from config import get_logger
+
+if TYPE_CHECKING:
+    from ledger import DeliveryCheckpoint
+
+logger = get_logger()
+
+# SQS limits for a single SendMessageBatch call
+SQS_MAX_BATCH_ENTRIES = 10
+SQS_MAX_BATCH_SIZE_BYTES = 256 * 1024
+
+
+class SqsBatchSender:
+    """
+    Buffer of SQS messages sent with SendMessageBatch, up to 10 entries or 256 KB per call.
+    Entries that fail in a batch are retried one by one with SendMessage.
+    With a delivery checkpoint, the oldest event held is tracked, see ledger.DeliveryCheckpoint.
+    """
+
+    def __init__(self, queue_url: str, sqs_client, checkpoint: "DeliveryCheckpoint | None" = None) -> None:  # noqa: ANN001, ANN101
+        self.queue_url = queue_url
+        self._sqs_client = sqs_client
+        self._checkpoint = checkpoint
+        self._entries: List[str] = []
+        self._size = 0
+        # Checkpoint sequence of the oldest event held
+        self.oldest_sequence: int | None = None
+
+    def __len__(self) -> int:  # noqa: ANN101
+        return len(self._entries)
+
+    def add(self, body: str) -> bool:  # noqa: ANN101
+        """Add message to the buffer, returns False if message alone exceeds SQS size limit."""
+        size = len(body.encode("utf-8"))
+        if size > SQS_MAX_BATCH_SIZE_BYTES:
+            return False
+        if self._size + size > SQS_MAX_BATCH_SIZE_BYTES:
+            self.flush()
+        self._entries.append(body)
+        self._size += size
+        if self._checkpoint is not None and self.oldest_sequence is None:
+            self.oldest_sequence = self._checkpoint.sequence
+        if len(self._entries) >= SQS_MAX_BATCH_ENTRIES:
+            self.flush()
+        return True
+
+    def flush(self) -> None:  # noqa: ANN101
+        if not self._entries:
+            return
+        entries, self._entries, self._size = self._entries, [], 0
+
+        logger.info({"Sending messages to SQS": {"queue_url": self.queue_url, "count": len(entries)}})
+        response = self._sqs_client.send_message_batch(
+            QueueUrl=self.queue_url,
+            Entries=[{"Id": str(index), "MessageBody": body} for index, body in enumerate(entries)],
+        )
+        for failed in response.get("Failed", []):
+            logger.warning({"Failed to send message to SQS in batch, retrying": {"failed": failed}})
+            self._sqs_client.send_message(QueueUrl=self.queue_url, MessageBody=entries[int(failed["Id"])])
+        self.oldest_sequence = None
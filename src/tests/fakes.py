@@ -0,0 +1,217 @@
+# In-memory stand-ins for the AWS clients used by the lambda, shared by the unit tests and the load test.
+# They implement only the calls and condition expressions the lambda makes.
+import io
+import re
+import threading
+from typing import Any, Dict, List, Tuple
+
+from botocore.exceptions import ClientError
+
+# ruff: noqa: ANN101, N803
+
+
+class ConditionalCheckFailedException(Exception):  # noqa: N818 (same name as in botocore)
+    pass
+
+
+def _client_error(code: str, status: int, operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, operation)
+
+
+class FakeS3Client:
+    """Objects by bucket and key with ETags for conditional GETs and paginated listing, records calls."""
+
+    def __init__(self, page_size: int = 1000) -> None:
+        self.objects: Dict[Tuple[str, str], bytes] = {}
+        self.etags: Dict[Tuple[str, str], str] = {}
+        self.put_object_calls = 0
+        self.page_size = page_size
+        self.get_object_calls = 0
+        self.list_objects_v2_calls = 0
+        # Calls with their Range or IfNoneMatch argument, in order
+        self.calls: List[Tuple[str, str | None]] = []
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> Dict[str, Any]:
+        with self._lock:
+            self.put_object_calls += 1
+            self.objects[(Bucket, Key)] = Body
+            self.etags[(Bucket, Key)] = f'"{self.put_object_calls}"'
+            return {"ETag": self.etags[(Bucket, Key)]}
+
+    def head_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        with self._lock:
+            self.calls.append(("head_object", None))
+        return {"ContentLength": len(self.objects[(Bucket, Key)])}
+
+    def get_object(self, Bucket: str, Key: str, Range: str | None = None, IfNoneMatch: str | None = None) -> Dict[str, Any]:
+        with self._lock:
+            self.get_object_calls += 1
+            self.calls.append(("get_object", Range or IfNoneMatch))
+        if (Bucket, Key) not in self.objects:
+            raise _client_error("NoSuchKey", 404, "GetObject")
+        etag = self.etags[(Bucket, Key)]
+        if IfNoneMatch == etag:
+            raise _client_error("304", 304, "GetObject")
+        content = self.objects[(Bucket, Key)]
+        if Range is not None:
+            start, end = Range.removeprefix("bytes=").split("-")
+            content = content[int(start) : int(end) + 1]
+        return {"Body": io.BytesIO(content), "ContentLength": len(content), "ETag": etag}
+
+    def list_objects_v2(  # noqa: PLR0913
+        self,
+        Bucket: str,
+        Prefix: str,
+        StartAfter: str = "",
+        ContinuationToken: str | None = None,
+        Delimiter: str | None = None,
+    ) -> Dict[str, Any]:
+        with self._lock:
+            self.list_objects_v2_calls += 1
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix) and key > StartAfter)
+        if Delimiter:
+            # Keys with the delimiter after the prefix are rolled up into common prefixes, listed in order with keys
+            keys = sorted({key[: key.index(Delimiter, len(Prefix)) + 1] if Delimiter in key[len(Prefix) :] else key for key in keys})
+        start = int(ContinuationToken or 0)
+        page = keys[start : start + self.page_size]
+        response: Dict[str, Any] = {
+            "Contents": [{"Key": key, "Size": len(self.objects[(Bucket, key)])} for key in page if (Bucket, key) in self.objects],
+            "IsTruncated": start + self.page_size < len(keys),
+        }
+        if Delimiter:
+            response["CommonPrefixes"] = [{"Prefix": key} for key in page if key.endswith(Delimiter)]
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + self.page_size)
+        return response
+
+
+_TOKEN = re.compile(r"\s*(\(|\)|<=|>=|<>|<|>|=|,|[#:]?[A-Za-z_][A-Za-z0-9_.]*)")
+
+
+class _Condition:
+    """Evaluates DynamoDB condition expressions with OR, AND, NOT, parentheses, comparisons and attribute_(not_)exists."""
+
+    def __init__(self, expression: str, names: Dict[str, str], values: Dict[str, Dict[str, str]], item: Dict[str, Any] | None) -> None:  # noqa: E501
+        self.tokens = _TOKEN.findall(expression)
+        self.position = 0
+        self.names = names
+        self.values = values
+        self.item = item or {}
+
+    def evaluate(self) -> bool:
+        result = self._or()
+        if self.position != len(self.tokens):
+            raise ValueError(f"Unsupported condition expression: {' '.join(self.tokens)}")
+        return result
+
+    def _next(self) -> str:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def _peek(self) -> str | None:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def _or(self) -> bool:
+        result = self._and()
+        while self._peek() == "OR":
+            self._next()
+            result = self._and() or result
+        return result
+
+    def _and(self) -> bool:
+        result = self._factor()
+        while self._peek() == "AND":
+            self._next()
+            result = self._factor() and result
+        return result
+
+    def _factor(self) -> bool:
+        token = self._next()
+        if token == "NOT":
+            return not self._factor()
+        if token == "(":
+            result = self._or()
+            self._next()
+            return result
+        if token in ("attribute_exists", "attribute_not_exists"):
+            self._next()
+            exists = self._name(self._next()) in self.item
+            self._next()
+            return exists if token == "attribute_exists" else not exists
+        left = self._operand(token)
+        operator = self._next()
+        right = self._operand(self._next())
+        if left is None or right is None:
+            return False
+        return {
+            "=": left == right, "<>": left != right, "<": left < right,
+            "<=": left <= right, ">": left > right, ">=": left >= right,
+        }[operator]
+
+    def _name(self, token: str) -> str:
+        return self.names[token] if token.startswith("#") else token
+
+    def _operand(self, token: str) -> Any:  # noqa: ANN401
+        value = self.values[token] if token.startswith(":") else self.item.get(self._name(token))
+        if value is None:
+            return None
+        return float(value["N"]) if "N" in value else value.get("S")
+
+
+class FakeDynamoDBClient:
+    """Tables keyed by a single attribute, key attribute names are passed per table."""
+
+    class exceptions:  # noqa: N801
+        ConditionalCheckFailedException = ConditionalCheckFailedException
+
+    def __init__(self, key_attributes: Dict[str, str]) -> None:
+        self.key_attributes = key_attributes
+        self.tables: Dict[str, Dict[str, Dict[str, Any]]] = {name: {} for name in key_attributes}
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _check(self, item: Dict[str, Any] | None, kwargs: Dict[str, Any]) -> None:
+        expression = kwargs.get("ConditionExpression")
+        if expression and not _Condition(
+            expression, kwargs.get("ExpressionAttributeNames", {}), kwargs.get("ExpressionAttributeValues", {}), item
+        ).evaluate():
+            raise ConditionalCheckFailedException(expression)
+
+    def get_item(self, TableName: str, Key: Dict[str, Any], **_: Any) -> Dict[str, Any]:  # noqa: ANN401
+        with self._lock:
+            self.requests += 1
+            item = self.tables[TableName].get(Key[self.key_attributes[TableName]]["S"])
+            return {"Item": dict(item)} if item else {}
+
+    def put_item(self, TableName: str, Item: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:  # noqa: ANN401
+        with self._lock:
+            self.requests += 1
+            key = Item[self.key_attributes[TableName]]["S"]
+            self._check(self.tables[TableName].get(key), kwargs)
+            self.tables[TableName][key] = dict(Item)
+            return {}
+
+    def delete_item(self, TableName: str, Key: Dict[str, Any], **kwargs: Any) -> Dict[str, Any]:  # noqa: ANN401
+        with self._lock:
+            self.requests += 1
+            key = Key[self.key_attributes[TableName]]["S"]
+            self._check(self.tables[TableName].get(key), kwargs)
+            self.tables[TableName].pop(key, None)
+            return {}
+
+    def update_item(self, TableName: str, Key: Dict[str, Any], UpdateExpression: str, **kwargs: Any) -> Dict[str, Any]:  # noqa: ANN401
+        """Supports SET of attributes to values only."""
+        with self._lock:
+            self.requests += 1
+            key_attribute = self.key_attributes[TableName]
+            item = self.tables[TableName].get(Key[key_attribute]["S"])
+            self._check(item, kwargs)
+            item = dict(item or {key_attribute: Key[key_attribute]})
+            names, values = kwargs.get("ExpressionAttributeNames", {}), kwargs.get("ExpressionAttributeValues", {})
+            for assignment in UpdateExpression.removeprefix("SET ").split(","):
+                name, value = (part.strip() for part in assignment.split("="))
+                item[names.get(name, name)] = values[value]
+            self.tables[TableName][Key[key_attribute]["S"]] = item
+            return {}
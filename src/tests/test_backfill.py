@@ -0,0 +1,169 @@
+import gzip
+import json
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from backfill import BACKFILL_KEY, BackfillRequest, parse_time, run_backfill
+from config import Config
+from tests.fakes import FakeS3Client
+
+# ruff: noqa: ANN201, ANN001, ANN204, ANN101, E501, PLR2004
+
+PREFIX = "AWSLogs/123456789012/CloudTrail/eu-central-1/2026/01/"
+
+
+def log_file_key(day, hour):
+    return f"{PREFIX}{day:02d}/123456789012_CloudTrail_eu-central-1_202601{day:02d}T{hour:02d}00Z_abc.json.gz"
+
+
+def make_event(event_name, event_id):
+    return {"eventID": event_id, "eventName": event_name, "eventTime": "2026-01-24T00:00:00Z", "eventSource": "cloudtrail.amazonaws.com", "userIdentity": {"accountId": "123456789012"}}
+
+
+def make_s3_client(objects, page_size=2):
+    """Log files in a local S3 stand-in with paginated listing."""
+    s3_client = FakeS3Client(page_size=page_size)
+    for key, events in objects.items():
+        s3_client.put_object(Bucket="bucket", Key=key, Body=gzip.compress(json.dumps({"Records": events}).encode()))
+    return s3_client
+
+
+RULES = [
+    'event["eventSource"] == "cloudtrail.amazonaws.com" and event["eventName"] == "StopLogging"',
+    'event["eventSource"] == "cloudtrail.amazonaws.com" and event["eventName"] == "DeleteTrail"',
+]
+
+OBJECTS = {
+    log_file_key(1, 0): [make_event("StopLogging", "1"), make_event("GetObject", "2")],
+    log_file_key(2, 0): [make_event("DeleteTrail", "3")],
+    log_file_key(2, 12): [make_event("StopLogging", "4"), make_event("StopLogging", "5")],
+    log_file_key(3, 0): [make_event("StopLogging", "6")],
+    "AWSLogs/123456789012/CloudTrail-Digest/eu-central-1/2026/01/02/digest.json.gz": [],
+}
+
+
+def test_dry_run_reports_matches_per_rule_within_time_range():
+    from main import cfg, run_backfill_request
+
+    s3_client = make_s3_client(OBJECTS)
+    request = BackfillRequest(bucket="bucket", prefix="AWSLogs/", start_time=parse_time("2026-01-02T00:00:00Z"), end_time=datetime(2026, 1, 3, tzinfo=timezone.utc), dry_run=True, concurrency=2)
+    with (
+        patch.object(cfg, "rules", RULES),
+        patch("main.deliver_event") as mock_deliver_event,
+        patch.object(s3_client, "list_objects_v2", wraps=s3_client.list_objects_v2) as mock_list_objects,
+    ):
+        progress = run_backfill_request(request, source_s3_client=s3_client)
+
+    assert mock_deliver_event.call_count == 0
+    assert progress.completed
+    assert (progress.objects, progress.events, progress.matched, progress.delivered) == (2, 3, 3, 0)
+    assert progress.matches_per_rule == {RULES[0]: 2, RULES[1]: 1}
+    # Only the days within the time range are listed, digest files are not
+    listed = [call.kwargs for call in mock_list_objects.call_args_list if "Delimiter" not in call.kwargs]
+    assert {kwargs["Prefix"] for kwargs in listed} == {"AWSLogs/123456789012/CloudTrail/eu-central-1/"}
+    assert listed[0]["StartAfter"] == f"{PREFIX}02/"
+
+
+def test_time_range_lists_only_its_days():
+    from backfill import list_log_objects
+
+    s3_client = make_s3_client({log_file_key(day, 0): [] for day in range(1, 29)}, page_size=1)
+    request = BackfillRequest(bucket="bucket", prefix="AWSLogs/", start_time=parse_time("2026-01-10T00:00:00Z"), end_time=parse_time("2026-01-12T00:00:00Z"))
+    assert [key for key, _ in list_log_objects(s3_client, request, Config())] == [log_file_key(10, 0), log_file_key(11, 0)]
+    # 4 levels down to the region, then a page per day and one with the first key after the range
+    assert s3_client.list_objects_v2_calls == 4 + 3
+
+    # Keys in other layouts are listed in full and filtered by time of the log file
+    other_layout = make_s3_client({f"logs/123456789012_CloudTrail_eu-central-1_202601{day:02d}T0000Z_abc.json.gz": [] for day in range(1, 29)})
+    assert len(list(list_log_objects(other_layout, request._replace(prefix="logs/"), Config()))) == 2
+
+
+def test_backfill_resumes_from_checkpoint(tmp_path):
+    s3_client = make_s3_client(OBJECTS)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    request = BackfillRequest(bucket="bucket", prefix="AWSLogs/", concurrency=4, checkpoint=checkpoint)
+    delivered_events = []
+
+    def process_event(event, key, dry_run) -> tuple[str, bool]:  # noqa: ARG001
+        delivered_events.append(event["eventID"])
+        return event["eventName"], True
+
+    cfg = Config()
+    time_budget = MagicMock()
+    time_budget.is_exhausted.side_effect = [False, True]
+    progress = run_backfill(request, s3_client, cfg, process_event, flush=lambda: None, time_budget=time_budget, checkpoint_every=1)
+    assert not progress.completed
+    assert progress.last_key == log_file_key(2, 0)
+    assert json.loads((tmp_path / "checkpoint.json").read_text())["last_key"] == log_file_key(2, 0)
+
+    progress = run_backfill(request, s3_client, cfg, process_event, flush=lambda: None)
+    assert progress.completed
+    assert progress.objects == 4
+    assert delivered_events == ["1", "2", "3", "4", "5", "6"]
+    assert progress.matches_per_rule == {"StopLogging": 4, "GetObject": 1, "DeleteTrail": 1}
+
+
+def test_backfill_continues_in_new_invocation():
+    from main import cfg, lambda_handler
+
+    context = MagicMock(invoked_function_arn="arn:aws:lambda:eu-central-1:123456789012:function:f")
+    context.get_remaining_time_in_millis.side_effect = [60000, 1000]
+    with (
+        patch("main.s3_client", make_s3_client(OBJECTS)),
+        patch("main.lambda_client") as mock_lambda_client,
+        patch("main.deliver_event"),
+        patch.object(cfg, "rules", RULES),
+    ):
+        result = lambda_handler({BACKFILL_KEY: {"bucket": "bucket", "prefix": "AWSLogs/"}}, context)
+
+    assert result["objects"] == 2
+    payload = json.loads(mock_lambda_client.invoke.call_args.kwargs["Payload"])
+    assert payload[BACKFILL_KEY]["start_after"] == log_file_key(2, 0)
+    assert payload[BACKFILL_KEY]["progress"]["objects"] == 2
+
+
+def test_backfill_does_not_push_metrics_or_post_rule_errors():
+    from main import cfg, run_backfill_request
+
+    event = make_event("StopLogging", "1") | {"errorCode": "AccessDenied"}
+    s3_client = make_s3_client({log_file_key(1, 0): [event]})
+    request = BackfillRequest(bucket="bucket", prefix="AWSLogs/")
+    with (
+        patch.object(cfg, "rules", ["event['missing'] == 1", *RULES]),
+        patch.object(cfg, "rule_evaluation_errors_to_slack", True),
+        patch.object(cfg, "push_access_denied_cloudwatch_metrics", True),
+        patch("main.deliver_event") as mock_deliver_event,
+        patch("main.post_message") as mock_post_message,
+        patch("main.push_total_access_denied_events_cloudwatch_metric") as mock_push_metric,
+    ):
+        progress = run_backfill_request(request, source_s3_client=s3_client)
+
+    assert progress.delivered == 1
+    assert mock_deliver_event.call_count == 1
+    mock_post_message.assert_not_called()
+    mock_push_metric.assert_not_called()
+
+
+def test_failed_objects_are_reported_and_can_be_processed_again():
+    from main import cfg, lambda_handler
+
+    s3_client = make_s3_client(OBJECTS)
+    s3_client.objects[("bucket", log_file_key(2, 0))] = b"not gzip"
+    failing_key = log_file_key(2, 12)
+
+    def deliver_event(event, source_file_object_key, account_id) -> None:  # noqa: ARG001
+        if source_file_object_key == failing_key:
+            raise RuntimeError("Slack is down")
+
+    with (
+        patch("main.s3_client", s3_client),
+        patch("main.deliver_event", side_effect=deliver_event),
+        patch.object(cfg, "rules", RULES),
+    ):
+        result = lambda_handler({BACKFILL_KEY: {"bucket": "bucket", "prefix": "AWSLogs/"}}, None)
+        assert result["completed"]
+        assert result["objects"] == 4
+        assert result["failed_objects"] == [log_file_key(2, 0), failing_key]
+
+        result = lambda_handler({BACKFILL_KEY: {"bucket": "bucket", "keys": [failing_key]}}, None)
+        assert (result["objects"], result["delivered"], result["failed_objects"]) == (1, 0, [failing_key])
@@ -0,0 +1,54 @@
+import base64
+import gzip
+import json
+from unittest.mock import patch
+
+from cloudwatch_logs import decode_cloudwatch_logs_event, parse_log_event_messages
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+with open("tests/test_events.json") as f:
+    data = json.load(f)
+
+
+def make_awslogs_event(messages, message_type="DATA_MESSAGE"):
+    payload = {
+        "messageType": message_type,
+        "owner": "123456789012",
+        "logGroup": "aws-cloudtrail-logs",
+        "logStream": "123456789012_CloudTrail_eu-central-1",
+        "subscriptionFilters": ["cloudtrail-to-slack"],
+        "logEvents": [{"id": str(index), "timestamp": 1769212800000, "message": message} for index, message in enumerate(messages)],
+    }
+    return {"awslogs": {"data": base64.b64encode(gzip.compress(json.dumps(payload).encode())).decode()}}
+
+
+def test_log_events_are_decoded_to_cloudtrail_records():
+    events = [test_event["event"] for test_event in data["test_events"]]
+    batch = decode_cloudwatch_logs_event(make_awslogs_event([json.dumps(event) for event in events]))
+    assert batch.source == "aws-cloudtrail-logs:123456789012_CloudTrail_eu-central-1"
+    assert batch.events == events
+
+    assert decode_cloudwatch_logs_event(make_awslogs_event(["CWL CONTROL MESSAGE"], message_type="CONTROL_MESSAGE")).events == []
+
+
+def test_malformed_messages_are_skipped():
+    assert parse_log_event_messages(['{"eventName": "A"}', "not json", '{"eventName": "B"}']) == [{"eventName": "A"}, {"eventName": "B"}]
+    assert parse_log_event_messages(['{"eventName": "A"}', "1, 2"]) == [{"eventName": "A"}]
+    assert parse_log_event_messages([]) == []
+
+
+def test_messages_that_are_not_records_are_skipped():
+    assert parse_log_event_messages(['{"eventName": "A"}', '"text"', "42", "null", '{"eventName": "B"}']) == [{"eventName": "A"}, {"eventName": "B"}]
+    assert parse_log_event_messages(['"text"', "not json"]) == []
+
+
+def test_subscription_payload_is_handled():
+    from main import lambda_handler
+
+    event = data["test_events"][0]["event"]
+    with patch("main.handle_event") as mock_handle_event, patch("main.flush_pending_deliveries") as mock_flush:
+        assert lambda_handler(make_awslogs_event([json.dumps(event), json.dumps(event)]), None) == 200
+    assert mock_handle_event.call_count == 2
+    assert mock_handle_event.call_args.args[:2] == (event, "aws-cloudtrail-logs:123456789012_CloudTrail_eu-central-1")
+    mock_flush.assert_called_once()
@@ -0,0 +1,138 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import dedup
+import pytest
+from config import Config
+from dedup import BloomFilter, EventClaims, ExpiringBloomFilter, get_event_fingerprint
+from tests.fakes import FakeDynamoDBClient
+
+# ruff: noqa: ANN201, ANN001, ANN204, ANN101, E501, PLR2004
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom_filter = BloomFilter(capacity=10000, false_positive_rate=0.001)
+    for i in range(10000):
+        bloom_filter.add(f"event-{i}")
+    assert all(f"event-{i}" in bloom_filter for i in range(10000))
+    false_positives = sum(f"other-{i}" in bloom_filter for i in range(10000))
+    assert false_positives < 50
+
+
+def test_expiring_bloom_filter_forgets_keys_after_two_periods(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(dedup.time, "monotonic", lambda: now[0])
+    seen = ExpiringBloomFilter(capacity=100, false_positive_rate=0.001, time_to_live=60)
+    seen.add("event")
+    now[0] += 90
+    assert "event" in seen
+    now[0] += 60
+    assert "event" not in seen
+
+
+def test_event_fingerprint():
+    assert get_event_fingerprint({"eventID": "abc", "eventName": "x"}) == "abc"
+    assert get_event_fingerprint({"eventName": "x", "a": 1}) == get_event_fingerprint({"a": 1, "eventName": "x"})
+    assert get_event_fingerprint({"eventName": "x"}) != get_event_fingerprint({"eventName": "y"})
+
+
+def make_claims(dynamodb_client, cfg):
+    return EventClaims(ExpiringBloomFilter(100, 0.001, 60), dynamodb_client, cfg)
+
+
+def test_duplicates_are_dropped_across_execution_environments(monkeypatch):
+    monkeypatch.setenv("DEDUP_TABLE_NAME", "dedup")
+    cfg = Config()
+    dynamodb_client = FakeDynamoDBClient({"dedup": "event_fingerprint"})
+    first_environment = make_claims(dynamodb_client, cfg)
+    second_environment = make_claims(dynamodb_client, cfg)
+    event = {"eventID": "abc", "eventName": "StopLogging"}
+
+    assert first_environment.claim(event) == "abc"
+    first_environment.hold("abc")
+    # Held events are duplicates before buffers are flushed
+    assert first_environment.claim(event) is None
+    first_environment.flushed()
+    assert first_environment.claim(event) is None
+    assert second_environment.claim(event) is None
+
+
+def test_claims_are_released_when_flush_fails(monkeypatch):
+    monkeypatch.setenv("DEDUP_TABLE_NAME", "dedup")
+    cfg = Config()
+    dynamodb_client = FakeDynamoDBClient({"dedup": "event_fingerprint"})
+    claims = make_claims(dynamodb_client, cfg)
+    event = {"eventID": "abc", "eventName": "StopLogging"}
+
+    assert claims.claim(event) == "abc"
+    claims.hold("abc")
+    claims.flush_failed()
+    assert dynamodb_client.tables["dedup"] == {}
+    # Retry in any execution environment delivers the event
+    assert make_claims(dynamodb_client, cfg).claim(event) == "abc"
+
+
+def test_duplicate_event_is_delivered_once_and_failed_delivery_can_be_retried():
+    from main import handle_event
+
+    event = {"eventID": "abc", "eventName": "StopLogging", "eventTime": "2026-01-24T00:00:00Z", "eventSource": "cloudtrail.amazonaws.com", "userIdentity": {"accountId": "123456789012"}}
+    rules = ['event["eventName"] == "StopLogging"']
+
+    with (
+        patch("main.event_claims", make_claims(None, Config())),
+        patch("main.deliver_event", side_effect=[RuntimeError("Slack is down"), None]) as mock_deliver_event,
+    ):
+        with pytest.raises(RuntimeError):
+            handle_event(event, "file", rules, [])
+        assert handle_event(event, "file", rules, [])
+        assert not handle_event(event, "file", rules, [])
+        assert mock_deliver_event.call_count == 2
+
+
+def test_events_of_failed_flush_are_delivered_on_retry():
+    import main
+    from sns import SnsBatchPublisher
+
+    envelope = {
+        "source": "aws.cloudtrail",
+        "detail-type": "AWS API Call via CloudTrail",
+        "detail": {"eventID": "abc", "eventName": "StopLogging", "eventTime": "2026-01-24T00:00:00Z", "userIdentity": {"type": "IAMUser"}},
+    }
+    sqs_event = {"Records": [{"messageId": "1", "body": json.dumps(envelope)}]}
+    sns_client = MagicMock()
+    sns_client.publish_batch.side_effect = [RuntimeError("SNS is down"), {"Failed": []}]
+
+    with (
+        patch("main.event_claims", make_claims(None, main.cfg)),
+        patch("main.sns_publisher", SnsBatchPublisher(sns_client)),
+        patch("main.deliver_event", side_effect=lambda event, *_: main.sns_publisher.publish(TopicArn="topic", Message=event["eventID"])),
+        patch.object(main.cfg, "rules", ["event['eventName'] == 'StopLogging'"]),
+    ):
+        assert main.eventbridge_handler(sqs_event, None) == {"batchItemFailures": [{"itemIdentifier": "1"}]}
+        # SQS retries the batch, the event is not dropped as a duplicate
+        assert main.eventbridge_handler(sqs_event, None) == {"batchItemFailures": []}
+        assert main.eventbridge_handler(sqs_event, None) == {"batchItemFailures": []}
+
+    assert sns_client.publish_batch.call_count == 2
+
+
+def test_duplicates_do_not_take_rate_policy_tokens():
+    from main import handle_event
+    from rate_policy import RateLimiter
+
+    rules = ['event["eventName"] == "StopLogging"']
+    rate_limiter = RateLimiter([{"rule": rules[0], "type": "token_bucket", "burst": 1, "rate_per_minute": 1}], summary_interval=300)
+    event = {"eventID": "abc", "eventName": "StopLogging", "eventTime": "2026-01-24T00:00:00Z", "userIdentity": {"arn": "arn:aws:iam::123456789012:user/someone"}}
+
+    with (
+        patch("main.event_claims", make_claims(None, Config())),
+        patch("main.rate_limiter", rate_limiter),
+        patch("main.deliver_event") as mock_deliver_event,
+    ):
+        assert handle_event(event, "file", rules, [])
+        assert not handle_event(event, "file", rules, [])
+        assert handle_event(event | {"eventID": "def"}, "file", rules, []) is False
+
+    assert mock_deliver_event.call_count == 1
+    # Only the second distinct event was suppressed, not the duplicate
+    assert rate_limiter.pop_summary(force=True) == {(rules[0], "arn:aws:iam::123456789012:user/someone"): 1}
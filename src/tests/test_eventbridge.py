@@ -0,0 +1,58 @@
+import json
+from unittest.mock import patch
+
+from eventbridge import normalize_eventbridge_event
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+with open("tests/test_events.json") as f:
+    data = json.load(f)
+
+
+def make_envelope(detail, detail_type="AWS API Call via CloudTrail"):
+    return {
+        "version": "0",
+        "id": "6a7e8feb-b491-4cf7-a9f1-bf3703467718",
+        "detail-type": detail_type,
+        "source": "aws.cloudtrail",
+        "account": "123456789012",
+        "time": "2026-01-24T00:00:00Z",
+        "region": "eu-central-1",
+        "resources": [],
+        "detail": detail,
+    }
+
+
+def test_detail_is_normalized_to_log_file_record():
+    event = data["test_events"][0]["event"]
+    assert normalize_eventbridge_event(make_envelope(dict(event))) == event
+
+    detail = {"eventName": "StopLogging", "eventSource": "cloudtrail.amazonaws.com", "userIdentity": {"accountId": "123456789012"}}
+    normalized = normalize_eventbridge_event(make_envelope(detail))
+    assert (normalized["awsRegion"], normalized["recipientAccountId"], normalized["eventTime"]) == ("eu-central-1", "123456789012", "2026-01-24T00:00:00Z")
+    assert normalize_eventbridge_event(make_envelope({"instance-id": "i-1"}, detail_type="EC2 Instance State-change Notification")) is None
+
+
+def test_direct_eventbridge_event_is_handled():
+    from main import lambda_handler
+
+    event = data["test_events"][0]["event"]
+    with patch("main.handle_event") as mock_handle_event:
+        assert lambda_handler(make_envelope(dict(event)), None) == 200
+    assert mock_handle_event.call_args.args[:2] == (event, "EventBridge")
+
+
+def test_sqs_batch_reports_failed_messages():
+    from main import lambda_handler
+
+    event = data["test_events"][0]["event"]
+    sqs_event = {
+        "Records": [
+            {"messageId": "1", "eventSource": "aws:sqs", "body": json.dumps(make_envelope(dict(event)))},
+            {"messageId": "2", "eventSource": "aws:sqs", "body": "not json"},
+            {"messageId": "3", "eventSource": "aws:sqs", "body": json.dumps([make_envelope(dict(event)), make_envelope(dict(event))])},
+        ]
+    }
+    with patch("main.handle_event") as mock_handle_event:
+        assert lambda_handler(sqs_event, None) == {"batchItemFailures": [{"itemIdentifier": "2"}]}
+    assert mock_handle_event.call_count == 3
@@ -0,0 +1,40 @@
+import json
+from unittest.mock import patch
+
+import json_codec
+import pytest
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+with open("tests/test_events.json") as f:
+    data = json.load(f)
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request):
+    if request.param == "orjson" and json_codec.orjson is None:
+        pytest.skip("orjson is not installed")
+    with patch("json_codec.orjson", json_codec.orjson if request.param == "orjson" else None):
+        yield
+
+
+@pytest.mark.usefixtures("backend")
+@pytest.mark.parametrize("test_event", [event["event"] for event in data["test_events"]])
+def test_round_trip_and_pretty_layout(test_event):
+    assert json_codec.loads(json_codec.dumps(test_event)) == test_event
+    assert json_codec.loads(json_codec.dumps_bytes(test_event)) == test_event
+    # Slack messages show payloads with the same layout as before
+    assert json_codec.dumps_pretty(test_event) == json.dumps(test_event, indent=4, ensure_ascii=False)
+
+
+@pytest.mark.usefixtures("backend")
+def test_pretty_output_does_not_depend_on_backend():
+    payload = {"userName": "Jürgen Müller", "description": "テスト", "emoji": "✅"}
+    assert json_codec.dumps_pretty(payload) == '{\n    "userName": "Jürgen Müller",\n    "description": "テスト",\n    "emoji": "✅"\n}'
+
+
+@pytest.mark.usefixtures("backend")
+def test_unsupported_values_fall_back_to_stdlib():
+    assert json_codec.loads(json_codec.dumps({"big": 2**70, 1: "a"})) == {"big": 2**70, "1": "a"}
+    assert json_codec.dumps({"error": ValueError("x")}, default=str) in ('{"error":"x"}', '{"error": "x"}')
+    with pytest.raises(json_codec.JSONDecodeError):
+        json_codec.loads("not json")
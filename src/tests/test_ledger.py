@@ -0,0 +1,157 @@
+from unittest.mock import patch
+
+import pytest
+from config import Config
+from ledger import DeliveryCheckpoint, get_resume_offset
+from tests.fakes import FakeDynamoDBClient
+
+# ruff: noqa: ANN201, ANN001, ANN204, ANN101, E501, PLR2004
+
+
+RECORD = {
+    "eventName": "ObjectCreated:Put",
+    "s3": {
+        "bucket": {"name": "test-bucket"},
+        "object": {"key": "AWSLogs/123456789012/CloudTrail/us-east-1/2026/01/24/file.json.gz", "eTag": "abc"},
+    },
+}
+EVENTS = [{"eventID": str(i), "eventName": "GetObject"} for i in range(5)]
+
+
+def test_get_resume_offset():
+    assert get_resume_offset(EVENTS, None) == 0
+    assert get_resume_offset(EVENTS, "2") == 3
+    assert get_resume_offset(EVENTS, "4") == 5
+    assert get_resume_offset(EVENTS, "unknown") == 0
+
+
+def test_delivery_checkpoint_stops_before_oldest_buffered_event():
+    checkpoint = DeliveryCheckpoint()
+    for event_id in "abcd":
+        checkpoint.next_event()
+        checkpoint.delivered(event_id)
+    # Events b, c and d are still held by a buffer
+    assert checkpoint.pop_sent(oldest_buffered=2) == "a"
+    assert checkpoint.pop_sent(oldest_buffered=2) is None
+    assert checkpoint.pop_sent(oldest_buffered=4) == "c"
+    assert checkpoint.pop_sent(oldest_buffered=None) == "d"
+
+
+def test_partially_processed_object_is_resumed_and_completed_object_is_skipped(monkeypatch):
+    from main import handle_created_object_record
+
+    monkeypatch.setenv("LEDGER_TABLE_NAME", "ledger")
+    cfg = Config()
+    dynamodb_client = FakeDynamoDBClient({"ledger": "object_id"})
+    log_record = {"key": RECORD["s3"]["object"]["key"], "events": EVENTS}
+
+    def fail_after_second_event(event, **_: object) -> bool:
+        if event["eventID"] == "2":
+            raise RuntimeError("Slack is down")
+        return True
+
+    with (
+        patch("main.dynamodb_client", dynamodb_client),
+        patch("main.get_cloudtrail_log_records", return_value=log_record),
+        patch("main.handle_event", side_effect=fail_after_second_event),
+        pytest.raises(RuntimeError),
+    ):
+        handle_created_object_record(RECORD, cfg)
+
+    with (
+        patch("main.dynamodb_client", dynamodb_client),
+        patch("main.get_cloudtrail_log_records", return_value=log_record),
+        patch("main.handle_event", return_value=True) as mock_handle_event,
+    ):
+        handle_created_object_record(RECORD, cfg)
+        # Events 0 and 1 were delivered by the first invocation
+        assert [call.kwargs["event"]["eventID"] for call in mock_handle_event.call_args_list] == ["2", "3", "4"]
+
+    with (
+        patch("main.dynamodb_client", dynamodb_client),
+        patch("main.get_cloudtrail_log_records") as mock_get_logs,
+        patch("main.handle_event") as mock_handle_event,
+    ):
+        handle_created_object_record(RECORD, cfg)
+        assert not mock_get_logs.called
+        assert not mock_handle_event.called
+
+
+def test_packed_webhook_messages_are_checkpointed_when_sent(monkeypatch):
+    import main
+    from slack_helpers import SlackWebhookPacker
+
+    monkeypatch.setenv("LEDGER_TABLE_NAME", "ledger")
+    cfg = Config()
+    timeline = []
+
+    class RecordingDynamoDBClient(FakeDynamoDBClient):
+        def update_item(self, **kwargs: object) -> dict:
+            if ":event_id" in kwargs["ExpressionAttributeValues"]:
+                timeline.append(("checkpoint", kwargs["ExpressionAttributeValues"][":event_id"]["S"]))
+            return super().update_item(**kwargs)
+
+    def post(message, hook_url) -> int:  # noqa: ARG001
+        event_ids = [element["text"].removeprefix("Id: ") for block in message["blocks"] for element in block.get("elements", []) if element["text"].startswith("Id: ")]
+        timeline.append(("posted", event_ids))
+        return 200
+
+    events = [
+        {"eventID": str(i), "eventName": "StopLogging", "eventTime": "2026-01-24T00:00:00Z", "userIdentity": {"type": "IAMUser"}}
+        for i in range(40)
+    ]
+    dynamodb_client = RecordingDynamoDBClient({"ledger": "object_id"})
+    with (
+        patch("main.dynamodb_client", dynamodb_client),
+        patch("main.get_cloudtrail_log_records", return_value={"key": RECORD["s3"]["object"]["key"], "events": events}),
+        patch("main.webhook_packer", SlackWebhookPacker(main.delivery_checkpoint)),
+        patch("slack_helpers.webhook_post_message", side_effect=post),
+        patch.object(main.slack_config, "configuration", []),
+        patch.object(cfg, "rules", ["event['eventName'] == 'StopLogging'"]),
+    ):
+        main.handle_created_object_record(RECORD, cfg)
+
+    # The ledger advances every time a packed message is sent, not only at the end of the file
+    assert [kind for kind, _ in timeline] == ["posted", "checkpoint"] * 2 + ["posted"]
+    posted = set()
+    for kind, value in timeline:
+        if kind == "posted":
+            posted.update(value)
+        else:
+            # Every event up to the checkpoint was sent before it was written
+            assert {str(i) for i in range(int(value) + 1)} <= posted
+    assert dynamodb_client.tables["ledger"][main.get_ledger_object_id(RECORD, RECORD["s3"]["object"]["key"])]["completed"] == {"BOOL": True}
+
+
+def test_checkpoint_is_not_advanced_past_failed_webhook_request(monkeypatch):
+    import main
+    from slack_helpers import SlackWebhookPacker
+
+    monkeypatch.setenv("LEDGER_TABLE_NAME", "ledger")
+    cfg = Config()
+    posted = []
+
+    def post(message, hook_url) -> int:  # noqa: ARG001
+        posted.append(message)
+        return 200 if len(posted) == 1 else 500
+
+    events = [
+        {"eventID": str(i), "eventName": "StopLogging", "eventTime": "2026-01-24T00:00:00Z", "userIdentity": {"type": "IAMUser"}}
+        for i in range(40)
+    ]
+    dynamodb_client = FakeDynamoDBClient({"ledger": "object_id"})
+    with (
+        patch("main.dynamodb_client", dynamodb_client),
+        patch("main.get_cloudtrail_log_records", return_value={"key": RECORD["s3"]["object"]["key"], "events": events}),
+        patch("main.webhook_packer", SlackWebhookPacker(main.delivery_checkpoint)),
+        patch("slack_helpers.webhook_post_message", side_effect=post),
+        patch.object(main.slack_config, "configuration", []),
+        patch.object(cfg, "rules", ["event['eventName'] == 'StopLogging'"]),
+        pytest.raises(RuntimeError, match="status 500"),
+    ):
+        main.handle_created_object_record(RECORD, cfg)
+
+    item = dynamodb_client.tables["ledger"][main.get_ledger_object_id(RECORD, RECORD["s3"]["object"]["key"])]
+    first_request_events = sum(block["type"] == "divider" for block in posted[0]["blocks"])
+    assert item["last_delivered_event_id"] == {"S": str(first_request_events - 1)}
+    assert "completed" not in item
@@ -0,0 +1,84 @@
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+from memory_profile import MemoryProfiler
+from tests.fakes import FakeS3Client
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+MB = 1024 * 1024
+
+
+def make_log_file(events_count):
+    events = [
+        {
+            "eventVersion": "1.09",
+            "userIdentity": {"type": "IAMUser", "arn": f"arn:aws:iam::123456789012:user/user-{i % 50}", "accountId": "123456789012"},
+            "eventTime": "2026-01-24T00:00:00Z",
+            "eventSource": "s3.amazonaws.com",
+            "eventName": "GetObject",
+            "awsRegion": "eu-central-1",
+            "requestParameters": {"bucketName": "data", "key": f"objects/{i}.json"},
+            "requestID": f"request-{i}",
+            "eventID": f"event-{i}",
+        }
+        for i in range(events_count)
+    ]
+    content = json.dumps({"Records": events}).encode()
+    return content, gzip.compress(content)
+
+
+def test_stages_are_profiled():
+    profiler = MemoryProfiler(enabled=True, top=3)
+
+    @profiler.profile_invocation
+    def handler() -> int:
+        with profiler.stage("allocate"):
+            data = [bytes(1000) for _ in range(1000)]
+            with profiler.stage("nested"):
+                transient = bytes(2 * MB)
+                del transient
+        return len(data)
+
+    assert handler() == 1000
+    stages = {stage["stage"]: stage for stage in profiler.last_report["stages"]}
+    assert 2 * MB <= stages["nested"]["peak_bytes"] < 3 * MB
+    assert stages["nested"]["retained_bytes"] < 1000
+    assert stages["allocate"]["peak_bytes"] >= 3 * 10**6
+    assert stages["allocate"]["retained_bytes"] >= 10**6
+    assert stages["allocate"]["top_allocations"][0]["site"].rsplit(":", 1)[0].endswith("test_memory_profile.py")
+    assert profiler.last_report["peak_bytes"] >= stages["allocate"]["peak_bytes"]
+
+
+def test_disabled_profiler_does_not_trace():
+    import tracemalloc
+
+    profiler = MemoryProfiler(enabled=False)
+    assert profiler.profile_invocation(lambda: 1)() == 1
+    assert not tracemalloc.is_tracing()
+    assert profiler.last_report is None
+
+
+@pytest.mark.parametrize("events_count", [1000, 10000])
+def test_peak_memory_of_log_file_processing(events_count):
+    from main import lambda_handler, logger, memory_profiler
+
+    content, body = make_log_file(events_count)
+    key = "AWSLogs/123456789012/CloudTrail/eu-central-1/2026/01/24/file.json.gz"
+    record = {"eventName": "ObjectCreated:Put", "s3": {"bucket": {"name": "bucket"}, "object": {"key": key, "size": len(body)}}}
+    s3_client = FakeS3Client()
+    s3_client.put_object(Bucket="bucket", Key=key, Body=body)
+    # Log records captured by pytest would be counted as allocations of the invocation
+    with patch("main.s3_client", s3_client), patch.object(memory_profiler, "enabled", True), patch.object(logger, "disabled", True):
+        lambda_handler({"Records": [record]}, None)
+
+    report = memory_profiler.last_report
+    stages = {stage["stage"]: stage for stage in report["stages"]}
+    assert set(stages) == {"download", "decode", "events", "flush"}
+    # Decompressed content and parsed events are alive at the same time, nothing else should grow with the file
+    assert report["peak_bytes"] < 6 * len(content) + 2 * MB
+    # Events are evaluated one by one, flattened copies must not accumulate
+    assert stages["events"]["peak_bytes"] < MB
+    assert stages["decode"]["top_allocations"][0]["site"].rsplit(":", 1)[0].endswith("json_codec.py")
@@ -90,11 +90,14 @@ def message_should_be_processed_with_incorrect_rule_test_case(request):
 
 
 def test_message_should_be_processed(message_should_be_processed_test_cases) -> None:
-    assert should_message_be_processed(
+    result = should_message_be_processed(
         event = message_should_be_processed_test_cases["event"],
         rules = default_rules,
         ignore_rules = []
-        ) == ProcessingResult(should_be_processed=True, errors=[])
+        )
+    assert result == ProcessingResult(should_be_processed=True, errors=[], rule=result.rule)
+    # Matched rule is reported, so rate policies can be applied per rule
+    assert result.rule in default_rules
 
 
 def test_message_should_not_be_processed(message_should_not_be_processed_test_cases) -> None:
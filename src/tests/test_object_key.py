@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+import pytest
+from config import Config
+from object_key import CloudTrailObjectKey, get_routing_account_id, parse_cloudtrail_object_key, should_object_be_processed
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+KEY = "AWSLogs/123456789012/CloudTrail/us-east-1/2026/01/24/file.json.gz"
+
+
+@pytest.mark.parametrize(
+    ("key", "expected"),
+    [
+        (
+            "AWSLogs/123456789012/CloudTrail/us-east-1/2026/01/24/file.json.gz",
+            CloudTrailObjectKey("AWSLogs/123456789012/CloudTrail/us-east-1/2026/01/24/file.json.gz", "123456789012", "CloudTrail", "us-east-1"),
+        ),
+        (
+            "prefix/AWSLogs/o-abc123/123456789012/CloudTrail-Insight/eu-west-1/2026/01/24/file.json.gz",
+            CloudTrailObjectKey(
+                "prefix/AWSLogs/o-abc123/123456789012/CloudTrail-Insight/eu-west-1/2026/01/24/file.json.gz",
+                "123456789012",
+                "CloudTrail-Insight",
+                "eu-west-1",
+                "o-abc123",
+            ),
+        ),
+        ("AWSLogs/file1.json.gz", None),
+        ("some/other/key.json.gz", None),
+    ],
+    ids=["account_trail", "organization_trail_with_prefix", "too_short", "no_aws_logs_segment"],
+)
+def test_parse_cloudtrail_object_key(key, expected):
+    assert parse_cloudtrail_object_key(key) == expected
+
+
+def test_should_object_be_processed_filters(monkeypatch):
+    monkeypatch.setenv("OBJECT_KEY_ACCOUNTS", "111111111111, 222222222222")
+    monkeypatch.setenv("OBJECT_KEY_REGIONS", "us-east-1")
+    monkeypatch.setenv("OBJECT_KEY_LOG_TYPES", "CloudTrail")
+    cfg = Config()
+
+    def key(account_id, log_type="CloudTrail", region="us-east-1") -> CloudTrailObjectKey | None:
+        return parse_cloudtrail_object_key(f"AWSLogs/{account_id}/{log_type}/{region}/2026/01/24/file.json.gz")
+
+    assert should_object_be_processed(key("111111111111"), cfg)
+    assert should_object_be_processed(key("222222222222"), cfg)
+    assert not should_object_be_processed(key("333333333333"), cfg)
+    assert not should_object_be_processed(key("111111111111", region="eu-west-1"), cfg)
+    assert not should_object_be_processed(key("111111111111", log_type="CloudTrail-Insight"), cfg)
+    # Keys outside of the CloudTrail layout are always downloaded
+    assert should_object_be_processed(None, cfg)
+
+
+def test_all_log_types_are_processed_by_default():
+    key = parse_cloudtrail_object_key("AWSLogs/123456789012/CloudTrail-Insight/us-east-1/2026/01/24/insight.json.gz")
+    assert should_object_be_processed(key, Config())
+
+
+def test_events_without_account_are_routed_to_account_of_log_file():
+    assert get_routing_account_id({"userIdentity": {"accountId": "111111111111"}}, KEY) == "111111111111"
+    assert get_routing_account_id({"userIdentity": {"type": "AWSService"}}, KEY) == "123456789012"
+    assert get_routing_account_id({}, "some/other/key.json.gz") == ""
+
+
+def test_untracked_objects_are_not_downloaded():
+    from main import cfg, lambda_handler
+
+    s3_event = {
+        "Records": [
+            {
+                "eventName": "ObjectCreated:Put",
+                "s3": {
+                    "bucket": {"name": "test-bucket"},
+                    "object": {"key": "AWSLogs/123456789012/CloudTrail-Insight/us-east-1/2026/01/24/insight.json.gz"},
+                },
+            },
+            {
+                "eventName": "ObjectCreated:Put",
+                "s3": {
+                    "bucket": {"name": "test-bucket"},
+                    "object": {"key": KEY},
+                },
+            },
+        ]
+    }
+
+    with patch.object(cfg, "object_key_log_types", ["CloudTrail"]), patch("main.get_cloudtrail_log_records") as mock_get_logs:
+        mock_get_logs.return_value = None
+        assert lambda_handler(s3_event, None) == 200
+        assert mock_get_logs.call_count == 1
+        assert "CloudTrail/us-east-1" in mock_get_logs.call_args[0][0]["s3"]["object"]["key"]
@@ -0,0 +1,101 @@
+from unittest.mock import patch
+
+import pytest
+import rate_policy
+from rate_policy import RateLimiter
+from slack_helpers import message_for_suppressed_events_summary
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+RULE = 'event.get("errorCode", "").startswith(("AccessDenied"))'
+
+
+def make_event(arn="arn:aws:iam::123456789012:role/workload"):
+    return {
+        "eventName": "GetObject",
+        "eventTime": "2026-01-24T00:00:00Z",
+        "errorCode": "AccessDenied",
+        "userIdentity": {"arn": arn, "accountId": "123456789012"},
+    }
+
+
+def test_token_bucket_per_rule_and_principal(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_policy.time, "monotonic", lambda: now[0])
+    rate_limiter = RateLimiter([{"rule": RULE, "type": "token_bucket", "burst": 3, "rate_per_minute": 1}], summary_interval=300)
+
+    assert [rate_limiter.allow(RULE, make_event()) for _ in range(5)] == [True, True, True, False, False]
+    # Other principals and rules without policy are not affected
+    assert rate_limiter.allow(RULE, make_event(arn="arn:aws:iam::123456789012:user/someone"))
+    assert all(rate_limiter.allow("other rule", make_event()) for _ in range(10))
+    now[0] += 60
+    assert rate_limiter.allow(RULE, make_event())
+    assert not rate_limiter.allow(RULE, make_event())
+
+    assert rate_limiter.pop_summary() is None
+    now[0] += 300
+    assert rate_limiter.pop_summary() == {(RULE, "arn:aws:iam::123456789012:role/workload"): 3}
+    assert rate_limiter.pop_summary(force=True) is None
+
+
+def test_first_n_then_every_mth_for_all_rules():
+    rate_limiter = RateLimiter([{"type": "sample", "first": 2, "every": 3}], summary_interval=0)
+    allowed = [index for index in range(1, 12) if rate_limiter.allow(RULE, make_event())]
+    assert allowed == [1, 2, 5, 8, 11]
+    # Default policy keeps separate counters for each rule
+    assert rate_limiter.allow("other rule", make_event())
+    suppressed = rate_limiter.pop_summary()
+    assert suppressed == {(RULE, "arn:aws:iam::123456789012:role/workload"): 6}
+    assert "6 events were suppressed" in message_for_suppressed_events_summary(suppressed)["blocks"][0]["text"]["text"]
+
+
+def test_unknown_policy_type():
+    with pytest.raises(ValueError, match="leaky_bucket"):
+        RateLimiter([{"type": "leaky_bucket"}], summary_interval=300)
+
+
+def test_suppressed_events_are_not_formatted_and_are_summarized():
+    from main import handle_event, post_suppressed_events_summary
+
+    rules = ['event["eventName"] == "GetObject"']
+    with (
+        patch("main.rate_limiter", RateLimiter([{"type": "sample", "first": 1, "every": 0}], summary_interval=0)),
+        patch("main.deliver_event") as mock_deliver_event,
+        patch("main.post_message") as mock_post_message,
+    ):
+        assert handle_event(make_event(), "file", rules, [])
+        assert not handle_event(make_event(), "file", rules, [])
+        assert not handle_event(make_event(), "file", rules, [])
+        assert mock_deliver_event.call_count == 1
+        post_suppressed_events_summary()
+    assert "2 events were suppressed" in mock_post_message.call_args.kwargs["message"]["blocks"][0]["text"]["text"]
+
+
+@pytest.mark.parametrize("incoming_event", [{"cloudTrailToSlackBackfill": {"bucket": "bucket", "prefix": "AWSLogs/"}}, {"Records": []}])
+def test_summary_is_posted_after_every_handler(incoming_event):
+    import main
+
+    rate_limiter = RateLimiter([{"type": "sample", "first": 0, "every": 0}], summary_interval=0)
+    rate_limiter.allow(RULE, make_event())
+    with (
+        patch("main.rate_limiter", rate_limiter),
+        patch("main.backfill_handler", return_value={}),
+        patch("main.post_message") as mock_post_message,
+    ):
+        main.lambda_handler(incoming_event, None)
+    assert "1 events were suppressed" in mock_post_message.call_args.kwargs["message"]["blocks"][0]["text"]["text"]
+
+
+def test_counts_of_failed_summary_are_posted_with_the_next_one():
+    from main import post_suppressed_events_summary
+
+    rate_limiter = RateLimiter([{"type": "sample", "first": 0, "every": 0}], summary_interval=0)
+    rate_limiter.allow(RULE, make_event())
+    with (
+        patch("main.rate_limiter", rate_limiter),
+        patch("main.post_message", side_effect=[RuntimeError("Slack is down"), None]) as mock_post_message,
+    ):
+        post_suppressed_events_summary()
+        rate_limiter.allow(RULE, make_event())
+        post_suppressed_events_summary()
+    assert "2 events were suppressed" in mock_post_message.call_args.kwargs["message"]["blocks"][0]["text"]["text"]
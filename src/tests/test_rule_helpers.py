@@ -0,0 +1,174 @@
+import json
+from unittest.mock import patch
+
+import pytest
+import rule_helpers
+from rule_helpers import (
+    AhoCorasick,
+    NetworkTrie,
+    PrefixTrie,
+    contains_any,
+    glob,
+    ip_in,
+    load_ip_networks,
+    precompile_rule_helpers,
+    regex,
+    starts_with_any,
+)
+from tests.fakes import FakeS3Client
+from verdict_cache import get_referenced_fields
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+with open("tests/test_events.json") as f:
+    data = json.load(f)
+
+
+def test_prefix_trie():
+    trie = PrefixTrie(["Get", "List", "Describe", "GetBucket"])
+    assert trie.match("GetObject")
+    assert trie.match("List")
+    assert trie.match("DescribeInstances")
+    assert not trie.match("Ge")
+    assert not trie.match("PutObject")
+    assert not trie.match("")
+    assert PrefixTrie([""]).match("anything")
+    assert not PrefixTrie([]).match("anything")
+
+
+@pytest.mark.parametrize("substrings", [
+    ["he", "she", "his", "hers"],
+    ["abcd", "bc"],
+    ["aab", "ab"],
+    ["root", "admin", "break-glass"],
+])
+def test_aho_corasick_matches_like_in(substrings):
+    automaton = AhoCorasick(substrings)
+    for value in ["ushers", "ahis", "abce", "xbcx", "aaab", "aac", "role/break-glass-1", "role/reader", "", "h"]:
+        assert automaton.search(value) == any(substring in value for substring in substrings), value
+
+
+def test_helpers():
+    arn = "arn:aws:sts::123456789012:assumed-role/admin-sso/jane"
+    assert glob(arn, "arn:aws:sts::*:assumed-role/admin-*")
+    assert glob(arn, ("arn:aws:iam::*:role/ci-*", "arn:aws:sts::*:assumed-role/admin-*/*"))
+    assert not glob(arn, "assumed-role/admin-*")
+    assert not glob(arn.upper(), "arn:aws:sts::*:assumed-role/admin-*")
+    assert regex(arn, r"assumed-role/admin-\w+/")
+    assert not regex(arn, (r"^arn:aws:iam::", r"/ci-"))
+    assert starts_with_any("DeleteTrail", ("Stop", "Delete"))
+    assert not starts_with_any("GetTrail", ("Stop", "Delete"))
+    assert contains_any(arn, ("break-glass", "admin"))
+    assert not contains_any(arn, "break-glass")
+    for helper in (glob, regex, starts_with_any, contains_any):
+        assert helper(None, "x") is False
+        assert helper(["x"], "x") is False
+    assert ip_in(None, "10.0.0.0/8") is False
+
+
+def test_network_trie_matches_like_ipaddress():
+    import ipaddress
+    import random
+
+    rng = random.Random(1)
+    networks = [f"10.{rng.randrange(256)}.{rng.randrange(256)}.0/{rng.choice([16, 20, 24, 28])}" for _ in range(500)]
+    networks += ["192.0.2.1", "2001:db8:1::/48", "2001:db8:2::/64"]
+    trie = NetworkTrie(networks)
+    parsed = [ipaddress.ip_network(network, strict=False) for network in networks]
+    addresses = [f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}" for _ in range(2000)]
+    addresses += ["192.0.2.1", "192.0.2.2", "2001:db8:1:ffff::1", "2001:db8:2:0:1::1", "2001:db8:2:1::1", "::ffff:192.0.2.1"]
+    for address in addresses:
+        ip = ipaddress.ip_address(address)
+        ip = getattr(ip, "ipv4_mapped", None) or ip
+        assert trie.match(address) == any(ip in network for network in parsed), address
+    assert trie.size == len(networks)
+
+
+def test_network_trie_ignores_values_that_are_not_addresses():
+    trie = NetworkTrie(["0.0.0.0/0", "::/0"])
+    assert trie.match("198.51.100.1")
+    assert trie.match("2001:db8::1")
+    for value in ["AWS Internal", "s3.amazonaws.com", "", "10.0.0.0/8"]:
+        assert not trie.match(value)
+    with pytest.raises(ValueError):
+        NetworkTrie(["10.0.0.300/8"])
+
+
+def test_ip_in_network_lists(tmp_path):
+    s3_client = FakeS3Client()
+    s3_client.put_object(Bucket="config", Key="vpc.txt", Body=b"# NAT gateways\n198.51.100.7\n\n198.51.100.64/26  # second AZ\n")
+    corporate = tmp_path / "corporate.txt"
+    corporate.write_text("203.0.113.0/24\n2001:db8::/32\n")
+    load_ip_networks(
+        {"office": ["192.0.2.0/24"], "corporate": ["100.64.0.0/10"], "broken": ["x"]},
+        {"corporate": str(corporate), "vpc": "s3://config/vpc.txt", "missing": str(tmp_path / "missing.txt")},
+        s3_client,
+    )
+    try:
+        assert ip_in("192.0.2.10", "office")
+        assert ip_in("203.0.113.5", "corporate")
+        assert ip_in("100.64.1.1", "corporate")
+        assert ip_in("2001:db8::5", "corporate")
+        assert ip_in("198.51.100.7", "vpc")
+        assert ip_in("198.51.100.100", "vpc")
+        assert not ip_in("198.51.100.8", "vpc")
+        # Lists that failed to load are not silently empty
+        for name in ("broken", "missing"):
+            with pytest.raises(ValueError):
+                ip_in("192.0.2.10", name)
+        # Networks can also be given in the rule
+        assert ip_in("192.0.2.10", ("198.51.100.0/24", "192.0.2.0/28"))
+        assert not ip_in("192.0.2.10", "198.51.100.0/24")
+    finally:
+        load_ip_networks({}, {}, None)
+
+
+def test_patterns_are_compiled_once():
+    patterns = tuple(f"prefix-{i}-" for i in range(1000))
+    with patch.object(rule_helpers, "PrefixTrie", wraps=PrefixTrie) as build:
+        assert starts_with_any("prefix-999-x", patterns)
+        assert not starts_with_any("prefix-x", patterns)
+        # Equal patterns from another object, e.g. a list rebuilt by every evaluation of a rule
+        assert starts_with_any("prefix-1-x", list(patterns))
+    assert build.call_count == 1
+
+
+def test_caches_are_bounded():
+    with patch.object(rule_helpers, "MAX_MATCHERS", 10):
+        for i in range(50):
+            assert regex(f"value-{i}", f"value-{i}$")
+        assert len(rule_helpers._matchers) <= 10
+        assert len(rule_helpers._matchers_by_id) <= 10
+
+
+def test_precompile_rule_helpers():
+    rule = "glob(event.get('userIdentity.arn'), ('arn:aws:iam::*:role/precompiled-*', 'x')) or contains_any(event['eventName'], ['Precompiled'])"
+    code = compile(rule, "<rule>", "eval")
+    precompile_rule_helpers(code, rule)
+    with patch.object(rule_helpers, "_compile_glob") as compile_glob, patch.object(rule_helpers, "AhoCorasick") as build:
+        assert eval(code, rule_helpers.RULE_GLOBALS, {"event": {"userIdentity.arn": "arn:aws:iam::1:role/precompiled-a", "eventName": "x"}})  # noqa: PGH001
+        assert eval(code, rule_helpers.RULE_GLOBALS, {"event": {"eventName": "PrecompiledEvent"}})  # noqa: PGH001
+    compile_glob.assert_not_called()
+    build.assert_not_called()
+
+
+def test_precompile_reports_invalid_patterns():
+    rule = "regex(event['eventName'], '(') or regex(event['eventName'], event['pattern'])"
+    with patch.object(rule_helpers.logger, "warning") as warning:
+        precompile_rule_helpers(compile(rule, "<rule>", "eval"), rule)
+    assert warning.call_count == 1
+
+
+def test_rules_with_helpers():
+    from main import evaluate_rules
+
+    event = next(test_case["event"] for test_case in data["test_events"] if test_case["event"].get("eventName") == "ConsoleLogin")
+    rules = ["starts_with_any(event['eventName'], ('Console', 'Switch')) and glob(event.get('userIdentity.arn'), '*:root')"]
+    expected = event["userIdentity"].get("arn", "").endswith(":root")
+    assert evaluate_rules(event, rules, []).should_be_processed is expected
+    assert evaluate_rules(event, ["regex(event['eventName'], '^Console')"], ["contains_any(event['eventName'], 'Login')"]).is_ignored
+
+
+def test_rules_with_helpers_are_cacheable():
+    assert get_referenced_fields("glob(event.get('userIdentity.arn'), 'arn:*') and regex(event['eventName'], 'x')") == {"userIdentity.arn", "eventName"}
+    assert get_referenced_fields("ip_in(event.get('sourceIPAddress'), 'corporate')") == {"sourceIPAddress"}
@@ -0,0 +1,100 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from rules import default_rules
+from rule_pool import RuleEvaluationPool, get_rule_evaluation_processes
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+with open("tests/test_events.json") as f:
+    data = json.load(f)
+
+
+def match_even_events(event, rules, ignore_rules):  # noqa: ARG001
+    return rules[0] if int(event["eventID"]) % 2 == 0 else None
+
+
+@pytest.fixture()
+def pool():
+    pool = RuleEvaluationPool(3, match_even_events)
+    yield pool
+    pool.close()
+
+
+def test_shards_are_evaluated_by_workers_and_merged(pool):
+    events = [{"eventID": str(i)} for i in range(20)]
+    # Workers are forked on first use
+    assert pool._workers == []
+    pool.submit(events, 5, ["rule"], [])
+    assert pool.collect() == dict.fromkeys(range(6, 20, 2), "rule")
+
+    # Workers are kept for the next log file
+    processes = [process.pid for process, _ in pool._workers]
+    pool.submit(events, 0, ["other rule"], [])
+    assert pool.collect() == dict.fromkeys(range(0, 20, 2), "other rule")
+    assert [process.pid for process, _ in pool._workers] == processes
+
+    # Fewer events than workers
+    pool.submit(events[:2], 0, ["rule"], [])
+    assert pool.collect() == {0: "rule"}
+
+
+def test_workers_receive_only_their_shard(pool):
+    events = [{"eventID": str(i)} for i in range(30)]
+    assert pool.start()
+    with patch("rule_pool.json_codec.dumps_bytes", side_effect=lambda obj: json.dumps(obj).encode()) as mock_dumps:
+        pool.submit(events, 3, ["rule"], [])
+    assert [call.args[0] for call in mock_dumps.call_args_list] == [events[3:12], events[12:21], events[21:30]]
+    assert pool.collect() == dict.fromkeys(range(4, 30, 2), "rule")
+
+
+def test_failed_workers_are_restarted(pool):
+    pool.submit([{"eventID": "not a number"}], 0, ["rule"], [])
+    with pytest.raises(RuntimeError):
+        pool.collect()
+    assert pool._workers == []
+
+    pool.submit([{"eventID": "2"}], 0, ["rule"], [])
+    assert pool.collect() == {0: "rule"}
+
+
+def test_workers_are_not_forked_while_other_threads_run(pool):
+    with patch("rule_pool.threading.active_count", return_value=2):
+        assert not pool.start()
+        with pytest.raises(RuntimeError):
+            pool.submit([{"eventID": "2"}], 0, ["rule"], [])
+    assert pool._workers == []
+    assert pool.start()
+
+
+def test_falls_back_to_handler_process_on_single_vcpu():
+    with patch("rule_pool.get_available_cpu_count", return_value=1):
+        assert get_rule_evaluation_processes(4) == 0
+    with patch("rule_pool.get_available_cpu_count", return_value=2):
+        assert get_rule_evaluation_processes(4) == 2
+        assert get_rule_evaluation_processes(0) == 0
+
+
+def test_log_file_is_evaluated_in_pool():
+    from main import RuleEvaluationPool, cfg, evaluate_event_in_worker, handle_created_object_record
+
+    events = [*[test_event["event"] for test_event in data["test_events"]], {"eventName": "GetObject", "eventSource": "s3.amazonaws.com"}] * 200
+    content = json.dumps({"Records": events}).encode()
+    pool = RuleEvaluationPool(2, evaluate_event_in_worker)
+    try:
+        with (
+            patch.object(cfg, "rules", default_rules),
+            patch("main.rule_evaluation_pool", pool),
+            patch("main.get_cloudtrail_log_content", return_value=("key", content)),
+            patch("main.handle_event", return_value=False) as mock_handle_event,
+        ):
+            handle_created_object_record({"s3": {}}, cfg)
+            # Only events that match or need AccessDenied metrics are handled, with the same result as in process
+            expected = [(event, result) for event in events if (result := evaluate_event_in_worker(event, default_rules, [])) is not None]
+    finally:
+        pool.close()
+
+    handled = [(call.kwargs["event"], call.kwargs["result"]) for call in mock_handle_event.call_args_list]
+    assert 0 < len(handled) < len(events)
+    assert handled == expected
@@ -0,0 +1,128 @@
+import json
+from unittest.mock import patch
+
+import pytest
+import warm_start
+from rule_source import RuleSet, RuleSource, parse_rule_set
+from tests.fakes import FakeS3Client
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+
+class FakeSSMClient:
+    def __init__(self, value) -> None:
+        self.value = value
+        self.version = 1
+
+    def get_parameter(self, Name, WithDecryption):
+        assert Name == "/cloudtrail-to-slack/rules"
+        assert WithDecryption
+        return {"Parameter": {"Name": Name, "Value": self.value, "Version": self.version}}
+
+
+def rules_json(rules, ignore_rules=()):
+    return json.dumps({"rules": list(rules), "ignore_rules": list(ignore_rules)})
+
+
+def put_rules(s3_client, content):
+    s3_client.put_object(Bucket="config", Key="rules.json", Body=content.encode())
+
+
+def make_s3_client(content):
+    s3_client = FakeS3Client()
+    put_rules(s3_client, content)
+    return s3_client
+
+
+def test_parse_rule_set():
+    assert parse_rule_set(rules_json(["a", " "], ["b"])) == RuleSet(["a"], ["b"])
+    assert parse_rule_set('{"rules": ["a"]}') == RuleSet(["a"], [])
+    for content in ['["a"]', '{"rules": "a"}', '{"ignore_rules": [1]}', "not json"]:
+        with pytest.raises(ValueError):
+            parse_rule_set(content)
+
+
+def test_invalid_location():
+    with pytest.raises(ValueError):
+        RuleSource("arn:aws:s3:::bucket/key", 60, None, None)
+
+
+def test_s3_rules_are_revalidated_with_etag():
+    s3_client = make_s3_client(rules_json(["event['eventName'] == 'A'"]))
+    source = RuleSource("s3://config/rules.json", 60, s3_client, None)
+
+    assert source.refresh() == RuleSet(["event['eventName'] == 'A'"], [])
+    assert source.version == '"1"'
+    # Not checked again within the refresh interval
+    assert source.refresh() is None
+    assert s3_client.get_object_calls == 1
+    # Unchanged object is not downloaded again
+    assert source.refresh(force=True) is None
+    assert s3_client.calls[-1] == ("get_object", '"1"')
+
+    put_rules(s3_client, rules_json(["event['eventName'] == 'B'"], ["event['eventName'] == 'C'"]))
+    assert source.refresh(force=True) == RuleSet(["event['eventName'] == 'B'"], ["event['eventName'] == 'C'"])
+    assert source.version == '"2"'
+
+
+def test_refresh_interval():
+    s3_client = make_s3_client(rules_json(["a"]))
+    source = RuleSource("s3://config/rules.json", 60, s3_client, None)
+    with patch("rule_source.time.monotonic", return_value=1000.0):
+        assert source.refresh() is not None
+    put_rules(s3_client, rules_json(["b"]))
+    with patch("rule_source.time.monotonic", return_value=1059.0):
+        assert source.refresh() is None
+    with patch("rule_source.time.monotonic", return_value=1060.0):
+        assert source.refresh() == RuleSet(["b"], [])
+
+
+def test_rules_in_use_are_kept_when_source_fails():
+    s3_client = make_s3_client(rules_json(["a"]))
+    source = RuleSource("s3://config/rules.json", 0, s3_client, None)
+    assert source.refresh() is not None
+    put_rules(s3_client, "{broken")
+    assert source.refresh() is None
+    del s3_client.objects[("config", "rules.json")]
+    assert source.refresh() is None
+    # Version of the rules in use, so the next valid object is loaded
+    assert source.version == '"1"'
+    put_rules(s3_client, rules_json(["b"]))
+    assert source.refresh() == RuleSet(["b"], [])
+
+
+def test_ssm_rules_are_compared_by_version():
+    ssm_client = FakeSSMClient(rules_json(["a"]))
+    source = RuleSource("ssm:/cloudtrail-to-slack/rules", 0, None, ssm_client)
+    assert source.refresh() == RuleSet(["a"], [])
+    assert source.refresh() is None
+    ssm_client.value = rules_json(["b"])
+    ssm_client.version = 2
+    assert source.refresh() == RuleSet(["b"], [])
+    assert source.version == "2"
+
+
+def test_rules_are_swapped_after_they_are_compiled():
+    import main
+
+    s3_client = make_s3_client(rules_json(["event['eventName'] == 'Reloaded'"], ["event['eventName'] == 'Ignored'"]))
+    source = RuleSource("s3://config/rules.json", 0, s3_client, None)
+    with patch.object(main, "rule_source", source), \
+            patch.object(main.cfg, "rules", main.configured_rules), \
+            patch.object(main.cfg, "ignore_rules", main.configured_ignore_rules), \
+            patch.dict(warm_start.compiled_rules):  # fmt: skip
+        main.refresh_rules()
+        assert main.cfg.rules == main.configured_rules + ["event['eventName'] == 'Reloaded'"]
+        assert main.cfg.ignore_rules == main.configured_ignore_rules + ["event['eventName'] == 'Ignored'"]
+        assert "event['eventName'] == 'Reloaded'" in warm_start.compiled_rules
+        assert main.should_message_be_processed({"eventName": "Reloaded"}, main.cfg.rules, main.cfg.ignore_rules).should_be_processed
+
+        rules = main.cfg.rules
+        main.refresh_rules()
+        assert main.cfg.rules is rules
+
+        put_rules(s3_client, rules_json(["event['eventName'] == 'Replaced'"]))
+        main.refresh_rules()
+        assert main.cfg.rules == main.configured_rules + ["event['eventName'] == 'Replaced'"]
+        assert main.cfg.ignore_rules == main.configured_ignore_rules
+        assert "event['eventName'] == 'Reloaded'" not in warm_start.compiled_rules
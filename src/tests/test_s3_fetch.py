@@ -0,0 +1,58 @@
+import gzip
+import json
+import os
+
+from config import Config
+from s3_fetch import get_s3_object_body, split_into_ranges
+from tests.fakes import FakeS3Client
+
+# ruff: noqa: ANN201, ANN001, ANN204, ANN101, E501, PLR2004
+
+
+def make_s3_client(content):
+    client = FakeS3Client()
+    client.put_object(Bucket="bucket", Key="key", Body=content)
+    return client
+
+
+def make_cfg(monkeypatch, threshold: int, part_size: int, concurrency: int = 4) -> Config:
+    monkeypatch.setenv("S3_RANGED_GET_THRESHOLD", str(threshold))
+    monkeypatch.setenv("S3_RANGED_GET_PART_SIZE", str(part_size))
+    monkeypatch.setenv("S3_RANGED_GET_CONCURRENCY", str(concurrency))
+    return Config()
+
+
+def make_log_file(events_count: int) -> bytes:
+    records = [{"eventID": str(i), "eventName": "GetObject", "payload": os.urandom(64).hex()} for i in range(events_count)]
+    return gzip.compress(json.dumps({"Records": records}).encode())
+
+
+def test_split_into_ranges():
+    assert split_into_ranges(10, 4) == [(0, 3), (4, 7), (8, 9)]
+    assert split_into_ranges(8, 4) == [(0, 3), (4, 7)]
+    assert split_into_ranges(0, 4) == []
+
+
+def test_small_object_uses_single_get(monkeypatch):
+    content = make_log_file(10)
+    client = make_s3_client(content)
+    cfg = make_cfg(monkeypatch, threshold=len(content) + 1, part_size=128)
+
+    with get_s3_object_body(client, "bucket", "key", cfg, size=len(content)) as body:
+        assert body.read() == content
+    assert client.calls == [("get_object", None)]
+
+
+def test_large_object_is_reassembled_from_ranges(monkeypatch):
+    content = make_log_file(500)
+    client = make_s3_client(content)
+    cfg = make_cfg(monkeypatch, threshold=1024, part_size=1000)
+
+    with get_s3_object_body(client, "bucket", "key", cfg) as body, gzip.GzipFile(fileobj=body) as gzipfile:
+        records = json.loads(gzipfile.read())["Records"]
+
+    assert [r["eventID"] for r in records] == [str(i) for i in range(500)]
+    assert client.calls[0] == ("head_object", None)
+    ranges = sorted(call[1] for call in client.calls[1:])
+    assert len(ranges) == len(split_into_ranges(len(content), 1000))
+    assert all(r is not None for r in ranges)
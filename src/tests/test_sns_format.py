@@ -199,3 +199,32 @@ def test_sns_digest_files_are_skipped():
         # Should NOT call get_cloudtrail_log_records for digest files
         assert not mock_get_logs.called
         assert result == 200
+
+
+def test_sns_batch_publisher_groups_messages_per_topic():
+    from sns import SnsBatchPublisher
+
+    class FakeSnsClient:
+        def __init__(self) -> None:
+            self.batches = []
+            self.published = []
+
+        def publish_batch(self, TopicArn, PublishBatchRequestEntries) -> dict:  # noqa: N803
+            self.batches.append((TopicArn, [entry["Message"] for entry in PublishBatchRequestEntries]))
+            # Fail the first entry of every batch to check that it is retried individually
+            return {"Successful": [], "Failed": [{"Id": "0", "Code": "InternalError", "SenderFault": False}]}
+
+        def publish(self, TopicArn, Message) -> None:  # noqa: N803
+            self.published.append((TopicArn, Message))
+
+    client = FakeSnsClient()
+    publisher = SnsBatchPublisher(client)
+    for index in range(12):
+        publisher.publish(TopicArn="topic-a", Message=f"a{index}")
+    publisher.publish(TopicArn="topic-b", Message="b0")
+    assert len(publisher) == 3
+
+    publisher.flush()
+    assert len(publisher) == 0
+    assert [(topic, len(messages)) for topic, messages in client.batches] == [("topic-a", 10), ("topic-a", 2), ("topic-b", 1)]
+    assert client.published == [("topic-a", "a0"), ("topic-a", "a10"), ("topic-b", "b0")]
@@ -0,0 +1,100 @@
+import json
+from unittest.mock import patch
+
+from sqs import SQS_MAX_BATCH_SIZE_BYTES, SqsBatchSender
+
+# ruff: noqa: ANN201, ANN001, ANN204, ANN101, E501, PLR2004
+
+
+class FakeSqsClient:
+    """In-memory stand-in for SQS, fails entries with ids listed in fail_ids on the first attempt."""
+
+    def __init__(self, fail_ids=()):
+        self.messages = []
+        self.batch_calls = 0
+        self.fail_ids = set(fail_ids)
+
+    def send_message_batch(self, QueueUrl, Entries):  # noqa: N803, ARG002
+        assert len(Entries) <= 10
+        assert sum(len(e["MessageBody"].encode()) for e in Entries) <= SQS_MAX_BATCH_SIZE_BYTES
+        self.batch_calls += 1
+        failed = []
+        for entry in Entries:
+            if entry["Id"] in self.fail_ids:
+                failed.append({"Id": entry["Id"], "Code": "InternalError", "SenderFault": False})
+            else:
+                self.messages.append(entry["MessageBody"])
+        self.fail_ids = set()
+        return {"Successful": [], "Failed": failed}
+
+    def send_message(self, QueueUrl, MessageBody):  # noqa: N803, ARG002
+        self.messages.append(MessageBody)
+
+    def receive(self):
+        messages, self.messages = self.messages, []
+        return {"Records": [{"messageId": str(index), "body": body} for index, body in enumerate(messages)]}
+
+
+def test_sqs_batch_sender_batches_and_retries_failed_entries():
+    client = FakeSqsClient(fail_ids={"3"})
+    sender = SqsBatchSender("queue", client)
+    for index in range(25):
+        assert sender.add(str(index))
+    assert len(sender) == 5
+    sender.flush()
+
+    assert client.batch_calls == 3
+    assert sorted(client.messages, key=int) == [str(i) for i in range(25)]
+
+
+def test_sqs_batch_sender_respects_batch_size():
+    client = FakeSqsClient()
+    sender = SqsBatchSender("queue", client)
+    assert not sender.add("x" * (SQS_MAX_BATCH_SIZE_BYTES + 1))
+    for _ in range(3):
+        assert sender.add("x" * (SQS_MAX_BATCH_SIZE_BYTES // 2))
+    sender.flush()
+    assert client.batch_calls == 2
+
+
+def test_matched_events_are_enqueued_and_delivered_by_delivery_handler():
+    from main import cfg, delivery_handler, handle_created_object_record
+
+    client = FakeSqsClient()
+    events = [
+        {"eventID": str(i), "eventName": "ConsoleLogin", "eventSource": "signin.amazonaws.com", "eventTime": "2026-01-24T00:00:00Z", "additionalEventData": {"MFAUsed": "Yes"}, "userIdentity": {"accountId": "123456789012"}}
+        for i in range(12)
+    ]
+    log_record = {"key": "AWSLogs/file.json.gz", "events": events}
+    record = {"s3": {"bucket": {"name": "bucket"}, "object": {"key": "AWSLogs/file.json.gz"}}}
+
+    with (
+        patch("main.delivery_queue", SqsBatchSender("queue", client)),
+        patch("main.get_cloudtrail_log_records", return_value=log_record),
+        patch("main.should_message_be_processed") as mock_should_be_processed,
+        patch("main.deliver_event") as mock_deliver_event,
+    ):
+        mock_should_be_processed.return_value.should_be_processed = True
+        mock_should_be_processed.return_value.errors = []
+        handle_created_object_record(record, cfg)
+        assert not mock_deliver_event.called
+
+    assert client.batch_calls == 2
+    sqs_event = client.receive()
+    assert len(sqs_event["Records"]) == 12
+    # Messages are rendered before they are enqueued, the delivery lambda doesn't see the raw events
+    deliveries = [json.loads(record["body"]) for record in sqs_event["Records"]]
+    assert all("event" not in delivery and delivery["account_id"] == "123456789012" for delivery in deliveries)
+    assert "Id: 5" in json.dumps(deliveries[5]["slack_message"])
+
+    def fail_on_event_5(delivery) -> None:
+        if "Id: 5" in json.dumps(delivery["slack_message"]):
+            raise RuntimeError("Slack is down")
+
+    with patch("main.deliver_rendered_event", side_effect=fail_on_event_5) as mock_deliver_rendered_event:
+        response = delivery_handler(sqs_event, None)
+
+    assert mock_deliver_rendered_event.call_count == 12
+    failed_ids = [failure["itemIdentifier"] for failure in response["batchItemFailures"]]
+    assert failed_ids == ["5"]
+
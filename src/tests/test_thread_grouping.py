@@ -0,0 +1,66 @@
+from unittest.mock import patch
+
+import pytest
+from dynamodb import ThreadGroupingKey, hash_user_identity_and_event_name
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+
+def make_event(principal_id="AIDA1", region="eu-central-1", event_name="StopLogging"):
+    return {
+        "eventName": event_name,
+        "eventTime": "2026-01-24T00:00:00Z",
+        "awsRegion": region,
+        "userIdentity": {
+            "type": "IAMUser",
+            "principalId": principal_id,
+            "arn": "arn:aws:iam::123456789012:user/someone",
+            "accountId": "123456789012",
+        },
+    }
+
+
+def test_hash_is_memoized_per_identity_in_bounded_cache():
+    thread_grouping_key = ThreadGroupingKey(cache_size=2)
+    with patch("dynamodb.hashlib.sha256", wraps=__import__("hashlib").sha256) as mock_sha256:
+        first = thread_grouping_key.hash(make_event())
+        assert thread_grouping_key.hash(make_event()) == first
+        assert mock_sha256.call_count == 1
+        thread_grouping_key.hash(make_event(event_name="DeleteTrail"))
+        thread_grouping_key.hash(make_event(event_name="UpdateTrail"))
+        assert len(thread_grouping_key._cache) == 2
+        assert thread_grouping_key.hash(make_event()) == first
+        assert mock_sha256.call_count == 4
+
+
+def test_key_strategy_controls_grouping_granularity():
+    default_key = ThreadGroupingKey()
+    by_region = ThreadGroupingKey(["type", "principalId", "arn", "accountId", "awsRegion"])
+    without_principal_id = ThreadGroupingKey(["type", "arn", "accountId"])
+
+    assert default_key.hash(make_event(region="us-east-1")) == default_key.hash(make_event())
+    assert by_region.hash(make_event(region="us-east-1")) != by_region.hash(make_event())
+    # Sessions of the same role have different principalId
+    assert default_key.hash(make_event(principal_id="AROA:a")) != default_key.hash(make_event(principal_id="AROA:b"))
+    assert without_principal_id.hash(make_event(principal_id="AROA:a")) == without_principal_id.hash(make_event(principal_id="AROA:b"))
+    assert default_key.hash(make_event()) == hash_user_identity_and_event_name(make_event())
+
+
+def test_not_enough_identity_to_hash():
+    event = make_event()
+    event["userIdentity"] = {"type": "AWSService"}
+    assert ThreadGroupingKey().hash(event) is None
+    assert ThreadGroupingKey().hash({"eventName": "x", "eventTime": "t"}) is None
+
+
+def test_unknown_grouping_field():
+    with pytest.raises(ValueError, match="sourceIPAddress"):
+        ThreadGroupingKey(["arn", "sourceIPAddress"])
+
+
+def test_identity_hash_is_unchanged():
+    import hashlib
+
+    event = make_event()
+    combined = "".join(event["userIdentity"][key] for key in ("type", "principalId", "arn", "accountId")) + event["eventName"]
+    assert hash_user_identity_and_event_name(event) == hashlib.sha256(combined.encode()).hexdigest()
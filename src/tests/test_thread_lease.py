@@ -0,0 +1,63 @@
+import threading
+import time
+from unittest.mock import patch
+
+from config import Config
+from dynamodb import RecentThreads, acquire_thread, put_event_to_dynamodb, release_thread_lease
+from tests.fakes import FakeDynamoDBClient
+
+# ruff: noqa: ANN201, ANN001, ANN204, ANN101, E501, PLR2004
+
+
+def make_dynamodb_client(cfg):
+    return FakeDynamoDBClient({cfg.dynamodb_table_name: "principal_structure_and_action_hash"})
+
+
+def test_only_one_environment_creates_thread_under_concurrency():
+    cfg = Config()
+    dynamodb_client = make_dynamodb_client(cfg)
+    posted_threads = []
+    results = []
+    barrier = threading.Barrier(8)
+
+    def environment(index) -> None:
+        barrier.wait()
+        thread_ts, owns_lease = acquire_thread(cfg, "hash", dynamodb_client, RecentThreads())
+        if owns_lease:
+            time.sleep(0.1)  # Slack call
+            posted_threads.append(f"ts-{index}")
+            put_event_to_dynamodb("hash", f"ts-{index}", dynamodb_client, cfg)
+            thread_ts = f"ts-{index}"
+        results.append(thread_ts)
+
+    threads = [threading.Thread(target=environment, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(posted_threads) == 1
+    assert results == posted_threads * 8
+
+
+def test_waiters_give_up_when_lease_is_released():
+    cfg = Config()
+    dynamodb_client = make_dynamodb_client(cfg)
+    assert acquire_thread(cfg, "hash", dynamodb_client) == (None, True)
+
+    threading.Timer(0.1, release_thread_lease, args=("hash", dynamodb_client, cfg)).start()
+    start = time.monotonic()
+    assert acquire_thread(cfg, "hash", dynamodb_client) == (None, False)
+    assert time.monotonic() - start < cfg.thread_lease_wait_ms / 1000
+    # Lease is free again
+    assert acquire_thread(cfg, "hash", dynamodb_client) == (None, True)
+
+
+def test_expired_lease_is_taken_over(monkeypatch):
+    monkeypatch.setenv("THREAD_LEASE_WAIT_MS", "0")
+    cfg = Config()
+    dynamodb_client = make_dynamodb_client(cfg)
+    assert acquire_thread(cfg, "hash", dynamodb_client).owns_lease
+    assert not acquire_thread(cfg, "hash", dynamodb_client).owns_lease
+    with patch("dynamodb.time.time", return_value=time.time() + cfg.thread_lease_seconds + 1):
+        assert acquire_thread(cfg, "hash", dynamodb_client).owns_lease
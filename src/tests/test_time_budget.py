@@ -0,0 +1,74 @@
+import json
+from unittest.mock import MagicMock, patch
+
+from time_budget import CONTINUATION_KEY, TimeBudget
+
+# ruff: noqa: ANN201, ANN001, ANN204, ANN101, E501, PLR2004
+
+
+class FakeContext:
+    """Lambda context where every check of remaining time consumes `step_ms`."""
+
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:fivexl-cloudtrail-to-slack"
+
+    def __init__(self, remaining_ms, step_ms):
+        self.remaining_ms = remaining_ms
+        self.step_ms = step_ms
+
+    def get_remaining_time_in_millis(self):
+        self.remaining_ms -= self.step_ms
+        return self.remaining_ms
+
+
+def make_record(name):
+    return {
+        "eventName": "ObjectCreated:Put",
+        "s3": {"bucket": {"name": "bucket"}, "object": {"key": f"AWSLogs/123456789012/CloudTrail/us-east-1/2026/01/24/{name}.json.gz"}},
+    }
+
+
+def test_time_budget():
+    assert not TimeBudget(None, 5000).is_exhausted()
+    assert not TimeBudget(FakeContext(10000, 0), 0).is_exhausted()
+    assert not TimeBudget(FakeContext(10000, 0), 5000).is_exhausted()
+    assert TimeBudget(FakeContext(4000, 0), 5000).is_exhausted()
+
+
+def test_processing_continues_in_new_invocation_when_time_runs_out():
+    from main import lambda_handler
+
+    records = [make_record("first"), make_record("second")]
+    events = [{"eventID": str(i), "eventName": "GetObject"} for i in range(10)]
+    lambda_client = MagicMock()
+
+    def get_log_records(record) -> dict:
+        return {"key": record["s3"]["object"]["key"], "events": events}
+
+    with (
+        patch("main.lambda_client", lambda_client),
+        patch("main.get_cloudtrail_log_records", side_effect=get_log_records),
+        patch("main.handle_event", return_value=False) as mock_handle_event,
+    ):
+        # Remaining time drops below the 5000 ms safety margin after the 6th event of the first file
+        assert lambda_handler({"Records": records}, FakeContext(10000, 1000)) == 200
+        processed = [call.kwargs["event"]["eventID"] for call in mock_handle_event.call_args_list]
+        assert processed == ["0", "1", "2", "3", "4", "5"]
+
+    invoke_kwargs = lambda_client.invoke.call_args.kwargs
+    assert invoke_kwargs["InvocationType"] == "Event"
+    assert invoke_kwargs["FunctionName"] == FakeContext.invoked_function_arn
+    continuation_event = json.loads(invoke_kwargs["Payload"])
+    assert continuation_event["Records"] == records
+    assert continuation_event[CONTINUATION_KEY] == {"event_offset": 6}
+
+    with (
+        patch("main.lambda_client", lambda_client),
+        patch("main.get_cloudtrail_log_records", side_effect=get_log_records),
+        patch("main.handle_event", return_value=False) as mock_handle_event,
+    ):
+        lambda_client.reset_mock()
+        assert lambda_handler(continuation_event, FakeContext(900000, 1)) == 200
+        processed = [call.kwargs["event"]["eventID"] for call in mock_handle_event.call_args_list]
+        # Rest of the first file and the whole second file
+        assert processed == [str(i) for i in range(6, 10)] + [str(i) for i in range(10)]
+        assert not lambda_client.invoke.called
@@ -0,0 +1,92 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from rules import default_rules
+from verdict_cache import AMBIGUOUS, MISSING, RuleVerdictCache, get_referenced_fields, resolve_flattened_field
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+with open("tests/test_events.json") as f:
+    data = json.load(f)
+
+
+def test_referenced_fields_of_rules():
+    assert get_referenced_fields('"eventName" in event and event["eventName"] in ["x"]') == {"eventName"}
+    assert get_referenced_fields('event.get("errorCode", "").startswith(("AccessDenied")) and event["userIdentity.type"] == "Root"') == {"errorCode", "userIdentity.type"}
+    assert get_referenced_fields('any(event.get("eventName", "").startswith(prefix) for prefix in ["Get", "List"])') == {"eventName"}
+    assert all(get_referenced_fields(rule) is not None for rule in default_rules)
+
+
+@pytest.mark.parametrize("rule", [
+    "len(event) > 10",
+    'event.get(event["field"])',
+    '[key for key in event if key.startswith("x")]',
+    "event.keys()",
+    '__import__("random").random() > 0.5',
+    'event["eventName"].__class__',
+    '(event := {"eventName": "x"})["eventName"]',
+    'event["eventName"] ==',
+])
+def test_rules_with_unknown_fields_opt_out(rule):
+    assert get_referenced_fields(rule) is None
+
+
+def test_resolved_fields_match_flattened_event():
+    from main import flatten_json
+
+    for test_event in data["test_events"]:
+        event = test_event["event"]
+        for field, value in flatten_json(event).items():
+            assert resolve_flattened_field(event, field) == value
+
+    event = {"a": {"b": [{"c": 1}, {}], "e": {}}, "d.x": 2, "d": {"y": 3}, "f": {"g": 4}, "f.g": 5}
+    assert resolve_flattened_field(event, "a.b.0.c") == 1
+    assert resolve_flattened_field(event, "d.x") == 2
+    assert resolve_flattened_field(event, "d.y") == 3
+    assert resolve_flattened_field(event, "f.g") is AMBIGUOUS
+    for field in ["a", "a.b", "a.b.1", "a.b.01.c", "a.b.2.c", "a.e", "a.b.0.c.z", "x"]:
+        assert resolve_flattened_field(event, field) is MISSING
+        assert field not in flatten_json(event)
+
+
+def test_events_with_same_referenced_fields_share_result():
+    from main import evaluate_rules, should_message_be_processed
+
+    events = [test_event["event"] for test_event in data["test_events"]]
+    with patch("main.verdict_cache", RuleVerdictCache(100)):
+        with patch("main.evaluate_rules", wraps=evaluate_rules) as mock_evaluate:
+            results = [should_message_be_processed(event, default_rules, []) for event in events]
+            assert results == [evaluate_rules(event, default_rules, []) for event in events]
+            evaluated = mock_evaluate.call_count
+
+            for event in events:
+                assert should_message_be_processed({**event, "eventID": "other", "eventTime": "2026-01-24T00:00:00Z"}, default_rules, []) in results
+            assert mock_evaluate.call_count == evaluated
+
+            # Another rule set is evaluated again
+            should_message_be_processed(events[0], ['event["eventName"] == "ConsoleLogin"'], [])
+            assert mock_evaluate.call_count == evaluated + 1
+
+
+def test_cache_is_bounded_and_disabled_for_opted_out_rules():
+    cache = RuleVerdictCache(2)
+    for name in ["A", "B", "C"]:
+        key = cache.get_key({"eventName": name}, ['event["eventName"] == "A"'], [])
+        cache.put(key, name)
+    assert len(cache) == 2
+    assert cache.get(cache.get_key({"eventName": "A"}, ['event["eventName"] == "A"'], [])) is None
+
+    assert cache.get_key({"eventName": "A"}, ['event["eventName"] == "A"', "len(event) > 1"], []) is None
+    assert cache.get_key({"eventName": True}, ['event["eventName"] == 1'], []) != cache.get_key({"eventName": 1}, ['event["eventName"] == 1'], [])
+
+
+def test_cache_is_kept_for_equal_rule_list():
+    cache = RuleVerdictCache(10)
+    rules = ['event["eventName"] == "A"']
+    cache.put(cache.get_key({"eventName": "A"}, rules, []), "A")
+    with patch("verdict_cache.get_referenced_fields") as mock_get_referenced_fields:
+        # Rules sent to a rule evaluation worker are a copy of the same list
+        assert cache.get(cache.get_key({"eventName": "A"}, list(rules), [])) == "A"
+        assert not mock_get_referenced_fields.called
+    assert cache.get(cache.get_key({"eventName": "A"}, [*rules, 'event["eventName"] == "B"'], [])) is None
@@ -0,0 +1,81 @@
+import json
+import marshal
+import time
+import zlib
+from unittest.mock import patch
+
+import warm_start
+from config import Config
+from dynamodb import RecentThreads, ThreadGroupingKey, get_thread_ts_from_dynamodb
+from tests.fakes import FakeS3Client
+from warm_start import WarmStartExporter, capture_warm_start_state, load_snapshot, read_snapshot, restore_warm_start_state
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+EVENT = {
+    "eventName": "StopLogging",
+    "eventTime": "2026-01-24T00:00:00Z",
+    "userIdentity": {"type": "IAMUser", "arn": "arn:aws:iam::123456789012:user/someone", "accountId": "123456789012"},
+}
+
+
+def capture_state(cfg):
+    thread_grouping_key = ThreadGroupingKey()
+    recent_threads = RecentThreads()
+    hash_value = thread_grouping_key.hash(EVENT)
+    recent_threads.put(hash_value, "1700000000.000100", int(time.time()) + 900)
+    recent_threads.put("expired", "1700000000.000200", int(time.time()) - 1)
+    return capture_warm_start_state(cfg, thread_grouping_key, recent_threads), hash_value
+
+
+def test_new_environment_loads_thread_caches(tmp_path):
+    cfg = Config()
+    data, hash_value = capture_state(cfg)
+    snapshot_file = tmp_path / "snapshot.bin"
+    snapshot_file.write_bytes(data)
+
+    thread_grouping_key = ThreadGroupingKey()
+    recent_threads = RecentThreads()
+    assert restore_warm_start_state(read_snapshot(str(snapshot_file), None), cfg, thread_grouping_key, recent_threads)
+
+    assert len(thread_grouping_key.export_cache()) == 1
+    assert recent_threads.get("expired") is None
+    # Thread is found without DynamoDB lookup
+    assert get_thread_ts_from_dynamodb(cfg, hash_value, dynamodb_client=None, recent_threads=recent_threads) == "1700000000.000100"
+
+
+def test_thread_caches_are_not_loaded_for_other_grouping_configuration(monkeypatch):
+    data, hash_value = capture_state(Config())
+    monkeypatch.setenv("THREAD_GROUPING_FIELDS", "arn,awsRegion")
+    recent_threads = RecentThreads()
+    assert restore_warm_start_state(data, Config(), ThreadGroupingKey(["arn", "awsRegion"]), recent_threads)
+    assert recent_threads.get(hash_value) is None
+
+
+def test_thread_caches_of_running_environment_are_exported_to_s3():
+    cfg = Config()
+    s3_client = FakeS3Client()
+    thread_grouping_key = ThreadGroupingKey()
+    recent_threads = RecentThreads()
+    hash_value = thread_grouping_key.hash(EVENT)
+    recent_threads.put(hash_value, "1700000000.000100", int(time.time()) + 900)
+
+    with patch("warm_start.time.monotonic", return_value=1000.0):
+        exporter = WarmStartExporter("s3://bucket/snapshot.bin", s3_client, interval_seconds=300)
+        assert not exporter.export(cfg, thread_grouping_key, recent_threads)
+    with patch("warm_start.time.monotonic", return_value=1300.0):
+        assert exporter.export(cfg, thread_grouping_key, recent_threads)
+        assert not exporter.export(cfg, thread_grouping_key, recent_threads)
+
+    # A new execution environment starts with the threads found by the running one
+    new_recent_threads = RecentThreads()
+    assert restore_warm_start_state(read_snapshot("s3://bucket/snapshot.bin", s3_client), cfg, ThreadGroupingKey(), new_recent_threads)
+    assert new_recent_threads.get(hash_value) == "1700000000.000100"
+
+
+def test_incompatible_or_missing_snapshot_is_ignored():
+    assert load_snapshot(b"not a snapshot") is None
+    # Snapshots with marshalled code objects are never loaded
+    assert load_snapshot(zlib.compress(marshal.dumps({"format_version": 1, "compiled_rules": {"rule": compile("1", "<rule>", "eval")}}))) is None
+    assert load_snapshot(zlib.compress(json.dumps({"format_version": warm_start.SNAPSHOT_FORMAT_VERSION, "thread_hashes": {}, "recent_threads": []}).encode())) is None
+    assert read_snapshot("/nonexistent/snapshot.bin", None) is None
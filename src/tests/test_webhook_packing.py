@@ -0,0 +1,68 @@
+from unittest.mock import patch
+
+import pytest
+from slack_helpers import SLACK_MAX_BLOCKS, SLACK_MAX_MESSAGE_CHARACTERS, SlackWebhookPacker, event_to_slack_message
+
+# ruff: noqa: ANN201, ANN001, E501, PLR2004
+
+
+def make_event(event_id, error_message=None):
+    event = {
+        "eventID": event_id,
+        "eventName": "StopLogging",
+        "eventTime": "2026-01-24T00:00:00Z",
+        "userIdentity": {"arn": "arn:aws:iam::123456789012:user/someone", "accountId": "123456789012"},
+        "requestParameters": {"name": "trail"},
+    }
+    if error_message:
+        event["errorCode"] = "AccessDenied"
+        event["errorMessage"] = error_message
+    return event
+
+
+def test_messages_for_same_hook_url_are_packed_within_block_limit():
+    messages = [event_to_slack_message(make_event(str(i)), "file", "123456789012") for i in range(25)]
+    blocks_per_message = len(messages[0]["blocks"])
+
+    with patch("slack_helpers.webhook_post_message", return_value=200) as mock_post:
+        packer = SlackWebhookPacker()
+        for message in messages:
+            packer.add(message, "https://hooks.slack.com/a")
+        packer.add(messages[0], "https://hooks.slack.com/b")
+        # Messages held, not hook URLs
+        assert len(packer) == 25 % (SLACK_MAX_BLOCKS // len(messages[0]["blocks"])) + 1
+        packer.flush()
+        assert len(packer) == 0
+
+    posted = [(call.kwargs["hook_url"], call.kwargs["message"]["blocks"]) for call in mock_post.call_args_list]
+    hook_a = [blocks for hook_url, blocks in posted if hook_url == "https://hooks.slack.com/a"]
+    per_request = SLACK_MAX_BLOCKS // blocks_per_message
+    assert [len(blocks) for blocks in hook_a] == [per_request * blocks_per_message] * (25 // per_request) + [25 % per_request * blocks_per_message]
+    assert all(len(blocks) <= SLACK_MAX_BLOCKS for blocks in hook_a)
+    # Per-event layout is kept: blocks are concatenated in order, each event ends with a divider
+    assert [block for blocks in hook_a for block in blocks] == [block for message in messages for block in message["blocks"]]
+    assert [hook_url for hook_url, _ in posted].count("https://hooks.slack.com/b") == 1
+
+
+def test_messages_are_packed_within_size_limit():
+    large_message = event_to_slack_message(make_event("1", error_message="x" * (SLACK_MAX_MESSAGE_CHARACTERS // 3)), "file", "123456789012")
+
+    with patch("slack_helpers.webhook_post_message", return_value=200) as mock_post:
+        packer = SlackWebhookPacker()
+        for _ in range(5):
+            packer.add(large_message, "https://hooks.slack.com/a")
+        packer.flush()
+
+    assert [len(call.kwargs["message"]["blocks"]) // len(large_message["blocks"]) for call in mock_post.call_args_list] == [2, 2, 1]
+
+
+def test_failed_webhook_request_raises():
+    message = event_to_slack_message(make_event("1"), "file", "123456789012")
+
+    with patch("slack_helpers.webhook_post_message", return_value=429):
+        packer = SlackWebhookPacker()
+        packer.add(message, "https://hooks.slack.com/a")
+        with pytest.raises(RuntimeError, match="status 429"):
+            packer.flush()
+    assert len(packer) == 0
+    assert packer.oldest_sequence is None
@@ -0,0 +1,51 @@
+from typing import Any, Dict, List
+
+import json_codec
+from config import get_logger
+
+logger = get_logger()
+
+# Key of the continuation section added to S3 notification when processing is continued in a new invocation
+CONTINUATION_KEY = "cloudTrailToSlackContinuation"
+
+
+class TimeBudget:
+    """Tracks remaining Lambda execution time, so processing can stop cleanly before the timeout."""
+
+    def __init__(self, context, safety_margin_ms: int) -> None:  # noqa: ANN001, ANN101
+        self._context = context
+        self._safety_margin_ms = safety_margin_ms
+
+    def is_exhausted(self) -> bool:  # noqa: ANN101
+        # Context is None when handler is called outside of Lambda, e.g. in tests
+        if self._context is None or self._safety_margin_ms <= 0:
+            return False
+        return self._context.get_remaining_time_in_millis() < self._safety_margin_ms
+
+
+def get_continuation_event_offset(incoming_event: Dict[str, Any]) -> int:
+    """Return index of the first not yet processed event in the log file of the first record."""
+    return incoming_event.get(CONTINUATION_KEY, {}).get("event_offset", 0)
+
+
+def invoke_continuation(
+    lambda_client,  # noqa: ANN001
+    function_arn: str,
+    records: List[Dict[str, Any]],
+    event_offset: int,
+) -> None:
+    """
+    Asynchronously invoke the function with S3 records that are left to process.
+    Processing of the first record is resumed from event_offset.
+    """
+    logger.warning(
+        {
+            "Running out of time, continuing in new invocation": {
+                "key": records[0]["s3"]["object"]["key"],
+                "event_offset": event_offset,
+                "records_left": len(records),
+            }
+        }
+    )
+    payload = {"Records": records, CONTINUATION_KEY: {"event_offset": event_offset}}
+    lambda_client.invoke(FunctionName=function_arn, InvocationType="Event", Payload=json_codec.dumps_bytes(payload))
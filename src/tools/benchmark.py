@@ -0,0 +1,351 @@
+# Microbenchmarks of hot-path functions, compared with a stored baseline. From the src directory:
+#
+#   python -m tools.benchmark                      # compare with tools/benchmark_baseline.json
+#   python -m tools.benchmark --update-baseline    # measure and store a new baseline
+#   python -m tools.benchmark --filter flatten --threshold 0.1
+#
+# Exits with status 1 when a benchmark is slower than the baseline by more than the threshold plus its noise. Timings
+# depend on the machine and Python version, so compare baselines made on the same kind of machine (e.g. the CI runner).
+import argparse
+import gzip
+import os
+import platform
+import random
+import statistics
+import sys
+import timeit
+from typing import Any, Callable, Dict, List
+
+import json_codec
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "benchmark_baseline.json")
+CALIBRATION = "calibration"
+ACCOUNT_ID = "123456789012"
+BUCKET = "cloudtrail-benchmark"
+LOG_FILE_KEY = f"AWSLogs/{ACCOUNT_ID}/CloudTrail/eu-central-1/2026/01/24/{ACCOUNT_ID}_CloudTrail_eu-central-1_20260124T0000Z_benchmark.json.gz"  # noqa: E501
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Microbenchmarks of hot-path functions with regression thresholds")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file to compare with or update")
+    parser.add_argument("--update-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="Allowed slowdown over the baseline on top of its noise, 0.25 is 25%%",
+    )
+    parser.add_argument("--rounds", type=int, default=3, help="Rounds over all benchmarks, the median of rounds is used")
+    parser.add_argument("--repeat", type=int, default=5, help="Measurements per benchmark in a round, the median is used")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum duration of one measurement in seconds")
+    parser.add_argument("--filter", default="", help="Only run benchmarks with this substring in the name")
+    return parser.parse_args(argv)
+
+
+def configure_environment() -> None:
+    """Configuration is read when main is imported, so it has to be set before."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "eu-central-1")
+    os.environ["LOG_LEVEL"] = os.environ.get("BENCHMARK_LOG_LEVEL", "ERROR")
+    os.environ["HOOK_URL"] = "https://hooks.slack.com/services/T0BENCH/B0BENCH/benchmark"
+    os.environ["USE_DEFAULT_RULES"] = "true"
+    for name in ("RULES", "IGNORE_RULES", "EVENTS_TO_TRACK", "RULES_SOURCE", "SLACK_BOT_TOKEN", "WARM_START_SNAPSHOT"):
+        os.environ[name] = ""
+
+
+def user_identity(user: str) -> Dict[str, Any]:
+    return {
+        "type": "AssumedRole",
+        "principalId": f"AROAEXAMPLE:{user}",
+        "arn": f"arn:aws:sts::{ACCOUNT_ID}:assumed-role/AWSReservedSSO_Admin_0123456789abcdef/{user}",
+        "accountId": ACCOUNT_ID,
+        "accessKeyId": "ASIAEXAMPLE",
+        "sessionContext": {
+            "sessionIssuer": {
+                "type": "Role",
+                "principalId": "AROAEXAMPLE",
+                "arn": f"arn:aws:iam::{ACCOUNT_ID}:role/aws-reserved/sso.amazonaws.com/AWSReservedSSO_Admin_0123456789abcdef",
+                "accountId": ACCOUNT_ID,
+                "userName": "AWSReservedSSO_Admin_0123456789abcdef",
+            },
+            "attributes": {"creationDate": "2026-01-24T00:00:00Z", "mfaAuthenticated": "false"},
+        },
+    }
+
+
+def typical_event(index: int = 0) -> Dict[str, Any]:
+    """Management event as most events of a trail look, it matches no default rule."""
+    return {
+        "eventVersion": "1.09",
+        "userIdentity": user_identity(f"user-{index % 20}@example.com"),
+        "eventTime": "2026-01-24T00:00:00Z",
+        "eventSource": "ec2.amazonaws.com",
+        "eventName": "CreateTags",
+        "awsRegion": "eu-central-1",
+        "sourceIPAddress": f"198.51.100.{index % 256}",
+        "userAgent": "aws-cli/2.15.0 md/Botocore#1.34.0 ua/2.0 os/linux#6.1 md/arch#x86_64 lang/python#3.11.6",
+        "requestParameters": {
+            "resourcesSet": {"items": [{"resourceId": f"i-{index:017x}"}]},
+            "tagSet": {"items": [{"key": "Name", "value": f"instance-{index}"}, {"key": "team", "value": "platform"}]},
+        },
+        "responseElements": {"requestId": f"request-{index}", "_return": True},
+        "requestID": f"request-{index}",
+        "eventID": f"event-{index}",
+        "readOnly": False,
+        "eventType": "AwsApiCall",
+        "managementEvent": True,
+        "recipientAccountId": ACCOUNT_ID,
+        "eventCategory": "Management",
+        "tlsDetails": {"tlsVersion": "TLSv1.3", "cipherSuite": "TLS_AES_128_GCM_SHA256", "clientProvidedHostHeader": "ec2.eu-central-1.amazonaws.com"},  # noqa: E501
+    }
+
+
+def huge_event(instances: int = 200) -> Dict[str, Any]:
+    """RunInstances with a large responseElements, the shape that dominates flattening and formatting."""
+    rng = random.Random(1)
+    event = typical_event()
+    event |= {
+        "eventName": "RunInstances",
+        "requestParameters": {"instanceType": "m7i.large", "minCount": instances, "maxCount": instances},
+        "responseElements": {
+            "requestId": "request-huge",
+            "reservationId": "r-0123456789abcdef0",
+            "ownerId": ACCOUNT_ID,
+            "instancesSet": {
+                "items": [
+                    {
+                        "instanceId": f"i-{index:017x}",
+                        "imageId": "ami-0123456789abcdef0",
+                        "instanceState": {"code": 0, "name": "pending"},
+                        "privateDnsName": f"ip-10-0-{index // 256}-{index % 256}.eu-central-1.compute.internal",
+                        "amiLaunchIndex": index,
+                        "instanceType": "m7i.large",
+                        "launchTime": 1769212800000,
+                        "placement": {"availabilityZone": rng.choice(["eu-central-1a", "eu-central-1b"]), "tenancy": "default"},
+                        "monitoring": {"state": "disabled"},
+                        "subnetId": "subnet-0123456789abcdef0",
+                        "vpcId": "vpc-0123456789abcdef0",
+                        "privateIpAddress": f"10.0.{index // 256}.{index % 256}",
+                        "groupSet": {"items": [{"groupId": "sg-0123456789abcdef0", "groupName": "default"}]},
+                        "networkInterfaceSet": {
+                            "items": [{
+                                "networkInterfaceId": f"eni-{index:017x}",
+                                "privateIpAddressesSet": {"item": [{"privateIpAddress": f"10.0.{index // 256}.{index % 256}", "primary": True}]},  # noqa: E501
+                            }]
+                        },
+                        "tagSet": {"items": [{"key": "Name", "value": f"worker-{index}"}]},
+                    }
+                    for index in range(instances)
+                ]
+            },
+        },
+    }
+    return event
+
+
+def matched_event() -> Dict[str, Any]:
+    """Console login without MFA, matched by default rules."""
+    event = typical_event()
+    event |= {
+        "eventSource": "signin.amazonaws.com",
+        "eventName": "ConsoleLogin",
+        "requestParameters": None,
+        "responseElements": {"ConsoleLogin": "Success"},
+        "additionalEventData": {"LoginTo": "https://console.aws.amazon.com/", "MobileVersion": "No", "MFAUsed": "No"},
+    }
+    return event
+
+
+def synthetic_rules(count: int) -> List[str]:
+    return [
+        f'event["eventSource"] == "service{index}.amazonaws.com" and event.get("errorCode", "").startswith("AccessDenied")'
+        for index in range(count)
+    ]
+
+
+def get_benchmarks() -> Dict[str, Callable[[], Any]]:
+    """Benchmarks by name, every callable is one operation."""
+    configure_environment()
+    import main
+    from dynamodb import ThreadGroupingKey, hash_user_identity_and_event_name
+    from rules import default_rules
+    from slack_helpers import event_to_slack_message
+    from sns import event_to_sns_message
+    from tests.fakes import FakeS3Client
+    from verdict_cache import RuleVerdictCache
+
+    typical = typical_event()
+    huge = huge_event()
+    matched = matched_event()
+    large_rules = synthetic_rules(500)
+    uncached_key = ThreadGroupingKey(cache_size=0)
+    cached_key = ThreadGroupingKey()
+
+    s3_client = FakeS3Client()
+    body = gzip.compress(json_codec.dumps_bytes({"Records": [typical_event(index) for index in range(1000)] + [huge]}))
+    s3_client.put_object(Bucket=BUCKET, Key=LOG_FILE_KEY, Body=body)
+    record = {"s3": {"bucket": {"name": BUCKET}, "object": {"key": LOG_FILE_KEY, "size": len(body)}}}
+
+    def processed(event: Dict[str, Any], rules: List[str], cache: RuleVerdictCache | None) -> Callable[[], Any]:
+        # Globals are swapped by assignment, patch would cost more than some of the operations
+        def run() -> Any:  # noqa: ANN401
+            saved, main.verdict_cache = main.verdict_cache, cache
+            try:
+                return main.should_message_be_processed(event, rules, [])
+            finally:
+                main.verdict_cache = saved
+        return run
+
+    def read_log_file() -> Any:  # noqa: ANN401
+        saved, main.s3_client = main.s3_client, s3_client
+        try:
+            return main.get_cloudtrail_log_records(record)
+        finally:
+            main.s3_client = saved
+
+    return {
+        "flatten_json/typical": lambda: main.flatten_json(typical),
+        "flatten_json/huge_response_elements": lambda: main.flatten_json(huge),
+        "should_message_be_processed/default_rules": processed(typical, default_rules, None),
+        "should_message_be_processed/default_rules_matched": processed(matched, default_rules, None),
+        "should_message_be_processed/default_rules_huge": processed(huge, default_rules, None),
+        "should_message_be_processed/500_rules": processed(typical, large_rules, None),
+        "should_message_be_processed/default_rules_cached": processed(typical, default_rules, RuleVerdictCache(4096)),
+        "event_to_slack_message/typical": lambda: event_to_slack_message(matched, LOG_FILE_KEY, ACCOUNT_ID),
+        "event_to_slack_message/huge_response_elements": lambda: event_to_slack_message(huge, LOG_FILE_KEY, ACCOUNT_ID),
+        "event_to_sns_message/typical": lambda: event_to_sns_message(matched, LOG_FILE_KEY, ACCOUNT_ID),
+        "event_to_sns_message/huge_response_elements": lambda: event_to_sns_message(huge, LOG_FILE_KEY, ACCOUNT_ID),
+        "hash_user_identity_and_event_name/uncached": lambda: hash_user_identity_and_event_name(matched, uncached_key),
+        "hash_user_identity_and_event_name/cached": lambda: hash_user_identity_and_event_name(matched, cached_key),
+        "get_cloudtrail_log_records/1001_events": read_log_file,
+    }
+
+
+def calibration() -> int:
+    """Fixed pure-Python work, its time tells how fast the machine is right now."""
+    values: Dict[int, int] = {}
+    for index in range(2000):
+        values[index % 97] = values.get(index % 97, 0) + index * index
+    return sum(values.values())
+
+
+def measure(operation: Callable[[], Any], repeat: int, min_time: float) -> float:
+    """Median time of one operation in nanoseconds, over repeat measurements of at least min_time seconds."""
+    timer = timeit.Timer(operation)
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(number, int(number * min_time / elapsed) + 1) if elapsed else number
+    return statistics.median(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def measure_rounds(
+    benchmarks: Dict[str, Callable[[], Any]],
+    rounds: int,
+    repeat: int,
+    min_time: float,
+) -> Dict[str, List[float]]:
+    """
+    Measurements of every benchmark and of the calibration per round. Rounds go over all benchmarks in turn,
+    so a busy spell of the machine slows down one round of several benchmarks instead of all rounds of one.
+    """
+    measurements: Dict[str, List[float]] = {name: [] for name in [CALIBRATION, *benchmarks]}
+    for _ in range(rounds):
+        measurements[CALIBRATION].append(measure(calibration, repeat, min_time))
+        for name, operation in benchmarks.items():
+            measurements[name].append(measure(operation, repeat, min_time))
+    return measurements
+
+
+def summarize(measurements: List[float]) -> Dict[str, float]:
+    """Median of rounds and their spread relative to it, the noise floor of the benchmark."""
+    median = statistics.median(measurements)
+    return {"ns_per_op": round(median, 1), "noise": round((max(measurements) - min(measurements)) / median, 3)}
+
+
+def get_environment() -> Dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "json_backend": json_codec.BACKEND,
+    }
+
+
+def load_baseline(location: str) -> Dict[str, Any] | None:
+    try:
+        with open(location, "rb") as f:
+            return json_codec.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """
+    Rows of the report. Times are scaled by the calibration against the baseline, so a machine that is slower
+    as a whole doesn't fail every benchmark. Benchmarks slower than the baseline by more than the threshold
+    plus the noise of both measurements are regressions.
+    """
+    stored = baseline.get("benchmarks", {})
+    speed = 1.0
+    if CALIBRATION in results and stored.get(CALIBRATION, {}).get("ns_per_op"):
+        speed = results[CALIBRATION]["ns_per_op"] / stored[CALIBRATION]["ns_per_op"]
+    rows = []
+    for name, result in results.items():
+        if name == CALIBRATION:
+            continue
+        baseline_ns = stored.get(name, {}).get("ns_per_op")
+        change = result["ns_per_op"] / speed / baseline_ns - 1 if baseline_ns else None
+        allowed = threshold + stored.get(name, {}).get("noise", 0) + result["noise"]
+        rows.append({
+            "name": name,
+            "ns_per_op": result["ns_per_op"],
+            "baseline_ns_per_op": baseline_ns,
+            "change": None if change is None else round(change, 3),
+            "allowed": round(allowed, 3),
+            "regression": change is not None and change > allowed,
+        })
+    return rows
+
+
+def format_row(row: Dict[str, Any]) -> str:
+    baseline = f"{row['baseline_ns_per_op'] / 1000:12.2f}" if row["baseline_ns_per_op"] else f"{'new':>12}"
+    change = f"{row['change']:+8.1%}" if row["change"] is not None else f"{'':>8}"
+    flag = "  REGRESSION" if row["regression"] else ""
+    return f"{row['name']:<55} {row['ns_per_op'] / 1000:12.2f} {baseline} {change} {row['allowed']:+8.1%}{flag}"
+
+
+def run_from_command_line(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    benchmarks = {name: operation for name, operation in get_benchmarks().items() if args.filter in name}
+    baseline = load_baseline(args.baseline)
+    if baseline is not None and baseline.get("environment") != get_environment():
+        print(f"Baseline was measured in another environment: {baseline.get('environment')}", file=sys.stderr)  # noqa: T201
+
+    measurements = measure_rounds(benchmarks, args.rounds, args.repeat, args.min_time)
+    rows = compare({name: summarize(values) for name, values in measurements.items()}, baseline or {}, args.threshold)
+    regressed = {row["name"] for row in rows if row["regression"]}
+    if regressed and not args.update_baseline:
+        # Measured again before they count, with the calibration, a busy machine slows down single rounds
+        again = measure_rounds({name: benchmarks[name] for name in regressed}, args.rounds, args.repeat, args.min_time)
+        for name, values in again.items():
+            measurements[name].extend(values)
+        rows = compare({name: summarize(values) for name, values in measurements.items()}, baseline or {}, args.threshold)
+
+    print(f"{'benchmark':<55} {'us/op':>12} {'baseline':>12} {'change':>8} {'allowed':>8}")  # noqa: T201
+    for row in rows:
+        print(format_row(row))  # noqa: T201
+
+    if args.update_baseline:
+        # Benchmarks that were filtered out keep their baseline
+        stored = (baseline or {}).get("benchmarks", {}) if args.filter else {}
+        stored |= {name: summarize(values) for name, values in measurements.items()}
+        with open(args.baseline, "w") as f:
+            f.write(json_codec.dumps_pretty({"environment": get_environment(), "benchmarks": dict(sorted(stored.items()))}) + "\n")
+        print(f"Baseline written to {args.baseline}")  # noqa: T201
+        return 0
+
+    regressions = [row["name"] for row in rows if row["regression"]]
+    if regressions:
+        print(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%} over their noise: {', '.join(regressions)}")  # noqa: T201
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_from_command_line())
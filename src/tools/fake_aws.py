@@ -0,0 +1,50 @@
+# In-memory stand-ins for the AWS clients used by the lambda, for load tests without AWS.
+# They implement only the calls the lambda makes. S3 and DynamoDB stand-ins are shared with the unit tests in tests.fakes.
+import time
+from typing import Any, Dict, List, Tuple
+
+
+class FakeSNSClient:
+    def __init__(self) -> None:  # noqa: ANN101
+        self.messages: List[Tuple[str, str]] = []
+        self.requests = 0
+
+    def publish(self, TopicArn: str, Message: str, **_: Any) -> Dict[str, Any]:  # noqa: ANN101, ANN401, N803
+        self.requests += 1
+        self.messages.append((TopicArn, Message))
+        return {"MessageId": str(len(self.messages))}
+
+    def publish_batch(self, TopicArn: str, PublishBatchRequestEntries: List[Dict[str, Any]]) -> Dict[str, Any]:  # noqa: ANN101, N803
+        self.requests += 1
+        self.messages.extend((TopicArn, entry["Message"]) for entry in PublishBatchRequestEntries)
+        return {"Successful": [{"Id": entry["Id"]} for entry in PublishBatchRequestEntries], "Failed": []}
+
+
+class FakeCloudWatchClient:
+    def __init__(self) -> None:  # noqa: ANN101
+        self.metric_data: List[Dict[str, Any]] = []
+
+    def put_metric_data(self, Namespace: str, MetricData: List[Dict[str, Any]]) -> Dict[str, Any]:  # noqa: ANN101, N803, ARG002
+        self.metric_data.extend(MetricData)
+        return {}
+
+
+class FakeLambdaClient:
+    """Records continuation invocations, the load test runs them after the invocation that made them."""
+
+    def __init__(self) -> None:  # noqa: ANN101
+        self.invocations: List[bytes] = []
+
+    def invoke(self, FunctionName: str, InvocationType: str, Payload: bytes) -> Dict[str, Any]:  # noqa: ANN101, N803, ARG002
+        self.invocations.append(Payload)
+        return {"StatusCode": 202}
+
+
+class FakeContext:
+    invoked_function_arn = "arn:aws:lambda:eu-central-1:123456789012:function:fivexl-cloudtrail-to-slack"
+
+    def __init__(self, timeout_ms: int) -> None:  # noqa: ANN101
+        self._deadline = time.monotonic() + timeout_ms / 1000
+
+    def get_remaining_time_in_millis(self) -> int:  # noqa: ANN101
+        return int((self._deadline - time.monotonic()) * 1000)
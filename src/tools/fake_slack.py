@@ -0,0 +1,106 @@
+# Local HTTP server standing in for Slack webhooks and chat.postMessage, with configurable latency and rate limits.
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Self
+
+import json_codec
+
+
+class FakeSlackServer:
+    """
+    Accepts POST /services/... (webhooks) and POST /api/chat.postMessage. Responds after `latency_ms`.
+    With `rate_limit_per_second` set, requests over the limit within a second get 429 with Retry-After,
+    as Slack does. Counts requests, delivered events (divider blocks) and server side latency.
+    """
+
+    def __init__(self, latency_ms: float = 0, rate_limit_per_second: int = 0) -> None:  # noqa: ANN101
+        self.latency_ms = latency_ms
+        self.rate_limit_per_second = rate_limit_per_second
+        self.requests = 0
+        self.rate_limited = 0
+        self.delivered_events = 0
+        self.threads: Dict[str, int] = {}
+        self.latencies_ms: List[float] = []
+        self._window_start = 0.0
+        self._window_requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-slack", daemon=True)
+
+    @property
+    def address(self) -> tuple[str, int]:  # noqa: ANN101
+        host, port = self._server.server_address[:2]
+        return host, port
+
+    @property
+    def url(self) -> str:  # noqa: ANN101
+        host, port = self.address
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> Self:  # noqa: ANN101
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:  # noqa: ANN101
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _is_rate_limited(self) -> bool:  # noqa: ANN101
+        if not self.rate_limit_per_second:
+            return False
+        now = time.monotonic()
+        if now - self._window_start >= 1:
+            self._window_start, self._window_requests = now, 0
+        self._window_requests += 1
+        return self._window_requests > self.rate_limit_per_second
+
+    def _record(self, payload: Dict[str, Any], started_at: float) -> str:  # noqa: ANN101
+        """Count the message and return its ts, messages posted to a thread are counted per thread."""
+        with self._lock:
+            self.delivered_events += sum(1 for block in payload.get("blocks", []) if block.get("type") == "divider")
+            ts = f"{time.time():.6f}"
+            if thread_ts := payload.get("thread_ts"):
+                self.threads[thread_ts] = self.threads.get(thread_ts, 0) + 1
+            self.latencies_ms.append((time.monotonic() - started_at) * 1000)
+            return ts
+
+    def _handler(self) -> type:  # noqa: ANN101
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:  # noqa: ANN101, N802
+                started_at = time.monotonic()
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if server.latency_ms:
+                    time.sleep(server.latency_ms / 1000)
+                with server._lock:
+                    server.requests += 1
+                    rate_limited = server._is_rate_limited()
+                    if rate_limited:
+                        server.rate_limited += 1
+                if rate_limited:
+                    body = b'{"ok": false, "error": "ratelimited"}' if self.path.startswith("/api/") else b"rate_limited"
+                    self._respond(429, body, {"Retry-After": "1"})
+                    return
+                if self.path.startswith("/api/"):
+                    # slack_sdk posts JSON, or form data for calls without a JSON body
+                    payload = json_codec.loads(body) if body.startswith(b"{") else {}
+                    ts = server._record(payload, started_at)
+                    self._respond(200, json_codec.dumps_bytes({"ok": True, "channel": payload.get("channel"), "ts": ts}))
+                else:
+                    server._record(json_codec.loads(body), started_at)
+                    self._respond(200, b"ok")
+
+            def _respond(self, status: int, body: bytes, headers: Dict[str, str] | None = None) -> None:  # noqa: ANN101
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *_: Any) -> None:  # noqa: ANN101, ANN401
+                pass
+
+        return Handler
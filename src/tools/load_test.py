@@ -0,0 +1,257 @@
+# End-to-end load test of lambda_handler against local stand-ins for Slack, S3, SNS, DynamoDB, CloudWatch and Lambda.
+# Runs without AWS credentials or network access, e.g. from the src directory:
+#
+#   python -m tools.load_test --invocations 100 --events-per-file 1000 --slack-latency-ms 50 --max-p99-ms 2000
+#
+# Exits with status 1 when a --min-* or --max-* threshold is not met, or fewer matching events than expected were
+# delivered to Slack, so it can be used as a regression gate.
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+from functools import partial
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+import json_codec
+from tests.fakes import FakeDynamoDBClient, FakeS3Client
+from tools.fake_aws import FakeCloudWatchClient, FakeContext, FakeLambdaClient, FakeSNSClient
+from tools.fake_slack import FakeSlackServer
+
+BUCKET = "cloudtrail-load-test"
+ACCOUNT_ID = "123456789012"
+THREAD_TABLE = "cloudtrail-to-slack-threads"
+DEDUP_TABLE = "cloudtrail-to-slack-dedup"
+SNS_TOPIC_ARN = f"arn:aws:sns:eu-central-1:{ACCOUNT_ID}:cloudtrail-to-slack"
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load test lambda_handler against local stand-ins for Slack and AWS")
+    parser.add_argument("--invocations", type=int, default=50)
+    parser.add_argument("--files-per-invocation", type=int, default=1)
+    parser.add_argument("--events-per-file", type=int, default=500)
+    parser.add_argument("--match-ratio", type=float, default=0.02, help="Share of events that match default rules")
+    parser.add_argument("--principals", type=int, default=20, help="Number of distinct principals in matched events")
+    parser.add_argument("--slack-mode", choices=["webhook", "app"], default="webhook")
+    parser.add_argument("--slack-latency-ms", type=float, default=50)
+    parser.add_argument("--slack-rate-limit", type=int, default=0, help="Requests per second before Slack answers 429, 0 for no limit")
+    parser.add_argument("--pack-webhook-messages", action="store_true")
+    parser.add_argument("--threads", action="store_true", help="Group messages in threads with the DynamoDB thread table (app mode)")
+    parser.add_argument("--dedup", action="store_true", help="Enable event deduplication with the DynamoDB dedup table")
+    parser.add_argument("--sns", action="store_true", help="Also publish matched events to SNS")
+    parser.add_argument("--timeout-ms", type=int, default=900000, help="Lambda timeout of every invocation")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--min-events-per-second", type=float)
+    parser.add_argument("--max-p99-ms", type=float, help="Maximum 99th percentile of invocation duration")
+    parser.add_argument("--max-failed-invocations", type=int, help="Maximum number of invocations that raised an error")
+    parser.add_argument("--max-rate-limited", type=int, help="Maximum number of 429 responses from Slack")
+    parser.add_argument(
+        "--min-delivered-ratio",
+        type=float,
+        default=1.0,
+        help="Minimum share of matching events delivered to Slack, lower it for runs with rate policies or dedup",
+    )
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """Configuration is read when main is imported, so it has to be set before."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "eu-central-1")
+    os.environ["LOG_LEVEL"] = os.environ.get("LOAD_TEST_LOG_LEVEL", "WARNING")
+    os.environ["USE_DEFAULT_RULES"] = "true"
+    os.environ["RULES"] = ""
+    os.environ["IGNORE_RULES"] = ""
+    os.environ["EVENTS_TO_TRACK"] = ""
+    if args.slack_mode == "app":
+        os.environ["SLACK_BOT_TOKEN"] = "xoxb-load-test"
+        os.environ["DEFAULT_SLACK_CHANNEL_ID"] = "C0LOADTEST"
+    else:
+        os.environ.pop("SLACK_BOT_TOKEN", None)
+        os.environ["HOOK_URL"] = "https://hooks.slack.com/services/T0LOADTEST/B0LOADTEST/loadtest"
+    os.environ["PACK_WEBHOOK_MESSAGES"] = str(args.pack_webhook_messages).lower()
+    os.environ["DYNAMODB_TABLE_NAME"] = THREAD_TABLE if args.threads else ""
+    os.environ["ENABLE_EVENT_DEDUPLICATION"] = str(args.dedup).lower()
+    os.environ["DEDUP_TABLE_NAME"] = DEDUP_TABLE if args.dedup else ""
+    os.environ["DEFAULT_SNS_TOPIC_ARN"] = SNS_TOPIC_ARN if args.sns else ""
+
+
+def generate_event(index: int, matched: bool, principals: int, rng: random.Random) -> Dict[str, Any]:
+    user = f"user-{rng.randrange(principals)}"
+    event: Dict[str, Any] = {
+        "eventVersion": "1.09",
+        "userIdentity": {
+            "type": "IAMUser",
+            "principalId": f"AIDA{user.upper()}",
+            "arn": f"arn:aws:iam::{ACCOUNT_ID}:user/{user}",
+            "accountId": ACCOUNT_ID,
+            "userName": user,
+        },
+        "eventTime": "2026-01-24T00:00:00Z",
+        "awsRegion": "eu-central-1",
+        "sourceIPAddress": f"198.51.100.{index % 256}",
+        "userAgent": "aws-cli/2.15.0",
+        "requestID": f"request-{index}",
+        "eventID": f"event-{index}",
+        "readOnly": True,
+        "eventType": "AwsApiCall",
+        "managementEvent": False,
+        "recipientAccountId": ACCOUNT_ID,
+    }
+    if matched:
+        event |= {
+            "eventSource": "signin.amazonaws.com",
+            "eventName": "ConsoleLogin",
+            "responseElements": {"ConsoleLogin": "Success"},
+            "additionalEventData": {"LoginTo": "https://console.aws.amazon.com/", "MobileVersion": "No", "MFAUsed": "No"},
+        }
+    else:
+        event |= {
+            "eventSource": "s3.amazonaws.com",
+            "eventName": "GetObject",
+            "requestParameters": {"bucketName": "data", "key": f"objects/{index}.json"},
+        }
+    return event
+
+
+def generate_log_files(args: argparse.Namespace, s3_client: FakeS3Client) -> tuple[List[List[Dict[str, Any]]], int]:
+    """Put log files to the S3 stand-in, returns S3 notification records per invocation and the number of matching events."""
+    rng = random.Random(args.seed)
+    invocations = []
+    matched = 0
+    index = 0
+    for invocation in range(args.invocations):
+        records = []
+        for file in range(args.files_per_invocation):
+            events = []
+            for _ in range(args.events_per_file):
+                is_match = rng.random() < args.match_ratio
+                matched += is_match
+                events.append(generate_event(index, is_match, args.principals, rng))
+                index += 1
+            key = f"AWSLogs/{ACCOUNT_ID}/CloudTrail/eu-central-1/2026/01/24/{ACCOUNT_ID}_CloudTrail_eu-central-1_20260124T0000Z_{invocation}x{file}.json.gz"  # noqa: E501
+            body = gzip.compress(json_codec.dumps_bytes({"Records": events}))
+            s3_client.put_object(Bucket=BUCKET, Key=key, Body=body)
+            records.append({
+                "eventName": "ObjectCreated:Put",
+                "s3": {"bucket": {"name": BUCKET}, "object": {"key": key, "size": len(body)}},
+            })
+        invocations.append(records)
+    return invocations, matched
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile, 0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered) + 0.5) - 1))]
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    configure_environment(args)
+    import http.client
+
+    import main
+    import slack_helpers
+    from slack_sdk import WebClient
+    from sns import SnsBatchPublisher
+
+    s3_client = FakeS3Client()
+    sns_client = FakeSNSClient()
+    dynamodb_client = FakeDynamoDBClient({THREAD_TABLE: "principal_structure_and_action_hash", DEDUP_TABLE: "event_fingerprint"})
+    lambda_client = FakeLambdaClient()
+    invocations, expected_matches = generate_log_files(args, s3_client)
+
+    durations_ms: List[float] = []
+    failed_invocations: List[str] = []
+    with FakeSlackServer(args.slack_latency_ms, args.slack_rate_limit) as slack, \
+            patch.multiple(
+                main,
+                s3_client=s3_client,
+                sns_client=sns_client,
+                sns_publisher=SnsBatchPublisher(sns_client),
+                dynamodb_client=dynamodb_client,
+                cloudwatch_client=FakeCloudWatchClient(),
+                lambda_client=lambda_client,
+            ), \
+            patch.object(slack_helpers.http.client, "HTTPSConnection", lambda *_, **__: http.client.HTTPConnection(*slack.address)), \
+            patch.object(slack_helpers, "WebClient", partial(WebClient, base_url=f"{slack.url}/api/")):  # fmt: skip
+        started_at = time.monotonic()
+        pending = [{"Records": records} for records in invocations]
+        while pending:
+            incoming_event = pending.pop(0)
+            invocation_started_at = time.monotonic()
+            try:
+                main.lambda_handler(incoming_event, FakeContext(args.timeout_ms))
+            except Exception as e:
+                # Lambda would retry asynchronous invocations that raised
+                failed_invocations.append(repr(e))
+            durations_ms.append((time.monotonic() - invocation_started_at) * 1000)
+            # Continuations of invocations that ran out of time
+            pending.extend(json_codec.loads(payload) for payload in lambda_client.invocations)
+            lambda_client.invocations.clear()
+        elapsed = time.monotonic() - started_at
+
+    events = args.invocations * args.files_per_invocation * args.events_per_file
+    return {
+        "invocations": len(durations_ms),
+        "failed_invocations": len(failed_invocations),
+        "events": events,
+        "expected_matches": expected_matches,
+        "delivered_events": slack.delivered_events,
+        "slack_requests": slack.requests,
+        "slack_rate_limited": slack.rate_limited,
+        "slack_threads": len(slack.threads),
+        "sns_messages": len(sns_client.messages),
+        "sns_requests": sns_client.requests,
+        "dynamodb_requests": dynamodb_client.requests,
+        "s3_get_object_calls": s3_client.get_object_calls,
+        "elapsed_seconds": round(elapsed, 3),
+        "events_per_second": round(events / elapsed, 1) if elapsed else 0,
+        "invocation_ms": {
+            "p50": round(percentile(durations_ms, 50), 1),
+            "p95": round(percentile(durations_ms, 95), 1),
+            "p99": round(percentile(durations_ms, 99), 1),
+            "max": round(max(durations_ms, default=0), 1),
+        },
+        "slack_response_ms": {
+            "p50": round(percentile(slack.latencies_ms, 50), 1),
+            "p99": round(percentile(slack.latencies_ms, 99), 1),
+        },
+    }
+
+
+def check_thresholds(args: argparse.Namespace, report: Dict[str, Any]) -> List[str]:
+    failures = []
+    if args.min_events_per_second is not None and report["events_per_second"] < args.min_events_per_second:
+        failures.append(f"events_per_second {report['events_per_second']} < {args.min_events_per_second}")
+    if args.max_p99_ms is not None and report["invocation_ms"]["p99"] > args.max_p99_ms:
+        failures.append(f"invocation p99 {report['invocation_ms']['p99']} ms > {args.max_p99_ms} ms")
+    if args.max_failed_invocations is not None and report["failed_invocations"] > args.max_failed_invocations:
+        failures.append(f"failed_invocations {report['failed_invocations']} > {args.max_failed_invocations}")
+    if args.max_rate_limited is not None and report["slack_rate_limited"] > args.max_rate_limited:
+        failures.append(f"slack_rate_limited {report['slack_rate_limited']} > {args.max_rate_limited}")
+    if report["delivered_events"] < args.min_delivered_ratio * report["expected_matches"]:
+        failures.append(
+            f"delivered_events {report['delivered_events']} < {args.min_delivered_ratio} * expected_matches {report['expected_matches']}"
+        )
+    return failures
+
+
+def run_from_command_line(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    report = run(args)
+    report["failed_thresholds"] = check_thresholds(args, report)
+    output = json_codec.dumps_pretty(report)
+    print(output)  # noqa: T201
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    return 1 if report["failed_thresholds"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_from_command_line())
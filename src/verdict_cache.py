@@ -0,0 +1,212 @@
+import ast
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterator, List, Set, Tuple
+
+from config import get_logger
+from rule_helpers import RULE_HELPERS
+
+logger = get_logger()
+
+# Builtins that can't change the result of a rule between events with the same referenced fields
+PURE_BUILTINS = frozenset({
+    "abs", "all", "any", "bool", "dict", "float", "frozenset", "int", "isinstance", "len",
+    "list", "max", "min", "repr", "round", "set", "sorted", "str", "sum", "tuple",
+})
+
+
+class _Sentinel:
+    __slots__ = ("name",)
+
+    def __init__(self, name: str) -> None:  # noqa: ANN101
+        self.name = name
+
+    def __repr__(self) -> str:  # noqa: ANN101
+        return self.name
+
+
+# Field is not in the flattened event
+MISSING = _Sentinel("MISSING")
+# More than one path of the event could produce the field (keys with dots), the event is evaluated without cache
+AMBIGUOUS = _Sentinel("AMBIGUOUS")
+
+
+def get_referenced_fields(rule: str) -> FrozenSet[str] | None:
+    """
+    Fields of the flattened event the rule reads, with event["field"], event.get("field") or "field" in event.
+    Returns None if the result of the rule might depend on anything else: other uses of event,
+    names that are not pure builtins or rule helpers, dunder attributes or invalid syntax.
+    """
+    try:
+        tree = ast.parse(rule, mode="eval")
+    except SyntaxError:
+        return None
+
+    local_names = _get_local_names(tree)
+    if "event" in local_names:
+        return None
+
+    fields = set()
+    # Uses of event that read a literal field, every other use of event makes the rule opt out
+    field_reads = set()
+    for node in ast.walk(tree):
+        if (field_read := _get_field_read(node)) is not None:
+            field, event_node = field_read
+            fields.add(field)
+            field_reads.add(id(event_node))
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id == "event":
+                if id(node) not in field_reads:
+                    return None
+            elif node.id not in PURE_BUILTINS and node.id not in RULE_HELPERS and node.id not in local_names:
+                return None
+        elif isinstance(node, ast.Attribute) and node.attr.startswith("_"):
+            return None
+    return frozenset(fields)
+
+
+def _get_local_names(tree: ast.AST) -> Set[str]:
+    """Names bound inside the rule, by comprehensions, lambdas and assignment expressions."""
+    local_names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            local_names.add(node.id)
+        elif isinstance(node, ast.arg):
+            local_names.add(node.arg)
+    return local_names
+
+
+def _get_field_read(node: ast.AST) -> Tuple[str, ast.AST] | None:
+    """Field and the event name node of event["field"], event.get("field", ...) or "field" in event."""
+    if isinstance(node, ast.Subscript) and _is_event(node.value) and _is_str(node.slice):
+        return node.slice.value, node.value  # type: ignore[attr-defined]
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "get"
+        and _is_event(node.func.value)
+        and node.args
+        and _is_str(node.args[0])
+        and not node.keywords
+    ):
+        return node.args[0].value, node.func.value  # type: ignore[attr-defined]
+    if (
+        isinstance(node, ast.Compare)
+        and len(node.ops) == 1
+        and isinstance(node.ops[0], (ast.In, ast.NotIn))
+        and _is_str(node.left)
+        and _is_event(node.comparators[0])
+    ):
+        return node.left.value, node.comparators[0]  # type: ignore[attr-defined]
+    return None
+
+
+def _is_event(node: ast.AST) -> bool:
+    return isinstance(node, ast.Name) and node.id == "event" and isinstance(node.ctx, ast.Load)
+
+
+def _is_str(node: ast.AST) -> bool:
+    return isinstance(node, ast.Constant) and isinstance(node.value, str)
+
+
+def _splits(name: str) -> Iterator[Tuple[str, str | None]]:
+    """Key and the rest of the flattened name for every dot the key might end at, the rest is None for the whole name."""
+    position = name.find(".")
+    while position != -1:
+        yield name[:position], name[position + 1:]
+        position = name.find(".", position + 1)
+    yield name, None
+
+
+def resolve_flattened_field(event: Dict[str, Any], field: str) -> Any:  # noqa: ANN401
+    """Value flatten_json(event) would have for the field, without flattening the whole event."""
+    values = _resolve(event, field)
+    if not values:
+        return MISSING
+    return values[0] if len(values) == 1 else AMBIGUOUS
+
+
+def _resolve(value: Any, remaining: str | None) -> List[Any]:  # noqa: ANN401
+    if remaining is None:
+        # Containers are flattened into their items, empty ones are dropped
+        return [] if type(value) in (dict, list) else [value]
+    if type(value) is dict:
+        values = []
+        for key, rest in _splits(remaining):
+            if key in value:
+                values += _resolve(value[key], rest)
+        return values
+    if type(value) is list:
+        index, dot, rest = remaining.partition(".")
+        if index.isascii() and index.isdigit() and str(int(index)) == index and int(index) < len(value):
+            return _resolve(value[int(index)], rest if dot else None)
+    return []
+
+
+class RuleVerdictCache:
+    """
+    Bounded LRU of rule evaluation results, keyed on the values of the fields the rules reference.
+    Events that differ only in other fields (requestID, eventTime, ...) get the result of the first one
+    without flattening and evaluation. Rule sets with a rule whose fields can't be determined are not cached.
+    """
+
+    def __init__(self, size: int) -> None:  # noqa: ANN101
+        self.size = size
+        self._cache: OrderedDict[Tuple[Any, ...], Any] = OrderedDict()
+        self._rules: List[str] | None = None
+        self._ignore_rules: List[str] | None = None
+        self._fields: Tuple[str, ...] | None = None
+
+    def __len__(self) -> int:  # noqa: ANN101
+        return len(self._cache)
+
+    def get_key(self, event: Dict[str, Any], rules: List[str], ignore_rules: List[str]) -> Tuple[Any, ...] | None:  # noqa: ANN101
+        """Projection of the event on the fields referenced by the rules, None if the result can't be cached."""
+        # Rule lists are replaced, not changed in place (see refresh_rules), so an equal list is checked only once
+        if rules is not self._rules or ignore_rules is not self._ignore_rules:
+            if rules != self._rules or ignore_rules != self._ignore_rules:
+                self._set_rules(rules, ignore_rules)
+            self._rules, self._ignore_rules = rules, ignore_rules
+        if self._fields is None:
+            return None
+        key = []
+        for field in self._fields:
+            value = resolve_flattened_field(event, field)
+            if value is AMBIGUOUS:
+                return None
+            # True, 1 and 1.0 are equal keys, but rules can tell them apart
+            key.append(value if value is MISSING else (type(value), value))
+        projection = tuple(key)
+        try:
+            hash(projection)
+        except TypeError:
+            return None
+        return projection
+
+    def get(self, key: Tuple[Any, ...]) -> Any:  # noqa: ANN101, ANN401
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+        return result
+
+    def put(self, key: Tuple[Any, ...], result: Any) -> None:  # noqa: ANN101, ANN401
+        self._cache[key] = result
+        if len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+
+    def _set_rules(self, rules: List[str], ignore_rules: List[str]) -> None:  # noqa: ANN101
+        self._cache.clear()
+        fields = set()
+        opted_out = []
+        for rule in ignore_rules + rules:
+            rule_fields = get_referenced_fields(rule)
+            if rule_fields is None:
+                opted_out.append(rule)
+            else:
+                fields |= rule_fields
+        if opted_out:
+            logger.info({"Rule results are not cached, fields referenced by rules can't be determined": {"rules": opted_out}})
+            self._fields = None
+        else:
+            self._fields = tuple(sorted(fields))
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import time
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple
+
+import json_codec
+from config import Config, get_logger
+from rule_helpers import precompile_rule_helpers
+
+if TYPE_CHECKING:
+    from types import CodeType
+
+    from dynamodb import RecentThreads, ThreadGroupingKey
+
+logger = get_logger()
+
+SNAPSHOT_FORMAT_VERSION = 3
+
+# Thread caches of an execution environment are written to an S3 snapshot at most this often
+SNAPSHOT_EXPORT_INTERVAL_SECONDS = 300
+
+# Rules are compiled once per execution environment, keyed by rule text
+compiled_rules: "Dict[str, CodeType]" = {}
+
+
+def get_compiled_rule(rule: str) -> "CodeType":
+    """Return compiled rule, compiling it on first use. Raises SyntaxError for invalid rules."""
+    code = compiled_rules.get(rule)
+    if code is None:
+        code = compiled_rules[rule] = compile(rule, "<rule>", "eval")
+    return code
+
+
+def compile_rules(rules: List[str]) -> None:
+    """Compile all valid rules and patterns of their helpers ahead of time, invalid rules are reported when evaluated."""
+    for rule in rules:
+        try:
+            code = get_compiled_rule(rule)
+        except SyntaxError:
+            continue
+        precompile_rule_helpers(code, rule)
+
+
+def retain_compiled_rules(rules: List[str]) -> None:
+    """Drop compiled rules that are no longer configured, e.g. after rules were reloaded."""
+    configured_rules = set(rules)
+    for rule in [rule for rule in compiled_rules if rule not in configured_rules]:
+        del compiled_rules[rule]
+
+
+class WarmStartSnapshot(NamedTuple):
+    """
+    Thread caches of an execution environment. Rules are not part of the snapshot: compiling them from text
+    is all the work a snapshot could save, so they are compiled at init either way.
+    """
+
+    config_digest: str
+    thread_hashes: List[Any]
+    recent_threads: List[Any]
+
+
+def get_config_digest(cfg: Config) -> str:
+    """Thread caches are only valid for the same grouping fields and DynamoDB table."""
+    return hashlib.sha256(
+        json.dumps([cfg.thread_grouping_fields, cfg.dynamodb_table_name]).encode("utf-8")
+    ).hexdigest()
+
+
+def dump_snapshot(snapshot: WarmStartSnapshot) -> bytes:
+    """Serialize snapshot as compressed JSON, never as pickled or marshalled objects that could run code on load."""
+    return zlib.compress(
+        json_codec.dumps_bytes(
+            {
+                "format_version": SNAPSHOT_FORMAT_VERSION,
+                "config_digest": snapshot.config_digest,
+                "thread_hashes": snapshot.thread_hashes,
+                "recent_threads": snapshot.recent_threads,
+            }
+        )
+    )
+
+
+def load_snapshot(data: bytes) -> WarmStartSnapshot | None:
+    """Returns None if snapshot is corrupted or was made by another format version."""
+    try:
+        raw = json_codec.loads(zlib.decompress(data))
+    except (ValueError, zlib.error) as e:
+        logger.warning({"Failed to load warm start snapshot": {"error": str(e)}})
+        return None
+    if not isinstance(raw, dict):
+        logger.warning({"Failed to load warm start snapshot": {"error": "unexpected format"}})
+        return None
+    if raw.get("format_version") != SNAPSHOT_FORMAT_VERSION:
+        logger.info({"Warm start snapshot is not compatible, ignoring it": {"format_version": raw.get("format_version")}})
+        return None
+    snapshot = WarmStartSnapshot(
+        config_digest=raw.get("config_digest"),
+        thread_hashes=raw.get("thread_hashes"),
+        recent_threads=raw.get("recent_threads"),
+    )
+    if not all(isinstance(items, list) for items in (snapshot.thread_hashes, snapshot.recent_threads)):
+        logger.warning({"Failed to load warm start snapshot": {"error": "unexpected format"}})
+        return None
+    return snapshot
+
+
+def read_snapshot(
+    location: str,
+    s3_client,  # noqa: ANN001
+) -> bytes | None:
+    """Read snapshot from a file in the deployment package or from s3://bucket/key, None if it is not available."""
+    try:
+        if location.startswith("s3://"):
+            bucket, _, key = location[len("s3://"):].partition("/")
+            return s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        with open(location, "rb") as f:
+            return f.read()
+    except Exception as e:
+        logger.warning({"Failed to read warm start snapshot": {"location": location, "error": str(e)}})
+        return None
+
+
+def capture_warm_start_state(
+    cfg: Config,
+    thread_grouping_key: "ThreadGroupingKey",
+    recent_threads: "RecentThreads",
+) -> bytes:
+    return dump_snapshot(
+        WarmStartSnapshot(
+            config_digest=get_config_digest(cfg),
+            thread_hashes=thread_grouping_key.export_cache(),
+            recent_threads=recent_threads.export_cache(),
+        )
+    )
+
+
+class WarmStartExporter:
+    """
+    Writes thread caches of this execution environment to the S3 snapshot at the end of invocations,
+    at most every interval_seconds, so new execution environments start with threads that running ones found.
+    All execution environments write the same object and the last one wins: threads found only by the others
+    since their last export are not in the snapshot, and new execution environments look them up in DynamoDB.
+    """
+
+    def __init__(  # noqa: ANN101
+        self,
+        location: str,
+        s3_client,  # noqa: ANN001
+        interval_seconds: int = SNAPSHOT_EXPORT_INTERVAL_SECONDS,
+    ) -> None:
+        if not location.startswith("s3://"):
+            raise ValueError(f"Warm start snapshot can only be exported to s3://bucket/key, got {location}")
+        self.bucket, _, self.key = location[len("s3://"):].partition("/")
+        self.s3_client = s3_client
+        self.interval_seconds = interval_seconds
+        # The snapshot was just loaded, there is nothing new to export yet
+        self._exported_at = time.monotonic()
+
+    def export(  # noqa: ANN101
+        self,
+        cfg: Config,
+        thread_grouping_key: "ThreadGroupingKey",
+        recent_threads: "RecentThreads",
+    ) -> bool:
+        """Write snapshot if the interval passed since the last export, returns True if it was written."""
+        now = time.monotonic()
+        if now - self._exported_at < self.interval_seconds:
+            return False
+        self._exported_at = now
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=self.key,
+                Body=capture_warm_start_state(cfg, thread_grouping_key, recent_threads),
+            )
+        except Exception as e:
+            logger.warning({"Failed to export warm start snapshot": {"bucket": self.bucket, "key": self.key, "error": str(e)}})
+            return False
+        logger.info({"Exported warm start snapshot": {"bucket": self.bucket, "key": self.key}})
+        return True
+
+
+def restore_warm_start_state(
+    data: bytes,
+    cfg: Config,
+    thread_grouping_key: "ThreadGroupingKey",
+    recent_threads: "RecentThreads",
+) -> bool:
+    """
+    Load thread caches from snapshot into this execution environment,
+    only if they were captured with the same thread grouping configuration.
+    """
+    snapshot = load_snapshot(data)
+    if snapshot is None:
+        return False
+    if snapshot.config_digest == get_config_digest(cfg):
+        try:
+            thread_grouping_key.import_cache(snapshot.thread_hashes)
+            recent_threads.import_cache(snapshot.recent_threads)
+        except (TypeError, ValueError) as e:
+            logger.warning({"Failed to load thread caches from warm start snapshot": {"error": str(e)}})
+    logger.info({"Loaded warm start snapshot": {"thread_hashes": len(snapshot.thread_hashes), "recent_threads": len(snapshot.recent_threads)}})  # noqa: E501
+    return True
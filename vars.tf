@@ -252,3 +252,273 @@ variable "s3_sns_fanout_topic_name" {
   default     = "cloudtrail-s3-notifications"
   type        = string
 }
+
+variable "object_key_accounts" {
+  description = "List of account IDs to process CloudTrail log files for, based on the S3 object key. Objects of other accounts are skipped before download. Empty list means all accounts."
+  default     = []
+  type        = list(string)
+}
+
+variable "object_key_regions" {
+  description = "List of regions to process CloudTrail log files for, based on the S3 object key. Objects of other regions are skipped before download. Empty list means all regions."
+  default     = []
+  type        = list(string)
+}
+
+variable "object_key_log_types" {
+  description = "List of CloudTrail log types (CloudTrail, CloudTrail-Insight) to process, based on the S3 object key. Objects of other log types are skipped before download. Empty list means all log types."
+  default     = []
+  type        = list(string)
+}
+
+variable "s3_ranged_get_threshold" {
+  description = "CloudTrail log files of this size (in bytes) or larger are downloaded with concurrent byte-range GET requests."
+  default     = 67108864
+  type        = number
+}
+
+variable "s3_ranged_get_part_size" {
+  description = "Size (in bytes) of a single byte-range GET request used to download large CloudTrail log files."
+  default     = 8388608
+  type        = number
+}
+
+variable "s3_ranged_get_concurrency" {
+  description = "How many byte-range GET requests are done in parallel when downloading large CloudTrail log files. Set to 1 to always use a single GET request."
+  default     = 8
+  type        = number
+}
+
+variable "enable_processing_ledger" {
+  description = "Create a DynamoDB table to record processed CloudTrail log files and delivered events, so Lambda retries and duplicate S3 notifications don't send the same alerts again."
+  default     = false
+  type        = bool
+}
+
+variable "processing_ledger_table_name" {
+  description = "Name of the DynamoDB table used as processing ledger, only created if enable_processing_ledger is true."
+  default     = "fivexl-cloudtrail-to-slack-ledger"
+  type        = string
+}
+
+variable "processing_ledger_time_to_live" {
+  description = "How long (in seconds) to keep records about processed CloudTrail log files in the processing ledger."
+  default     = 86400
+  type        = number
+}
+
+variable "enable_sqs_delivery" {
+  description = "Send matched events to an SQS queue and deliver them to Slack and SNS from a separate delivery lambda, so slow Slack responses don't slow down processing of CloudTrail log files."
+  default     = false
+  type        = bool
+}
+
+variable "delivery_queue_batch_size" {
+  description = "Maximum number of events the delivery lambda receives from the SQS queue in one invocation. Only used when enable_sqs_delivery is true."
+  default     = 10
+  type        = number
+}
+
+variable "delivery_queue_max_receive_count" {
+  description = "How many times delivery of an event is attempted before it is moved to the dead-letter queue. Only used when enable_sqs_delivery is true."
+  default     = 5
+  type        = number
+}
+
+variable "time_budget_safety_margin_ms" {
+  description = "When less than this time (in milliseconds) is left before the lambda timeout, processing stops and the rest of the log file is processed by a new asynchronous invocation. Set to 0 to disable."
+  default     = 5000
+  type        = number
+}
+
+variable "enable_event_deduplication" {
+  description = "Drop duplicate events (by eventID, or by content for events without it) before they are delivered, e.g. events delivered by both organization and account trails."
+  default     = false
+  type        = bool
+}
+
+variable "enable_event_deduplication_table" {
+  description = "Create a DynamoDB table to detect duplicate events across lambda execution environments. Without it duplicates are only detected within a single execution environment. Only used when enable_event_deduplication is true."
+  default     = true
+  type        = bool
+}
+
+variable "event_deduplication_table_name" {
+  description = "Name of the DynamoDB table used to detect duplicate events."
+  default     = "fivexl-cloudtrail-to-slack-dedup"
+  type        = string
+}
+
+variable "event_deduplication_time_to_live" {
+  description = "How long (in seconds) events are remembered to detect duplicates."
+  default     = 3600
+  type        = number
+}
+
+variable "event_deduplication_false_positive_rate" {
+  description = "Probability that the in-memory filter wrongly reports an event as duplicate. Lower values use more memory."
+  default     = 0.000001
+  type        = number
+}
+
+variable "event_deduplication_capacity" {
+  description = "Expected number of matched events per execution environment within event_deduplication_time_to_live, used to size the in-memory filter."
+  default     = 100000
+  type        = number
+}
+
+variable "pack_webhook_messages" {
+  description = "In Slack webhook mode, send several events to the same webhook in a single message (up to Slack limits) instead of one request per event."
+  default     = false
+  type        = bool
+}
+
+variable "thread_grouping_fields" {
+  description = "Slack App mode only. Fields that, together with eventName, define which events are grouped into one thread. Supported: type, principalId, arn, accountId (userIdentity fields), awsRegion, eventSource."
+  default     = ["type", "principalId", "arn", "accountId"]
+  type        = list(string)
+}
+
+variable "thread_grouping_cache_size" {
+  description = "How many thread grouping hashes to keep in memory per execution environment."
+  default     = 4096
+  type        = number
+}
+
+variable "warm_start_snapshot" {
+  description = "Snapshot of Slack thread caches to load when a new execution environment starts. Path of a file in the deployment package or s3://bucket/key. Empty string disables it."
+  default     = ""
+  type        = string
+}
+
+variable "rules_source" {
+  description = "S3 object (s3://bucket/key) or SSM parameter (ssm:/name) with a JSON object of \"rules\" and \"ignore_rules\" lists, added to the rules from other variables. Reloaded without a redeploy when it changes. Empty string disables it."
+  default     = ""
+  type        = string
+}
+
+variable "rules_source_refresh_seconds" {
+  description = "How often (in seconds) an execution environment checks rules_source for changes, 0 checks on every invocation."
+  default     = 60
+  type        = number
+}
+
+variable "ip_networks" {
+  description = "Named lists of IP networks in CIDR notation for the ip_in rule helper, e.g. { corporate = [\"203.0.113.0/24\", \"2001:db8::/32\"] }."
+  default     = {}
+  type        = map(list(string))
+}
+
+variable "ip_network_files" {
+  description = "Named lists of IP networks for the ip_in rule helper loaded from files, one network per line. Path of a file in the deployment package or s3://bucket/key. Use it for lists too large for Lambda environment variables."
+  default     = {}
+  type        = map(string)
+}
+
+variable "rate_policies" {
+  description = <<EOT
+Rate policies for events that matched rules, applied per rule and principal (userIdentity.arn). Suppressed events are not formatted or sent, their counts are posted in a periodic summary message.
+`rule` is the exact rule text, policy without `rule` applies to all rules without a policy of their own.
+`type = "token_bucket"` allows `burst` events at once, refilled with `rate_per_minute` events per minute.
+`type = "sample"` allows the `first` events, then every `every`th event.
+EOT
+  default = []
+  type = list(object({
+    rule            = optional(string)
+    type            = optional(string, "token_bucket")
+    burst           = optional(number)
+    rate_per_minute = optional(number)
+    first           = optional(number)
+    every           = optional(number)
+  }))
+}
+
+variable "rate_policy_summary_interval" {
+  description = "How often (in seconds) to post the summary of events suppressed by rate policies."
+  default     = 300
+  type        = number
+}
+
+variable "enable_backfill" {
+  description = "Allow the lambda to list objects in the CloudTrail bucket, required to run backfills of historical log files."
+  default     = false
+  type        = bool
+}
+
+variable "thread_lease_seconds" {
+  description = "Slack App mode only. When several execution environments need the same new thread, one of them gets a lease to create it. The lease can be taken over if the thread is not created within this time."
+  default     = 10
+  type        = number
+}
+
+variable "thread_lease_wait_ms" {
+  description = "Slack App mode only. How long execution environments that did not get the lease wait for the new thread, before posting the message to the channel."
+  default     = 2000
+  type        = number
+}
+
+variable "enable_eventbridge_ingestion" {
+  description = "Also process CloudTrail events published to EventBridge in the region of the lambda. Alerts arrive within seconds instead of waiting for log files. Enable event deduplication to avoid duplicate alerts for events processed from both sources."
+  default     = false
+  type        = bool
+}
+
+variable "eventbridge_ingestion_event_pattern" {
+  description = "EventBridge event pattern for CloudTrail events to process, null means all CloudTrail API calls, console sign-ins and service events."
+  default     = null
+  type        = string
+}
+
+variable "eventbridge_ingestion_batch_size" {
+  description = "Maximum number of EventBridge events processed by one lambda invocation."
+  default     = 100
+  type        = number
+}
+
+variable "eventbridge_ingestion_batching_window_seconds" {
+  description = "Maximum time (in seconds) to collect EventBridge events into a batch before invoking the lambda."
+  default     = 1
+  type        = number
+}
+
+variable "eventbridge_ingestion_max_receive_count" {
+  description = "Number of attempts to process an EventBridge event before it is moved to the dead-letter queue."
+  default     = 5
+  type        = number
+}
+
+variable "cloudwatch_logs_log_group_names" {
+  description = "Names of CloudWatch Logs log groups of trails to process, in the region of the lambda. A subscription filter is created for each of them."
+  default     = []
+  type        = list(string)
+}
+
+variable "cloudwatch_logs_filter_pattern" {
+  description = "Filter pattern of the CloudWatch Logs subscription filters, empty string means all events."
+  default     = ""
+  type        = string
+}
+
+variable "rule_evaluation_processes" {
+  description = "Number of worker processes evaluating rules for large log files, 0 disables them. Lambda has more than one vCPU with 1769 MB of memory or more, with a single vCPU rules are evaluated in the handler process."
+  default     = 0
+  type        = number
+}
+
+variable "rule_verdict_cache_size" {
+  description = "Number of rule evaluation results cached by values of the event fields the rules reference, 0 disables the cache."
+  default     = 4096
+  type        = number
+}
+
+variable "memory_profiling" {
+  description = "Log peak memory and top allocation sites per processing stage of every invocation. Slows processing down, use it to size lambda_memory_size."
+  default     = false
+  type        = bool
+}
+
+variable "memory_profiling_top" {
+  description = "Number of top allocation sites reported per stage by memory profiling."
+  default     = 10
+  type        = number
+}